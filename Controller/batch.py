@@ -0,0 +1,307 @@
+"""
+Headless batch mode: loads, analyses and exports many files without the urwid interface.
+
+Files stream through the pipeline. Each file is loaded into a fresh ProjectMember of the chosen machine,
+analysed, and exported as a project cache and a disassembly listing, all on a pool of worker threads. The
+analysis works out the cross references and marks runs of instructions as code and packed data or graphics
+as data (see Project.mark_code). Its results are kept in one AnalysisCache for the whole batch, so ROMs every
+file maps in are only disassembled once. At most max_in_flight files are
+queued or being worked on at a time, so the input list can be a generator over thousands of files without
+all of them being held at once. A line is printed for every file as it finishes, and the throughput at the
+end. A D64, D71, D81 or T64 image stands for every PRG file on it, a CRT file is plugged in as a
+cartridge, and a VICE snapshot fills the member's RAM banks and memory configuration.
+
+The listing is assembler source, written next to the project cache. With --verify it is also assembled
+again and compared with the bytes it was loaded from. A file whose source does not assemble back to the same
+bytes fails with the first difference.
+
+Run ``python batch.py --machine C64 --output out/ file.prg data.bin@c000 ...``.
+"""
+import argparse
+import os
+import re
+import struct
+import sys
+import time
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from Models.analysis import AnalysisCache
+from Models.assembler import AssemblerError, verify_lines
+from Models.cartridge import Cartridge, CartridgeError
+from Models.disk_image import DiskError, DiskImage, is_disk_image
+from Models.exporter import export_lines
+from Models.memory_overview import MemoryOverview
+from Models.project import Project
+from Models.project_cache import save_project
+from Models.project_member import ProjectMember
+from Models.snapshot import Snapshot, SnapshotError, is_snapshot
+from Models.tape_image import TapeError, TapeImage, is_tape_image
+
+_PATH_SEPARATORS = re.compile(r'[\\/:]+')
+
+MACHINES = ['C64', 'C128', '1541', '1571', '1581']
+CARTRIDGE_EXTENSIONS = ('.crt',)
+LOAD_ERRORS = (OSError, ValueError, struct.error, DiskError, TapeError, CartridgeError, SnapshotError, AssemblerError)
+
+
+def open_container(file_name: str):
+    """
+    Opens a disk or tape image.
+
+    :return: the open DiskImage or TapeImage, or None if the file is neither
+    """
+    if is_disk_image(file_name):
+        return DiskImage(file_name)
+    if is_tape_image(file_name):
+        return TapeImage(file_name)
+    return None
+
+
+def parse_file_args(args: Iterable[str]) -> Iterator[Tuple[str, Optional[int]]]:
+    """
+    Turns command line arguments into (file name, address) pairs. A file given as name@address is loaded as
+    a binary at the hexadecimal address, anything else as a PRG.
+    """
+    for arg in args:
+        if '@' in arg:
+            file_name, address = arg.rsplit('@', 1)
+            yield file_name, int(address.lstrip('$'), 16)
+        else:
+            yield arg, None
+
+
+class BatchResult:
+    file_name: str
+    size: int
+    sections: int
+    coverage: dict
+    output: Optional[str]
+    seconds: float
+    error: Optional[str]
+
+    def __init__(self, file_name: str):
+        self.file_name = file_name
+        self.size = 0
+        self.sections = 0
+        self.coverage = dict()
+        self.output = None
+        self.seconds = 0.0
+        self.error = None
+
+    def __str__(self):
+        if self.error is not None:
+            return '{}: FAILED {}'.format(self.file_name, self.error)
+        pages = ' '.join('{}={}'.format(kind, count) for kind, count in self.coverage.items() if count)
+        return '{}: {} bytes, {} sections, {} ({:.1f} ms)'.format(self.file_name, self.size, self.sections, pages,
+                                                               self.seconds * 1000)
+
+
+def expand_disk_images(files: Iterable[Tuple[str, Optional[int]]]) -> Iterator[Tuple[str, Optional[int],
+                                                                                    Optional[str], Optional[str]]]:
+    """
+    Replaces every disk and tape image among the files by the PRG files on it. Only the directory of an image
+    is read.
+
+    :param files: (file name, address) pairs
+    :return: (file name, address, name of the file on the disk or None, error) tuples; error is the reason a
+        disk or tape image could not be read, and None otherwise
+    """
+    for file_name, address in files:
+        if not is_disk_image(file_name) and not is_tape_image(file_name):
+            yield file_name, address, None, None
+            continue
+        try:
+            with open_container(file_name) as container:
+                entries = [entry.name for entry in container.entries() if entry.file_type == 'PRG']
+        except LOAD_ERRORS as error:
+            yield file_name, address, None, str(error)
+            continue
+        for entry in entries:
+            yield file_name, address, entry, None
+
+
+def output_name(file_name: str, entry: Optional[str] = None) -> str:
+    """
+    Name of the files written for an input, without extension. It is built from the path of the input, and
+    the name of the file on a disk or tape image, so inputs of the same name from different directories or
+    images do not overwrite each other.
+    """
+    path = os.path.normpath(os.path.relpath(os.path.abspath(file_name)))
+    if path.startswith(os.pardir):
+        path = os.path.abspath(file_name)
+    name = _PATH_SEPARATORS.sub('_', path).strip('_')
+    if entry is not None:
+        name += '_' + _PATH_SEPARATORS.sub('_', entry)
+    return name
+
+
+def process_file(file_name: str, address: Optional[int], machine: str, output_dir: Optional[str],
+                 entry: Optional[str] = None, verify: bool = False, name: Optional[str] = None,
+                 analysis_cache: Optional[AnalysisCache] = None) -> BatchResult:
+    """
+    Runs one file through the pipeline: load, analyse, export, and optionally verify.
+
+    :param file_name: file to load
+    :param address: address to load a binary at, None for a PRG
+    :param machine: machine type of the member to load the file into; snapshots use their own
+    :param output_dir: directory to write the project cache and listing to, None to skip the export
+    :param entry: name of the file to load when file_name is a disk or tape image
+    :param verify: export the file as source and check that it assembles back to the same bytes
+    :param name: name of the files written to output_dir, without extension; see output_name
+    :param analysis_cache: section analyses shared with the other files of the batch
+    :return: what happened to the file
+    """
+    result = BatchResult(file_name if entry is None else '{}:{}'.format(file_name, entry))
+    if name is None:
+        name = output_name(file_name, entry)
+    start = time.perf_counter()
+    try:
+        if os.path.splitext(file_name)[1].lower() in CARTRIDGE_EXTENSIONS:
+            member = ProjectMember(os.path.basename(file_name), machine)
+            cartridge = Cartridge(file_name)
+            member.attach_cartridge(cartridge, cartridge.banks[0] if cartridge.banks else 0)
+            result.size = sum(chip.size for chips in cartridge.chips.values() for chip in chips)
+            result.sections = len(cartridge.banks)
+        elif is_snapshot(file_name):
+            with Snapshot(file_name) as snapshot:
+                # a snapshot says which machine it was taken on, whatever --machine is
+                member = ProjectMember(os.path.basename(file_name), snapshot.machine_type)
+                snapshot.load_into(member)
+            sections = [section for name, image in member.images.items() if name.startswith('RAM')
+                        for section in image.sections]
+            result.size = sum(section.end_address - section.start_address for section in sections)
+            result.sections = len(sections)
+        else:
+            if entry is None:
+                member = ProjectMember(os.path.basename(file_name), machine)
+                section = member.load_file(file_name, address)
+            else:
+                member = ProjectMember('{}.{}'.format(os.path.basename(file_name), entry.replace('/', '_')),
+                                       machine)
+                with open_container(file_name) as container:
+                    container_file = container.find(entry)
+                    if container_file is None:
+                        raise ValueError('no file {} in the image'.format(entry))
+                    section = container_file.load_into(member.images['RAM'], address)
+                if section is not None:
+                    member.change_config(member.machine_config)
+            if section is None:
+                raise ValueError('collides with the ROMs of the {}'.format(machine))
+            result.size = section.end_address - section.start_address
+            result.sections = len(member.images['RAM'].sections)
+
+        project = Project(member.image_name)
+        if analysis_cache is not None:
+            project.analysis_cache = analysis_cache
+        project.members.append(member)
+        project.analyse(member)
+        project.mark_code(member)
+        result.coverage = MemoryOverview(member).coverage()
+
+        lines = export_lines(member)
+        if output_dir is not None:
+            result.output = os.path.join(output_dir, name + '.cache')
+            save_project(project, result.output)
+            with open(os.path.join(output_dir, name + '.asm'), 'w') as f:
+                f.writelines(line + '\n' for line in lines)
+
+        if verify:
+            _, mismatches = verify_lines(lines, member.current_image)
+            if mismatches:
+                result.error = 'round trip differs, {}'.format('; '.join(str(m) for m in mismatches))
+    except LOAD_ERRORS as error:
+        result.error = str(error)
+    result.seconds = time.perf_counter() - start
+    return result
+
+
+def run_batch(files: Iterable[Tuple[str, Optional[int]]], machine: str, output_dir: Optional[str] = None,
+              workers: int = 4, max_in_flight: int = 16, verify: bool = False) -> Iterator[BatchResult]:
+    """
+    Streams files through the pipeline on a pool of worker threads.
+
+    :param files: (file name, address) pairs, read only as room frees up in the queue; disk images stand for
+        the PRG files on them
+    :param machine: machine type to load the files into
+    :param output_dir: directory to write project caches and listings to, None to skip the export
+    :param workers: number of worker threads
+    :param max_in_flight: most files queued or being worked on at once
+    :param verify: check that the exported source of every file assembles back to the same bytes
+    :return: the result of every file, in the order they finish
+    """
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+    # workers may both analyse a section neither has cached yet, which only costs the time
+    analysis_cache = AnalysisCache()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        names = set()
+        for file_name, address, entry, error in expand_disk_images(files):
+            if error is not None:
+                result = BatchResult(file_name)
+                result.error = error
+                yield result
+                continue
+
+            # the same input given twice still gets files of its own
+            name = base_name = output_name(file_name, entry)
+            count = 1
+            while name in names:
+                count += 1
+                name = '{}.{}'.format(base_name, count)
+            names.add(name)
+
+            if len(pending) >= max_in_flight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            pending.add(executor.submit(process_file, file_name, address, machine, output_dir, entry, verify,
+                                        name, analysis_cache))
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+def main(args: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Load, analyse and export files without the user interface.')
+    parser.add_argument('files', nargs='+',
+                        help='PRG files, D64/D71/D81/T64 images, CRT cartridges, VSF snapshots, or binaries given as '
+                             'file@hexaddress')
+    parser.add_argument('--machine', choices=MACHINES, default='C64', help='machine to load the files into')
+    parser.add_argument('--output', help='directory to write a project cache and listing per file to')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='number of worker threads')
+    parser.add_argument('--max-in-flight', type=int, default=0,
+                        help='most files queued at once (default: four per worker)')
+    parser.add_argument('--verify', action='store_true',
+                        help='check that the exported source of every file assembles back to the same bytes')
+    parser.add_argument('--quiet', action='store_true', help='only print failures and the totals')
+    options = parser.parse_args(args)
+
+    if options.output is not None:
+        os.makedirs(options.output, exist_ok=True)
+    max_in_flight = options.max_in_flight or 4 * options.workers
+
+    start = time.perf_counter()
+    count = 0
+    failed = 0
+    total_bytes = 0
+    for result in run_batch(parse_file_args(options.files), options.machine, options.output, options.workers,
+                            max_in_flight, options.verify):
+        count += 1
+        total_bytes += result.size
+        if result.error is not None:
+            failed += 1
+        if result.error is not None or not options.quiet:
+            print(result)
+    elapsed = time.perf_counter() - start
+
+    print('{} files ({} failed), {} bytes in {:.2f} s: {:.1f} files/s, {:.1f} KB/s'.format(
+        count, failed, total_bytes, elapsed, count / elapsed if elapsed else 0.0,
+        total_bytes / 1024 / elapsed if elapsed else 0.0))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,10 +1,39 @@
-
 import configparser
+import os
+from typing import Optional
+
+# Temporary location of the config file, can be overridden with the CBM_DISASSEMBLER_CONFIG environment variable
+
+config_file = os.environ.get('CBM_DISASSEMBLER_CONFIG', '/home/nathan/PycharmProjects/cbmDisassembler/cd_config')
+
+_data_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+
+# ROMs shipped in the data directory, used for anything the config file does not set
+defaults = {
+    'C64': {'basic': os.path.join(_data_dir, 'C64', 'basic'),
+            'kernal': os.path.join(_data_dir, 'C64', 'kernal'),
+            'character': os.path.join(_data_dir, 'C64', 'chargen')},
+    'C128': {'basiclo': os.path.join(_data_dir, 'C128', 'basiclo'),
+             'basichi': os.path.join(_data_dir, 'C128', 'basichi'),
+             'kernal': os.path.join(_data_dir, 'C128', 'kernal'),
+             'character': os.path.join(_data_dir, 'C128', 'chargen')},
+    '1541': {'rom': os.path.join(_data_dir, 'DRIVES', 'dos1541')},
+    '1571': {'rom': os.path.join(_data_dir, 'DRIVES', 'dos1571')},
+    '1581': {'rom': os.path.join(_data_dir, 'DRIVES', 'dos1581')},
+}
 
-# Temporary location of the config file
+_config: Optional[configparser.ConfigParser] = None
 
-config_file = '/home/nathan/PycharmProjects/cbmDisassembler/cd_config'
 
-config = configparser.ConfigParser()
-config.read(config_file)
+def get_config() -> configparser.ConfigParser:
+    """
+    Returns the configuration, reading the config file the first time it is asked for.
 
+    :return: the configuration
+    """
+    global _config
+    if _config is None:
+        _config = configparser.ConfigParser()
+        _config.read_dict(defaults)
+        _config.read(config_file)
+    return _config
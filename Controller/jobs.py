@@ -0,0 +1,397 @@
+"""
+Runs long jobs such as loading images, building members and disassembly on worker threads while the urwid
+main loop keeps drawing. Workers never touch the models or the widgets themselves: they hand progress and
+partial results to the runner, which passes them on from the main loop's thread, first to the job's
+on_result hook and then to the 'job_progress' and 'job_finished' messages.
+"""
+import os
+import queue
+import struct
+import threading
+from typing import Callable, Dict, List, Optional, Tuple, TYPE_CHECKING, Union
+
+import Controller.messages  # registers the job messages
+from Controller import tracing
+from Controller.messenging import send_message
+from Models.analysis import analyse_section, content_key
+from Models.image_section import ImageSection
+from Models.journal import AnnotationJournal
+from Models.programimage import ProgramImage
+from Models.project import Project
+from Models.project_member import ProjectMember
+from Models.search import BytePattern, SearchHit, search_images, search_member
+from Models.symbol_file import read_symbols
+
+if TYPE_CHECKING:
+    from concurrent.futures import ThreadPoolExecutor
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    """
+    Base class of a background job. Subclasses do their work in run(), which is called on a worker thread.
+    It calls report() as it goes, and checks is_cancelled() (or calls check_cancelled()) often enough for a
+    cancel to take effect quickly.
+    """
+    name: str
+    progress: float
+    runner: Optional['JobRunner']
+    _cancel_event: threading.Event
+
+    def __init__(self, name: str):
+        self.name = name
+        self.progress = 0.0
+        self.runner = None
+        self._cancel_event = threading.Event()
+
+    def run(self):
+        raise NotImplementedError
+
+    def on_result(self, result):
+        """
+        Called on the main loop's thread with each partial result the job reports.
+
+        :param result: the partial result given to report()
+        """
+        pass
+
+    def report(self, progress: float, result=None):
+        """
+        Reports progress from the worker thread.
+
+        :param progress: fraction of the job done, from 0.0 to 1.0
+        :param result: optional partial result, handed to on_result() on the main loop's thread
+        """
+        self.check_cancelled()
+        if self.runner is not None:
+            self.runner.post(self, 'progress', (progress, result))
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def is_cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def check_cancelled(self):
+        if self._cancel_event.is_set():
+            raise JobCancelled(self.name)
+
+
+class FunctionJob(Job):
+    """
+    Job that runs a function. The function is called with the job, so it can report progress through it.
+    """
+    function: Callable[[Job], object]
+    result_handler: Optional[Callable[[object], None]]
+
+    def __init__(self, name: str, function: Callable[[Job], object],
+                 result_handler: Optional[Callable[[object], None]] = None):
+        super().__init__(name)
+        self.function = function
+        self.result_handler = result_handler
+
+    def run(self):
+        return self.function(self)
+
+    def on_result(self, result):
+        if self.result_handler is not None:
+            self.result_handler(result)
+
+
+class LoadImagesJob(Job):
+    """
+    Reads image files on a worker thread and places each one into a ProgramImage as soon as it is read.
+    Files are given as (file name, address) pairs; an address of None means the file is a PRG that starts
+    with its load address.
+    """
+    image: ProgramImage
+    files: List[Tuple[str, Optional[int]]]
+    sections: list
+
+    def __init__(self, image: ProgramImage, files: List[Tuple[str, Optional[int]]]):
+        super().__init__('Loading')
+        self.image = image
+        self.files = files
+        self.sections = list()
+
+    def run(self):
+        for i, (file_name, address) in enumerate(self.files):
+            self.check_cancelled()
+            with open(file_name, 'rb') as f:
+                data = f.read()
+            if address is None:
+                address = struct.unpack_from('<H', data, 0)[0]
+                sec_type = 'PRG'
+                data = data[2:]
+            else:
+                sec_type = 'BIN'
+            self.report((i + 1) / len(self.files), (data, address, file_name, sec_type))
+        return self.sections
+
+    def on_result(self, result):
+        section = self.image.place_data(*result)
+        if section is not None:
+            self.sections.append(section)
+
+
+class OpenMemberJob(Job):
+    """
+    Builds a ProjectMember, which reads its ROMs and sets up its memory configuration, on a worker thread and
+    hands it to member_handler on the main loop's thread. Nothing else can reach the member before that, so
+    it is safe to build off the main thread.
+    """
+    member_name: str
+    machine: str
+    member_handler: Callable[[ProjectMember], None]
+
+    def __init__(self, member_name: str, machine: str, member_handler: Callable[[ProjectMember], None]):
+        super().__init__('Opening {}'.format(machine))
+        self.member_name = member_name
+        self.machine = machine
+        self.member_handler = member_handler
+
+    def run(self):
+        member = ProjectMember(self.member_name, self.machine)
+        self.report(1.0, member)
+        return member
+
+    def on_result(self, result):
+        self.member_handler(result)
+
+
+class DisassemblyJob(Job):
+    """
+    Disassembles the sections a member has mapped in and works out the member's cross references.
+
+    The banks are copied when the job is created, and each section is analysed from the copy on the worker
+    thread. Sections the project's AnalysisCache already holds are skipped. Every analysis is added to the
+    cache on the main loop's thread as it comes in; after the last one, Project.analyse() builds the xrefs
+    from the cache.
+    """
+    project: Project
+    member: ProjectMember
+    sections: List[Tuple[bytes, ProgramImage, ImageSection]]
+    xrefs: Optional[Dict[int, List[int]]]
+
+    # result reported once every section has been analysed
+    ALL_ANALYSED = 'all analysed'
+
+    def __init__(self, project: Project, member: ProjectMember):
+        super().__init__('Disassembling {}'.format(member.image_name))
+        self.project = project
+        self.member = member
+        self.sections = list()
+        self.xrefs = None
+
+        copies = dict()
+        keys = set()
+        for (region_start, region_end), bank_name in zip(member.region_list, member.region_types):
+            image = member.images[bank_name]
+            for section in image.sections:
+                if section.end_address <= region_start or section.start_address >= region_end:
+                    continue
+                key = content_key(image, section)
+                if key in keys or key in project.analysis_cache.analyses:
+                    continue
+                keys.add(key)
+                if bank_name not in copies:
+                    copies[bank_name] = ProgramImage()
+                    copies[bank_name].program_image[:] = image.program_image
+                self.sections.append((key, copies[bank_name], section))
+
+    def run(self):
+        for i, (key, image, section) in enumerate(self.sections):
+            self.check_cancelled()
+            self.report(i / len(self.sections), (key, analyse_section(image, section)))
+        self.report(1.0, self.ALL_ANALYSED)
+
+    def on_result(self, result):
+        if result is self.ALL_ANALYSED:
+            self.xrefs = self.project.analyse(self.member)
+        else:
+            self.project.analysis_cache.add(*result)
+
+
+class SearchJob(Job):
+    """
+    Searches a member, or a set of images, for a byte pattern and hands the hits over in batches as they are
+    found, so a result list can fill while the search runs.
+    """
+    pattern: BytePattern
+    source: Union[ProjectMember, Dict[str, ProgramImage]]
+    hits_handler: Callable[[List[SearchHit]], None]
+    batch_size: int
+    count: int
+
+    def __init__(self, pattern: BytePattern, source: Union[ProjectMember, Dict[str, ProgramImage]],
+                 hits_handler: Callable[[List[SearchHit]], None], batch_size: int = 256):
+        super().__init__('Search {}'.format(pattern.text))
+        self.pattern = pattern
+        self.source = source
+        self.hits_handler = hits_handler
+        self.batch_size = batch_size
+        self.count = 0
+
+    def run(self):
+        if isinstance(self.source, ProjectMember):
+            hits = search_member(self.source, self.pattern)
+            bank_count = len(self.source.images) + (len(self.source.cartridge.banks)
+                                                    if self.source.cartridge is not None else 0)
+        else:
+            hits = search_images(self.source, self.pattern)
+            bank_count = len(self.source)
+
+        banks = set()
+        batch = list()
+        for hit in hits:
+            batch.append(hit)
+            banks.add(hit.bank)
+            if len(batch) >= self.batch_size:
+                self.report(len(banks) / max(bank_count, 1), batch)
+                batch = list()
+        self.report(1.0, batch or None)
+
+    def on_result(self, result):
+        self.count += len(result)
+        self.hits_handler(result)
+
+
+class SymbolImportJob(Job):
+    """
+    Reads a symbol file on a worker thread and adds all of its symbols to a member in one step on the main
+    loop's thread, through the journal when one is given. Views hear about it once, through
+    'symbols_imported', rather than once per symbol.
+    """
+    member: ProjectMember
+    file_name: str
+    file_format: Optional[str]
+    journal: Optional[AnnotationJournal]
+    count: int
+
+    def __init__(self, member: ProjectMember, file_name: str, file_format: Optional[str] = None,
+                 journal: Optional[AnnotationJournal] = None):
+        super().__init__('Import {}'.format(os.path.basename(file_name)))
+        self.member = member
+        self.file_name = file_name
+        self.file_format = file_format
+        self.journal = journal
+        self.count = 0
+
+    def run(self):
+        symbols = list(read_symbols(self.file_name, self.file_format))
+        self.check_cancelled()
+        self.report(1.0, symbols)
+        return self.count
+
+    def on_result(self, result):
+        if self.journal is not None:
+            self.count = self.journal.import_symbols(self.journal.project.members.index(self.member), result)
+        else:
+            self.count = self.member.import_symbols(result)
+        send_message('symbols_imported', self.member, self.count)
+
+
+class CompactionJob(Job):
+    """
+    Folds the annotation journal into a new project snapshot. The snapshot is taken when the job is created,
+    on the main loop's thread, and only writing it out is left to the worker.
+    """
+    journal: AnnotationJournal
+    blocks: list
+
+    def __init__(self, journal: AnnotationJournal):
+        super().__init__('Compacting')
+        self.journal = journal
+        self.blocks = journal.start_compaction()
+
+    def run(self):
+        self.journal.finish_compaction(self.blocks)
+        self.blocks = list()
+
+
+class JobRunner:
+    """
+    Runs jobs on a pool of worker threads. When attached to an urwid MainLoop the runner wakes the loop
+    through a watched pipe whenever a job posts something; without a loop, poll() has to be called to
+    deliver the updates.
+    """
+    executor: 'ThreadPoolExecutor'
+    updates: queue.Queue
+    jobs: list
+    _pipe: Optional[int]
+
+    def __init__(self, loop=None, workers: int = 2):
+        # concurrent.futures pulls in logging, so it is only imported once jobs are actually run
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.updates = queue.Queue()
+        self.jobs = list()
+        self._pipe = loop.watch_pipe(self._pipe_ready) if loop is not None else None
+
+    def submit(self, job: Job) -> Job:
+        job.runner = self
+        self.jobs.append(job)
+        self.executor.submit(self._run, job)
+        return job
+
+    def _run(self, job: Job):
+        try:
+            with tracing.span(job.name, 'job'):
+                result = job.run()
+        except JobCancelled:
+            self.post(job, 'cancelled', None)
+        except Exception as error:
+            self.post(job, 'failed', error)
+        else:
+            self.post(job, 'finished', result)
+
+    def post(self, job: Job, kind: str, payload):
+        self.updates.put((job, kind, payload))
+        if self._pipe is not None:
+            os.write(self._pipe, b'.')
+
+    # noinspection PyUnusedLocal
+    def _pipe_ready(self, data):
+        self.poll()
+        return True
+
+    def poll(self):
+        """
+        Delivers the queued progress reports and job endings. Must be called from the thread that owns the
+        models and widgets. Progress of a cancelled job is dropped, its ending is still delivered.
+        """
+        while True:
+            try:
+                job, kind, payload = self.updates.get_nowait()
+            except queue.Empty:
+                return
+
+            if kind == 'progress':
+                if job.is_cancelled():
+                    # queued before the job was cancelled; whoever cancelled it no longer wants its results
+                    continue
+                progress, result = payload
+                job.progress = progress
+                if result is not None:
+                    job.on_result(result)
+                send_message('job_progress', job, progress)
+            else:
+                if job in self.jobs:
+                    self.jobs.remove(job)
+                send_message('job_finished', job, kind, payload)
+
+    def cancel_all(self):
+        for job in self.jobs:
+            job.cancel()
+
+    def shutdown(self):
+        self.cancel_all()
+        self.executor.shutdown(wait=True)
+        self.poll()
+        if self._pipe is not None:
+            os.close(self._pipe)
+            self._pipe = None
@@ -0,0 +1,227 @@
+"""
+Memory use of a live project, broken down by subsystem: the image buffers of every bank, the item, symbol
+and comment stores and their undo history, the xrefs, the listener lists of the message bus and the widgets
+of each view.
+
+Sizes come from walking each subsystem's objects and summing sys.getsizeof. Every object is counted once,
+for the first subsystem that reaches it, so the rows add up to the total without counting shared objects
+twice; images are walked first, so items do not take the buffers they point into. The walk of a member stops
+at the attributes in VIEW_REFERENCES, such as Item.view_id, so the widgets and walkers they point to are
+left to the views they belong to. Allocations made while
+building something are measured separately, by diffing tracemalloc snapshots grouped by package.
+
+Run ``python -m Controller.memory_report [machine ...]`` for a report on freshly built members.
+"""
+import collections
+import sys
+import tracemalloc
+import types
+import weakref
+from typing import Callable, Dict, FrozenSet, List, Optional, Set
+
+from Controller import messenging
+from Models.project import Project
+from Models.project_member import ProjectMember
+
+# objects that belong to the program rather than to the data being measured
+SKIP_TYPES = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType,
+              types.CodeType)
+# weak references are counted, but not followed to what they refer to
+LEAF_TYPES = (str, bytes, bytearray, int, float, bool, complex, memoryview, type(None), weakref.ref)
+SEQUENCE_TYPES = (list, tuple, set, frozenset, collections.deque)
+# attributes through which the models point into the view layer
+VIEW_REFERENCES = frozenset(['view_id'])
+
+
+class Usage:
+    name: str
+    objects: int
+    bytes: int
+    # object counts by widget class, or listener counts by message
+    breakdown: Dict[str, int]
+
+    def __init__(self, name: str, objects: int = 0, size: int = 0):
+        self.name = name
+        self.objects = objects
+        self.bytes = size
+        self.breakdown = dict()
+
+
+def _slot_names(cls: type) -> List[str]:
+    names = list()
+    for klass in cls.__mro__:
+        slots = klass.__dict__.get('__slots__', ())
+        names += [slots] if isinstance(slots, str) else list(slots)
+    return names
+
+
+def walk(name: str, root, seen: Set[int], widget_class: Optional[type] = None,
+         skip_attributes: FrozenSet[str] = frozenset()) -> Usage:
+    """
+    Counts the objects reachable from root that have not been seen yet, and their sizes.
+
+    :param name: name of the subsystem
+    :param root: object to start from
+    :param seen: ids of objects already counted, updated with the objects counted now
+    :param widget_class: when given, instances of this class are also counted by class name
+    :param skip_attributes: names of attributes whose values are not followed
+    :return: the usage of the subsystem
+    """
+    usage = Usage(name)
+    stack = [root]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, SKIP_TYPES):
+            continue
+        seen.add(id(obj))
+        usage.objects += 1
+        usage.bytes += sys.getsizeof(obj)
+
+        if isinstance(obj, LEAF_TYPES):
+            continue
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, SEQUENCE_TYPES):
+            stack.extend(obj)
+        else:
+            if widget_class is not None and isinstance(obj, widget_class):
+                class_name = type(obj).__name__
+                usage.breakdown[class_name] = usage.breakdown.get(class_name, 0) + 1
+            attributes = getattr(obj, '__dict__', None)
+            if attributes is not None:
+                if not skip_attributes:
+                    stack.append(attributes)
+                elif id(attributes) not in seen:
+                    seen.add(id(attributes))
+                    usage.objects += 1
+                    usage.bytes += sys.getsizeof(attributes)
+                    stack.extend(value for key, value in attributes.items() if key not in skip_attributes)
+            for slot in _slot_names(type(obj)):
+                if slot not in skip_attributes and hasattr(obj, slot):
+                    stack.append(getattr(obj, slot))
+    return usage
+
+
+def member_usage(member: ProjectMember, seen: Set[int], prefix: str = '') -> List[Usage]:
+    stores = [
+        ('image ' + bank_name, image) for bank_name, image in member.images.items()
+    ] + [
+        ('current image', member.current_image),
+        ('items', [member.mapping_table, member.mappings, member.item_store]),
+        ('symbols', member.symbols),
+        ('comments', member.comments),
+        ('undo history', member.history),
+        ('xrefs', member.xrefs),
+    ]
+    return [walk(prefix + name, store, seen, skip_attributes=VIEW_REFERENCES) for name, store in stores]
+
+
+def message_bus_usage(seen: Set[int]) -> Usage:
+    usage = walk('message bus', [messenging.callbacks, messenging.tokens], seen)
+    usage.breakdown = {name: len(listeners) for name, listeners in messenging.callbacks.items() if listeners}
+    return usage
+
+
+def view_usage(views: Dict[str, object], seen: Set[int]) -> List[Usage]:
+    """
+    Counts the widgets of each view, by widget class.
+
+    :param views: top widget or list walker of each view, by view name
+    :param seen: ids of objects already counted
+    """
+    import urwid
+
+    return [walk('view ' + name, view, seen, urwid.Widget) for name, view in views.items()]
+
+
+def project_report(project: Project, views: Optional[Dict[str, object]] = None) -> List[Usage]:
+    """
+    Reports the memory use of a project, its views and the message bus.
+
+    :param project: project to report on
+    :param views: top widget or list walker of each view, by view name
+    :return: the usage of every subsystem
+    """
+    seen = set()
+    usages = list()
+    for member in project.members:
+        usages += member_usage(member, seen, member.image_name + ': ')
+    usages.append(message_bus_usage(seen))
+    if views:
+        usages += view_usage(views, seen)
+    return usages
+
+
+def allocation_usage(build: Callable[[], object]) -> List[Usage]:
+    """
+    Measures what building something allocates, by diffing tracemalloc snapshots taken around it and
+    grouping the allocations by the package of the code that made them.
+
+    :param build: callable that builds the thing to measure; what it returns is kept alive until the
+        second snapshot
+    :return: usage per package, largest first
+    """
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        kept = build()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    del kept
+
+    packages = dict()
+    for stat in after.compare_to(before, 'filename'):
+        if stat.size_diff <= 0:
+            continue
+        package = _package_of(stat.traceback[0].filename)
+        usage = packages.get(package)
+        if usage is None:
+            usage = packages[package] = Usage(package)
+        usage.objects += stat.count_diff
+        usage.bytes += stat.size_diff
+    return sorted(packages.values(), key=lambda usage: usage.bytes, reverse=True)
+
+
+def _package_of(file_name: str) -> str:
+    parts = file_name.replace('\\', '/').split('/')
+    for package in ('Models', 'Views', 'Controller', 'urwid'):
+        if package in parts:
+            return package
+    return parts[-1]
+
+
+def over_budget(usages: List[Usage], budget: int) -> bool:
+    return sum(usage.bytes for usage in usages) > budget
+
+
+def format_report(usages: List[Usage], budget: Optional[int] = None) -> str:
+    lines = ['{:40} {:>10} {:>14}'.format('subsystem', 'objects', 'bytes')]
+    for usage in usages:
+        lines.append('{:40} {:10d} {:14d}'.format(usage.name[:40], usage.objects, usage.bytes))
+        for key, count in sorted(usage.breakdown.items(), key=lambda entry: entry[1], reverse=True):
+            lines.append('    {:36} {:10d}'.format(key[:36], count))
+    total = sum(usage.bytes for usage in usages)
+    lines.append('{:40} {:10d} {:14d}'.format('total', sum(usage.objects for usage in usages), total))
+    if budget is not None:
+        state = 'OVER' if total > budget else 'within'
+        lines.append('{} budget of {} bytes'.format(state, budget))
+    return '\n'.join(lines)
+
+
+def main(args: List[str]):
+    machines = args or ['C64', 'C128', '1541']
+    project = Project('memory report')
+    allocations = allocation_usage(lambda: [ProjectMember(machine, machine) for machine in machines])
+    for machine in machines:
+        project.members.append(ProjectMember(machine, machine))
+
+    print(format_report(project_report(project)))
+    print()
+    print('Allocated while building the members:')
+    print(format_report(allocations))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
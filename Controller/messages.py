@@ -1,3 +1,13 @@
-from Controller.messenging import connect_listener
+from Controller.messenging import register_message
 
-connect_listener('focus_address')
+register_message('focus_address')
+register_message('set_operand_text')
+register_message('label_text')
+register_message('op_code_text')
+register_message('comment_text')
+register_message('job_progress')
+register_message('job_finished')
+register_message('item_changed')
+register_message('item_removed')
+register_message('goto_address')
+register_message('symbols_imported')
@@ -9,6 +9,8 @@ For simplicity this class handles things by making the signal name itself the on
 import types
 import weakref
 
+from Controller import tracing
+
 callbacks = dict()
 tokens = dict()
 
@@ -71,9 +73,15 @@ def send_message(msg_name, *args, **kwargs):
     if msg_name not in callbacks:
         raise ValueError("Message {} has not been registered.".format(msg_name))
 
-    for i, (callback_wref, _) in enumerate(callbacks[msg_name]):
-        if callback_wref() is not None:
-            callback_wref()(*args, **kwargs)
-        else:
-            # callback got garbage collected so delete it
-            del callbacks[msg_name][i]
+    dead = False
+    with tracing.span(msg_name, 'message'):
+        for callback_wref, _ in list(callbacks[msg_name]):
+            callback = callback_wref()
+            if callback is not None:
+                callback(*args, **kwargs)
+            else:
+                dead = True
+
+    if dead:
+        # some callbacks got garbage collected so delete them
+        callbacks[msg_name][:] = [entry for entry in callbacks[msg_name] if entry[0]() is not None]
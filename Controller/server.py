@@ -0,0 +1,404 @@
+"""
+Local JSON-RPC 2.0 server that keeps a project loaded, so editors and scripts can query it without loading
+and analysing everything again for every question.
+
+The server listens on a Unix socket, or on a port of 127.0.0.1 where there are no Unix sockets. Requests
+and responses are JSON, one per line; a line holding a JSON array is a batch and is answered with an array.
+Requests run one at a time on the asyncio loop, which owns the project, so no locking is needed.
+
+Methods, all taking named parameters; member is the name of a project member and defaults to the first:
+
+    members                             name, machine and memory configuration of every member
+    disassemble(start, end)             source lines of the range, disassembled as code
+    xrefs(address)                      addresses of the instructions that refer to the address
+    label(address)                      symbol at the address, or null
+    labels(start, end)                  symbols in the range, as {address: name}
+    set_label(address, name)            sets a symbol, or removes it when name is empty
+    memory(start, end)                  bytes of the range as hex
+    configure(config)                   switches the member's memory configuration
+    stats                               response cache hits and misses
+
+Xrefs come from the project's analysis, done once per memory configuration. Answers of the read only
+methods are kept in an LRU cache keyed by method and parameters, which is emptied by every change.
+
+Run ``python server.py --machine C64 --socket /tmp/cbm.sock file.prg ...``, or ``--project file.cache`` to
+serve a saved project.
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import sys
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from Models.exporter import disassemble
+from Models.project import Project
+from Models.project_cache import load_project
+from Models.project_member import ProjectMember
+
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+
+DEFAULT_PORT = 6502
+MAX_LINE = 16 * 1024 * 1024
+
+
+class RpcError(Exception):
+    code: int
+
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+
+
+class ResponseCache:
+    """
+    Bounded LRU cache of method results.
+    """
+    size: int
+    entries: OrderedDict
+    hits: int
+    misses: int
+
+    def __init__(self, size: int = 1024):
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, compute: Callable[[], Any]):
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        self.misses += 1
+        value = self.entries[key] = compute()
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        self.entries.clear()
+
+
+def _address(params: dict, name: str) -> int:
+    value = params.get(name)
+    if isinstance(value, str):
+        try:
+            value = int(value.lstrip('$'), 16)
+        except ValueError:
+            raise RpcError(INVALID_PARAMS, '{} is not an address.'.format(value))
+    if not isinstance(value, int) or isinstance(value, bool) or not 0 <= value <= 0x10000:
+        raise RpcError(INVALID_PARAMS, '{} needs an address from 0 to $FFFF.'.format(name))
+    return value
+
+
+class AnalysisServer:
+    """
+    Answers JSON-RPC requests about a project.
+    """
+    project: Project
+    cache: ResponseCache
+    analysed: Dict[str, int]
+    methods: Dict[str, Callable[[ProjectMember, dict], Any]]
+    read_only: frozenset
+
+    def __init__(self, project: Project, cache_size: int = 1024):
+        self.project = project
+        self.cache = ResponseCache(cache_size)
+        self.analysed = dict()
+        self.methods = {
+            'members': self._members,
+            'disassemble': self._disassemble,
+            'xrefs': self._xrefs,
+            'label': self._label,
+            'labels': self._labels,
+            'set_label': self._set_label,
+            'memory': self._memory,
+            'configure': self._configure,
+            'stats': self._stats,
+        }
+        self.read_only = frozenset(('members', 'disassemble', 'xrefs', 'label', 'labels', 'memory'))
+
+    def handle_line(self, line: bytes) -> Optional[bytes]:
+        """
+        Handles one line holding a request or a batch.
+
+        :return: the response line, or None when there is nothing to answer
+        """
+        try:
+            message = json.loads(line)
+        except ValueError:
+            return self._encode(self._error(None, PARSE_ERROR, 'Parse error'))
+
+        if isinstance(message, list):
+            if not message:
+                return self._encode(self._error(None, INVALID_REQUEST, 'Empty batch'))
+            responses = [response for response in map(self.handle, message) if response is not None]
+            return self._encode(responses) if responses else None
+        response = self.handle(message)
+        return self._encode(response) if response is not None else None
+
+    def handle(self, request) -> Optional[dict]:
+        """
+        Handles one decoded request.
+
+        :return: the response, or None for a notification
+        """
+        if not isinstance(request, dict) or request.get('jsonrpc') != '2.0' or \
+                not isinstance(request.get('method'), str):
+            return self._error(request.get('id') if isinstance(request, dict) else None, INVALID_REQUEST,
+                               'Invalid request')
+        request_id = request.get('id')
+        is_notification = 'id' not in request
+        try:
+            result = self.call(request['method'], request.get('params', dict()))
+        except RpcError as error:
+            return None if is_notification else self._error(request_id, error.code, str(error))
+        except Exception as error:
+            # a failing method must not drop the connection
+            return None if is_notification else self._error(request_id, INTERNAL_ERROR, str(error))
+        if is_notification:
+            return None
+        return {'jsonrpc': '2.0', 'id': request_id, 'result': result}
+
+    def call(self, method_name: str, params: dict):
+        method = self.methods.get(method_name)
+        if method is None:
+            raise RpcError(METHOD_NOT_FOUND, 'No method {}.'.format(method_name))
+        if not isinstance(params, dict):
+            raise RpcError(INVALID_PARAMS, 'Parameters have to be named.')
+        member = self._member(params)
+        if member is None and method_name not in ('members', 'stats'):
+            raise RpcError(INVALID_PARAMS, 'The project has no members.')
+
+        if method_name not in self.read_only:
+            return method(member, params)
+        key = (method_name, json.dumps(params, sort_keys=True))
+        return self.cache.get(key, lambda: method(member, params))
+
+    @staticmethod
+    def _error(request_id, code: int, message: str) -> dict:
+        return {'jsonrpc': '2.0', 'id': request_id, 'error': {'code': code, 'message': message}}
+
+    @staticmethod
+    def _encode(response) -> bytes:
+        return json.dumps(response, separators=(',', ':')).encode('utf-8') + b'\n'
+
+    def _member(self, params: dict) -> Optional[ProjectMember]:
+        name = params.get('member')
+        if name is None:
+            return self.project.members[0] if self.project.members else None
+        member = self.project.member(name)
+        if member is None:
+            raise RpcError(INVALID_PARAMS, 'No member {}.'.format(name))
+        return member
+
+    def _analyse(self, member: ProjectMember):
+        if self.analysed.get(member.image_name) != member.machine_config:
+            self.project.analyse(member)
+            self.analysed[member.image_name] = member.machine_config
+
+    def _members(self, member: ProjectMember, params: dict):
+        return [{'name': m.image_name, 'machine': m.machine_type, 'config': m.machine_config}
+                for m in self.project.members]
+
+    def _disassemble(self, member: ProjectMember, params: dict):
+        return disassemble(member, _address(params, 'start'), _address(params, 'end'))
+
+    def _xrefs(self, member: ProjectMember, params: dict):
+        self._analyse(member)
+        return member.xrefs.get(_address(params, 'address'), list())
+
+    def _label(self, member: ProjectMember, params: dict):
+        return member.symbols.get(_address(params, 'address'))
+
+    def _labels(self, member: ProjectMember, params: dict):
+        start = _address(params, 'start')
+        end = _address(params, 'end')
+        return {'{:04X}'.format(address): name for address, name in member.symbols.items()
+                if start <= address < end}
+
+    def _set_label(self, member: ProjectMember, params: dict):
+        address = _address(params, 'address')
+        name = params.get('name') or ''
+        if not isinstance(name, str):
+            raise RpcError(INVALID_PARAMS, 'name has to be a string.')
+        if name:
+            member.symbols[address] = name
+        else:
+            member.symbols.pop(address, None)
+        member.history.commit('Label ${:04X}'.format(address))
+        self.cache.clear()
+        return True
+
+    def _memory(self, member: ProjectMember, params: dict):
+        return member.current_image[_address(params, 'start'):_address(params, 'end')].hex()
+
+    def _configure(self, member: ProjectMember, params: dict):
+        config = params.get('config')
+        if not isinstance(config, int) or isinstance(config, bool) or config < 0:
+            raise RpcError(INVALID_PARAMS, 'config has to be a number of 0 or more.')
+        try:
+            member.change_config(config)
+        except ValueError as error:
+            raise RpcError(INVALID_PARAMS, str(error))
+        self.cache.clear()
+        return member.region_types
+
+    def _stats(self, member: ProjectMember, params: dict):
+        return {'hits': self.cache.hits, 'misses': self.cache.misses, 'entries': len(self.cache.entries),
+                'analyses': len(self.project.analysis_cache)}
+
+    async def serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                response = self.handle_line(line)
+                if response is not None:
+                    writer.write(response)
+                    await writer.drain()
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, socket_path: Optional[str] = None, port: int = DEFAULT_PORT):
+        """
+        Starts listening on a Unix socket, or on 127.0.0.1 when no socket path is given.
+
+        :return: the asyncio server
+        """
+        if socket_path is not None:
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+            return await asyncio.start_unix_server(self.serve_client, socket_path, limit=MAX_LINE)
+        return await asyncio.start_server(self.serve_client, '127.0.0.1', port, limit=MAX_LINE)
+
+
+class Client:
+    """
+    Blocking client for scripts and tests.
+    """
+    sock: socket.socket
+    next_id: int
+
+    def __init__(self, socket_path: Optional[str] = None, port: int = DEFAULT_PORT):
+        if socket_path is not None:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(socket_path)
+        else:
+            self.sock = socket.create_connection(('127.0.0.1', port))
+        self._file = self.sock.makefile('rb')
+        self.next_id = 1
+
+    def close(self):
+        self._file.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _request(self, method: str, params: dict) -> dict:
+        request = {'jsonrpc': '2.0', 'id': self.next_id, 'method': method, 'params': params}
+        self.next_id += 1
+        return request
+
+    def _exchange(self, message):
+        self.sock.sendall(json.dumps(message).encode('utf-8') + b'\n')
+        return json.loads(self._file.readline())
+
+    def call(self, method: str, **params):
+        """
+        Calls a method and returns its result.
+
+        :raises RpcError: when the server answers with an error
+        """
+        response = self._exchange(self._request(method, params))
+        if 'error' in response:
+            raise RpcError(response['error']['code'], response['error']['message'])
+        return response['result']
+
+    def batch(self, calls: List[tuple]) -> list:
+        """
+        Sends several calls at once.
+
+        :param calls: (method, params) pairs
+        :return: the responses in the order of the calls, each with either 'result' or 'error'
+        """
+        requests = [self._request(method, params) for method, params in calls]
+        responses = {response['id']: response for response in self._exchange(requests)}
+        return [responses.get(request['id']) for request in requests]
+
+
+def build_project(options) -> Project:
+    if options.project is not None:
+        project = load_project(options.project)
+        if project is None:
+            raise ValueError('{} is not a usable project cache.'.format(options.project))
+        return project
+
+    from Controller.batch import parse_file_args
+
+    project = Project('server')
+    member = project.add_member(ProjectMember(options.machine, options.machine))
+    for file_name, address in parse_file_args(options.files):
+        if member.load_file(file_name, address) is None:
+            raise ValueError('{} collides with a loaded section.'.format(file_name))
+    return project
+
+
+def main(args: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Serve a loaded project over JSON-RPC.')
+    parser.add_argument('files', nargs='*', help='PRG files, or binaries given as file@hexaddress')
+    parser.add_argument('--machine', default='C64', help='machine to load the files into')
+    parser.add_argument('--project', help='project cache to serve instead of files')
+    parser.add_argument('--socket', help='Unix socket to listen on')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                        help='port of 127.0.0.1 to listen on when no socket is given')
+    parser.add_argument('--cache-size', type=int, default=1024, help='most responses kept in the cache')
+    options = parser.parse_args(args)
+
+    try:
+        project = build_project(options)
+    except (OSError, ValueError) as error:
+        print(error, file=sys.stderr)
+        return 1
+    server = AnalysisServer(project, options.cache_size)
+
+    async def serve():
+        listener = await server.start(options.socket, options.port)
+        stop = asyncio.Event()
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            try:
+                asyncio.get_running_loop().add_signal_handler(signal_number, stop.set)
+            except (NotImplementedError, RuntimeError):
+                pass
+        async with listener:
+            await stop.wait()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if options.socket is not None and os.path.exists(options.socket):
+            os.unlink(options.socket)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""
+Phase level tracing. Code marks its phases with the span() context manager or the traced() decorator; while
+tracing is off both cost a global lookup and a call, and nothing is recorded. Once enable() is called every
+phase is recorded with its start, duration and thread, and the recording can be written out as Chrome trace
+event JSON (open it in chrome://tracing or ui.perfetto.dev) or summed up in a table per phase.
+
+Tracing a run of the program is switched on by setting CBM_DISASSEMBLER_TRACE to the file to write the trace
+to.
+"""
+import functools
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+TRACE_ENV = 'CBM_DISASSEMBLER_TRACE'
+
+enabled = False
+_events = list()
+_pid = os.getpid()
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+def clear():
+    del _events[:]
+
+
+def events() -> List[dict]:
+    return list(_events)
+
+
+def _record(name: str, category: str, start: int, end: int, args: Optional[dict]):
+    event = {'name': name, 'cat': category, 'ph': 'X', 'ts': start / 1000, 'dur': (end - start) / 1000,
+             'pid': _pid, 'tid': threading.get_ident()}
+    if args:
+        event['args'] = args
+    # list.append is atomic, so worker threads can record without a lock
+    _events.append(event)
+
+
+class Span:
+    __slots__ = ('name', 'category', 'args', 'start')
+
+    def __init__(self, name: str, category: str, args: dict):
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        _record(self.name, self.category, self.start, time.perf_counter_ns(), self.args)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+def span(name: str, category: str = '', **args):
+    """
+    Context manager that records the time spent in its block as one phase.
+
+    :param name: name of the phase
+    :param category: category of the phase, such as 'load', 'analysis', 'message' or 'view'
+    :param args: values to attach to the trace event
+    """
+    if not enabled:
+        return NULL_SPAN
+    return Span(name, category, args)
+
+
+def traced(name: Optional[str] = None, category: str = '') -> Callable[[Callable], Callable]:
+    """
+    Decorator that records every call of a function as one phase.
+
+    :param name: name of the phase, the function's qualified name by default
+    :param category: category of the phase
+    """
+    def decorate(function):
+        label = name or function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter_ns()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                _record(label, category, start, time.perf_counter_ns(), None)
+
+        return wrapper
+
+    return decorate
+
+
+def write_chrome_trace(file_name: str):
+    """
+    Writes the recorded phases as Chrome trace event JSON.
+
+    :param file_name: file to write
+    """
+    with open(file_name, 'w') as f:
+        json.dump({'traceEvents': events(), 'displayTimeUnit': 'ms'}, f)
+
+
+def summary() -> List[Dict]:
+    """
+    Sums up the recorded phases by category and name.
+
+    :return: one dict per phase with its count, total, mean and longest time in milliseconds, longest total
+        first
+    """
+    phases = dict()
+    for event in events():
+        key = (event['cat'], event['name'])
+        phase = phases.get(key)
+        if phase is None:
+            phase = phases[key] = {'category': event['cat'], 'name': event['name'], 'count': 0, 'total': 0.0,
+                                   'max': 0.0}
+        phase['count'] += 1
+        phase['total'] += event['dur'] / 1000
+        phase['max'] = max(phase['max'], event['dur'] / 1000)
+    rows = sorted(phases.values(), key=lambda row: row['total'], reverse=True)
+    for row in rows:
+        row['mean'] = row['total'] / row['count']
+    return rows
+
+
+def format_summary() -> str:
+    lines = ['{:10} {:40} {:>8} {:>12} {:>10} {:>10}'.format('category', 'phase', 'count', 'total ms', 'mean ms',
+                                                              'max ms')]
+    for row in summary():
+        lines.append('{:10} {:40} {:8d} {:12.3f} {:10.3f} {:10.3f}'.format(
+            row['category'], row['name'][:40], row['count'], row['total'], row['mean'], row['max']))
+    return '\n'.join(lines)
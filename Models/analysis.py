@@ -0,0 +1,151 @@
+"""
+Disassembly and cross references of loaded sections, kept in a cache keyed by content.
+
+A section is first scanned for packed data and graphics (see Models.entropy), which are left out. The rest
+is analysed by a linear sweep from its first byte: every documented opcode is taken as an instruction and
+every operand that names an address as a cross reference from the instruction to that address. Since the
+result only depends on the section's bytes and load address, it is stored under a hash of the two. Members
+of a project that hold the same ROM at the same address, such as two C64 members with the same kernal, or
+one member switched between configurations, look the analysis up instead of redoing it.
+"""
+import hashlib
+import struct
+from array import array
+from typing import Dict, List, Tuple
+
+from Controller.tracing import traced
+from Models.cpu6502 import MODE_SIZES, OPCODES, ACCUMULATOR, IMMEDIATE, IMPLIED, RELATIVE
+from Models.entropy import DataRegion, scan_range
+from Models.image_section import ImageSection
+from Models.programimage import ProgramImage
+
+ADDRESS = struct.Struct('<H')
+
+# modes whose operand is not an address
+_NO_TARGET = (IMPLIED, ACCUMULATOR, IMMEDIATE)
+
+
+class SectionAnalysis:
+    """
+    Result of analysing one section: the packed data and graphics in it, where its instructions start, and
+    (target, source) cross references.
+    """
+    start_address: int
+    end_address: int
+    data_regions: List[DataRegion]
+    instructions: array
+    xrefs: List[Tuple[int, int]]
+
+    def __init__(self, start_address: int, end_address: int):
+        self.start_address = start_address
+        self.end_address = end_address
+        self.data_regions = list()
+        self.instructions = array('H')
+        self.xrefs = list()
+
+
+def content_key(image: ProgramImage, section: ImageSection) -> bytes:
+    """
+    Hash of a section's load address and bytes.
+    """
+    digest = hashlib.blake2b(ADDRESS.pack(section.start_address), digest_size=16)
+    view = memoryview(image.program_image)
+    try:
+        digest.update(view[section.start_address:section.end_address])
+    finally:
+        view.release()
+    return digest.digest()
+
+
+@traced('analyse_section', 'analysis')
+def analyse_section(image: ProgramImage, section: ImageSection) -> SectionAnalysis:
+    """
+    Disassembles a section by linear sweep, skipping packed data and graphics, and collects the addresses its
+    operands refer to.
+
+    :param image: image holding the section
+    :param section: section to analyse
+    :return: the analysis
+    """
+    analysis = SectionAnalysis(section.start_address, section.end_address)
+    memory = image.program_image
+    analysis.data_regions = scan_range(memory, section.start_address, section.end_address)
+    skips = [(region.start_address, region.end_address) for region in analysis.data_regions]
+    skips.append((section.end_address, section.end_address))
+    skip = 0
+    instructions = analysis.instructions
+    xrefs = analysis.xrefs
+    opcodes = OPCODES
+    sizes = MODE_SIZES
+
+    address = section.start_address
+    end = section.end_address
+    while address < end:
+        if address >= skips[skip][0]:
+            address = max(address, skips[skip][1])
+            skip += 1
+            continue
+        entry = opcodes.get(memory[address])
+        if entry is None:
+            address += 1
+            continue
+        mode = entry[1]
+        size = sizes[mode]
+        if address + size > skips[skip][0]:
+            address = skips[skip][0]
+            continue
+        instructions.append(address)
+        if mode not in _NO_TARGET:
+            if mode == RELATIVE:
+                offset = memory[address + 1]
+                target = (address + 2 + (offset - 0x100 if offset & 0x80 else offset)) & 0xFFFF
+            elif size == 3:
+                target = memory[address + 1] | memory[address + 2] << 8
+            else:
+                target = memory[address + 1]
+            xrefs.append((target, address))
+        address += size
+    return analysis
+
+
+class AnalysisCache:
+    """
+    Section analyses by content key, shared by the members of a project.
+    """
+    analyses: Dict[bytes, SectionAnalysis]
+    hits: int
+    misses: int
+
+    def __init__(self):
+        self.analyses = dict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.analyses)
+
+    def add(self, key: bytes, analysis: SectionAnalysis):
+        """
+        Stores an analysis made elsewhere, such as on a worker thread, under its content key.
+        """
+        self.misses += 1
+        self.analyses[key] = analysis
+
+    def get(self, image: ProgramImage, section: ImageSection) -> SectionAnalysis:
+        """
+        Returns the analysis of a section, analysing it only if no section with the same address and bytes
+        has been analysed before.
+        """
+        key = content_key(image, section)
+        analysis = self.analyses.get(key)
+        if analysis is None:
+            self.misses += 1
+            analysis = self.analyses[key] = analyse_section(image, section)
+        else:
+            self.hits += 1
+        return analysis
+
+    def clear(self):
+        self.analyses = dict()
+        self.hits = 0
+        self.misses = 0
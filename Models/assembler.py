@@ -0,0 +1,369 @@
+"""
+Two pass 6502 assembler for the source written by the exporter, used to prove that an export assembles back
+to the bytes it came from.
+
+It understands ``* = address``, ``name = value`` equates, ``name:`` labels, ``.byte``, ``.word`` and
+``.text``, and the documented instructions in every addressing mode. Values are $hex, %binary or decimal
+numbers, symbols and ``*``, optionally combined with + and -, and < or > for the low or high byte.
+Zero page encoding is used when the value is known to be below $0100 in the first pass, unless it is written
+as a four digit hex number.
+
+The first pass parses every line and fixes its size; the second only evaluates operands and writes bytes.
+"""
+import re
+from typing import Dict, Iterable, List, Tuple
+
+from Models.cpu6502 import INSTRUCTIONS, MODE_SIZES, MNEMONICS, ZERO_PAGE_MODES, ABSOLUTE, ABSOLUTE_X, \
+    ABSOLUTE_Y, ACCUMULATOR, IMMEDIATE, IMPLIED, INDIRECT, INDIRECT_X, INDIRECT_Y, RELATIVE
+from Models.programimage import ProgramImage
+
+_COMMENT = re.compile(r'''^((?:[^;"']|"[^"]*"|'[^']*')*);.*$''')
+_ORIGIN = re.compile(r'^\*\s*=\s*(.+)$')
+_EQUATE = re.compile(r'^([A-Za-z_][A-Za-z0-9_]*)\s*=\s*(.+)$')
+_LABEL = re.compile(r'^([A-Za-z_][A-Za-z0-9_]*):\s*(.*)$')
+_STATEMENT = re.compile(r'^(\.?[A-Za-z]+)\s*(.*)$')
+_TERM = re.compile(r'\s*([+-]?)\s*(\$[0-9A-Fa-f]+|%[01]+|[0-9]+|[A-Za-z_][A-Za-z0-9_]*|\*)')
+_LONG_HEX = re.compile(r'^\$[0-9A-Fa-f]{3,}$')
+
+_MODE_PATTERNS = [
+    (re.compile(r'^#(.+)$'), IMMEDIATE),
+    (re.compile(r'^\((.+),\s*[Xx]\)$'), INDIRECT_X),
+    (re.compile(r'^\((.+)\),\s*[Yy]$'), INDIRECT_Y),
+    (re.compile(r'^\((.+)\)$'), INDIRECT),
+    (re.compile(r'^(.+),\s*[Xx]$'), ABSOLUTE_X),
+    (re.compile(r'^(.+),\s*[Yy]$'), ABSOLUTE_Y),
+    (re.compile(r'^(.+)$'), ABSOLUTE),
+]
+
+BLOCK_SIZE = 256
+
+
+class AssemblerError(Exception):
+    line_number: int
+
+    def __init__(self, message: str, line_number: int = 0):
+        super().__init__('line {}: {}'.format(line_number, message) if line_number else message)
+        self.line_number = line_number
+
+
+class Segment:
+    """
+    Bytes assembled for one ``* =`` block.
+    """
+    origin: int
+    data: bytearray
+    line_number: int
+
+    def __init__(self, origin: int, line_number: int):
+        self.origin = origin
+        self.data = bytearray()
+        self.line_number = line_number
+
+    @property
+    def end(self) -> int:
+        return self.origin + len(self.data)
+
+
+class _Unknown(Exception):
+    pass
+
+
+def evaluate(text: str, symbols: Dict[str, int], here: int) -> int:
+    """
+    Evaluates an operand expression.
+
+    :raises _Unknown: when it refers to a symbol that is not defined (yet)
+    """
+    text = text.strip()
+    part = None
+    if text[:1] in '<>':
+        part = text[0]
+        text = text[1:]
+
+    value = 0
+    position = 0
+    while position < len(text):
+        match = _TERM.match(text, position)
+        if match is None or (position > 0 and not match.group(1)):
+            raise ValueError('Cannot evaluate {}.'.format(text))
+        sign, term = match.groups()
+        if term[0] == '$':
+            number = int(term[1:], 16)
+        elif term[0] == '%':
+            number = int(term[1:], 2)
+        elif term[0].isdigit():
+            number = int(term)
+        elif term == '*':
+            number = here
+        elif term in symbols:
+            number = symbols[term]
+        else:
+            raise _Unknown(term)
+        value = value - number if sign == '-' else value + number
+        position = match.end()
+        while position < len(text) and text[position].isspace():
+            position += 1
+
+    if part == '<':
+        return value & 0xFF
+    if part == '>':
+        return (value >> 8) & 0xFF
+    return value
+
+
+def _split_values(text: str) -> List[str]:
+    values = list()
+    current = ''
+    quote = None
+    for char in text:
+        if quote is not None:
+            current += char
+            if char == quote:
+                quote = None
+        elif char in '"\'':
+            quote = char
+            current += char
+        elif char == ',':
+            values.append(current.strip())
+            current = ''
+        else:
+            current += char
+    if current.strip():
+        values.append(current.strip())
+    return values
+
+
+class _Line:
+    __slots__ = ('number', 'address', 'kind', 'mnemonic', 'mode', 'operand', 'size')
+
+    def __init__(self, number, address, kind, mnemonic, mode, operand, size):
+        self.number = number
+        self.address = address
+        self.kind = kind
+        self.mnemonic = mnemonic
+        self.mode = mode
+        self.operand = operand
+        self.size = size
+
+
+def _instruction_mode(mnemonic: str, operand: str, symbols: Dict[str, int], here: int,
+                      line_number: int) -> Tuple[str, str]:
+    if not operand:
+        if (mnemonic, IMPLIED) in INSTRUCTIONS:
+            return IMPLIED, ''
+        return ACCUMULATOR, ''
+    if operand.upper() == 'A' and (mnemonic, ACCUMULATOR) in INSTRUCTIONS:
+        return ACCUMULATOR, ''
+    if (mnemonic, RELATIVE) in INSTRUCTIONS:
+        return RELATIVE, operand
+
+    for pattern, mode in _MODE_PATTERNS:
+        match = pattern.match(operand)
+        if match is None:
+            continue
+        expression = match.group(1).strip()
+        zero_page = ZERO_PAGE_MODES.get(mode)
+        if zero_page is not None and (mnemonic, zero_page) in INSTRUCTIONS and not _LONG_HEX.match(expression):
+            try:
+                if evaluate(expression, symbols, here) < 0x100 or (mnemonic, mode) not in INSTRUCTIONS:
+                    mode = zero_page
+            except _Unknown:
+                if (mnemonic, mode) not in INSTRUCTIONS:
+                    mode = zero_page
+        if (mnemonic, mode) not in INSTRUCTIONS:
+            raise AssemblerError('{} has no {} addressing mode.'.format(mnemonic, mode), line_number)
+        return mode, expression
+    raise AssemblerError('Cannot parse operand {}.'.format(operand), line_number)
+
+
+def assemble(source: Iterable[str]) -> Tuple[List[Segment], Dict[str, int]]:
+    """
+    Assembles source lines.
+
+    :param source: lines of source, with or without line ends
+    :return: the assembled segments in source order, and the symbol table
+    """
+    symbols = dict()
+    lines = list()
+    address = None
+
+    # first pass: parse, define symbols and fix the size of every line
+    for number, text in enumerate(source, 1):
+        match = _COMMENT.match(text)
+        text = (match.group(1) if match is not None else text).strip()
+        if not text:
+            continue
+
+        match = _ORIGIN.match(text)
+        if match is not None:
+            try:
+                address = evaluate(match.group(1), symbols, address or 0)
+            except (_Unknown, ValueError) as error:
+                raise AssemblerError('Bad origin: {}'.format(error), number)
+            lines.append(_Line(number, address, 'origin', None, None, None, 0))
+            continue
+
+        match = _EQUATE.match(text)
+        if match is not None:
+            try:
+                symbols[match.group(1)] = evaluate(match.group(2), symbols, address or 0)
+            except (_Unknown, ValueError) as error:
+                raise AssemblerError('Bad equate: {}'.format(error), number)
+            continue
+
+        match = _LABEL.match(text)
+        if match is not None:
+            if address is None:
+                raise AssemblerError('Label before the first origin.', number)
+            if match.group(1) in symbols:
+                raise AssemblerError('{} is defined twice.'.format(match.group(1)), number)
+            symbols[match.group(1)] = address
+            text = match.group(2).strip()
+            if not text:
+                continue
+
+        match = _STATEMENT.match(text)
+        if match is None:
+            raise AssemblerError('Cannot parse {}.'.format(text), number)
+        if address is None:
+            raise AssemblerError('Code before the first origin.', number)
+        keyword = match.group(1).upper()
+        operand = match.group(2).strip()
+
+        if keyword == '.BYTE':
+            values = _split_values(operand)
+            size = sum(len(value) - 2 if value[:1] in '"\'' else 1 for value in values)
+            lines.append(_Line(number, address, 'byte', None, None, values, size))
+        elif keyword == '.WORD':
+            values = _split_values(operand)
+            lines.append(_Line(number, address, 'word', None, None, values, 2 * len(values)))
+        elif keyword == '.TEXT':
+            if len(operand) < 2 or operand[0] != operand[-1] or operand[0] not in '"\'':
+                raise AssemblerError('.text needs a quoted string.', number)
+            lines.append(_Line(number, address, 'text', None, None, operand[1:-1], len(operand) - 2))
+        elif keyword in MNEMONICS:
+            mode, expression = _instruction_mode(keyword, operand, symbols, address, number)
+            lines.append(_Line(number, address, 'instruction', keyword, mode, expression, MODE_SIZES[mode]))
+        else:
+            raise AssemblerError('Unknown instruction {}.'.format(keyword), number)
+        address += lines[-1].size
+
+    # second pass: evaluate operands and write the bytes
+    segments = list()
+    segment = None
+    for line in lines:
+        if line.kind == 'origin':
+            segment = Segment(line.address, line.number)
+            segments.append(segment)
+            continue
+        try:
+            segment.data += _encode(line, symbols)
+        except _Unknown as error:
+            raise AssemblerError('Unknown symbol {}.'.format(error), line.number)
+        except ValueError as error:
+            raise AssemblerError(str(error), line.number)
+    return segments, symbols
+
+
+def _encode(line: _Line, symbols: Dict[str, int]) -> bytes:
+    if line.kind == 'text':
+        return line.operand.encode('latin-1')
+    if line.kind == 'byte':
+        encoded = bytearray()
+        for value in line.operand:
+            if value[:1] in '"\'':
+                encoded += value[1:-1].encode('latin-1')
+            else:
+                number = evaluate(value, symbols, line.address)
+                if not -0x80 <= number <= 0xFF:
+                    raise ValueError('{} does not fit in a byte.'.format(value))
+                encoded.append(number & 0xFF)
+        return bytes(encoded)
+    if line.kind == 'word':
+        encoded = bytearray()
+        for value in line.operand:
+            number = evaluate(value, symbols, line.address) & 0xFFFF
+            encoded += bytes((number & 0xFF, number >> 8))
+        return bytes(encoded)
+
+    opcode = INSTRUCTIONS[(line.mnemonic, line.mode)]
+    if line.size == 1:
+        return bytes((opcode,))
+    value = evaluate(line.operand, symbols, line.address)
+    if line.mode == RELATIVE:
+        # a branch may wrap around from $FFxx to $00xx and back
+        offset = (value - (line.address + 2)) & 0xFFFF
+        if offset >= 0x8000:
+            offset -= 0x10000
+        if not -0x80 <= offset <= 0x7F:
+            raise ValueError('Branch to ${:04X} is out of range.'.format(value & 0xFFFF))
+        return bytes((opcode, offset & 0xFF))
+    if line.size == 2:
+        if not -0x80 <= value <= 0xFF:
+            raise ValueError('{} does not fit in a byte.'.format(line.operand))
+        return bytes((opcode, value & 0xFF))
+    value &= 0xFFFF
+    return bytes((opcode, value & 0xFF, value >> 8))
+
+
+class Mismatch:
+    origin: int
+    address: int
+    expected: int
+    actual: int
+
+    def __init__(self, origin: int, address: int, expected: int, actual: int):
+        self.origin = origin
+        self.address = address
+        self.expected = expected
+        self.actual = actual
+
+    def __str__(self):
+        return 'section ${:04X}: first difference at ${:04X}, ${:02X} expected, ${:02X} assembled'.format(
+            self.origin, self.address, self.expected, self.actual)
+
+
+def compare_segments(segments: List[Segment], image: ProgramImage,
+                     block_size: int = BLOCK_SIZE) -> List[Mismatch]:
+    """
+    Compares assembled segments against an image, a block at a time, and finds the first differing byte of
+    every segment that differs.
+
+    :param segments: assembled segments
+    :param image: image holding the original bytes
+    :param block_size: bytes compared at once
+    :return: the first mismatch of each segment that does not match
+    """
+    mismatches = list()
+    original = memoryview(image.program_image)
+    try:
+        for segment in segments:
+            if segment.end > len(original):
+                mismatches.append(Mismatch(segment.origin, len(original), 0, 0))
+                continue
+            assembled = memoryview(segment.data)
+            try:
+                for offset in range(0, len(assembled), block_size):
+                    address = segment.origin + offset
+                    length = min(block_size, len(assembled) - offset)
+                    if assembled[offset:offset + length] == original[address:address + length]:
+                        continue
+                    for i in range(offset, offset + length):
+                        if assembled[i] != original[segment.origin + i]:
+                            mismatches.append(Mismatch(segment.origin, segment.origin + i,
+                                                       original[segment.origin + i], assembled[i]))
+                            break
+                    break
+            finally:
+                assembled.release()
+    finally:
+        original.release()
+    return mismatches
+
+
+def verify_lines(lines: Iterable[str], image: ProgramImage) -> Tuple[List[Segment], List[Mismatch]]:
+    """
+    Assembles source and compares it with the image it was exported from.
+    """
+    segments, _ = assemble(lines)
+    return segments, compare_segments(segments, image)
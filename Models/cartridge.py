@@ -0,0 +1,126 @@
+"""
+Reads C64 cartridge images (CRT files).
+
+A CRT file is a header followed by CHIP packets, each holding one ROM chip image along with the bank it
+belongs to and the address it shows up at. Opening a cartridge only walks the packet headers; a bank's chips
+are copied into a ProgramImage the first time the bank is asked for, so a cartridge with dozens of banks
+(Ocean, EasyFlash and the like) only costs memory for the banks that are actually mapped in.
+
+All numbers in a CRT file are big endian.
+"""
+import mmap
+import struct
+from typing import Dict, List
+
+from Models.programimage import ProgramImage
+
+SIGNATURE = b'C64 CARTRIDGE   '
+CHIP_SIGNATURE = b'CHIP'
+
+HEADER = struct.Struct('>16sIHHBB6x32s')
+CHIP = struct.Struct('>4sIHHHH')
+
+CHIP_TYPES = ('ROM', 'RAM', 'FLASH')
+
+
+class CartridgeError(Exception):
+    pass
+
+
+class Chip:
+    chip_type: str
+    bank: int
+    load_address: int
+    size: int
+    offset: int
+
+    def __init__(self, chip_type: str, bank: int, load_address: int, size: int, offset: int):
+        self.chip_type = chip_type
+        self.bank = bank
+        self.load_address = load_address
+        self.size = size
+        self.offset = offset
+
+
+class Cartridge:
+    """
+    An open CRT file. The file is memory mapped and banks are built on demand by bank_image().
+    """
+    file_name: str
+    name: str
+    hardware_type: int
+    exrom: int
+    game: int
+    chips: Dict[int, List[Chip]]
+    images: Dict[int, ProgramImage]
+
+    def __init__(self, file_name: str):
+        self.file_name = file_name
+        with open(file_name, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self._map)
+        self.images = dict()
+        self.chips = dict()
+
+        if len(self.view) < HEADER.size:
+            self.close()
+            raise CartridgeError('{} is not a CRT file.'.format(file_name))
+        signature, header_size, _, self.hardware_type, self.exrom, self.game, name = HEADER.unpack_from(self.view)
+        if signature != SIGNATURE:
+            self.close()
+            raise CartridgeError('{} is not a CRT file.'.format(file_name))
+        self.name = name.rstrip(b'\0').decode('latin-1')
+
+        offset = max(header_size, HEADER.size)
+        while offset + CHIP.size <= len(self.view):
+            signature, packet_size, chip_type, bank, load_address, size = CHIP.unpack_from(self.view, offset)
+            if signature != CHIP_SIGNATURE or packet_size < CHIP.size:
+                break
+            if offset + CHIP.size + size > len(self.view):
+                self.close()
+                raise CartridgeError('CHIP packet at {} of {} is cut short.'.format(offset, file_name))
+            chip_name = CHIP_TYPES[chip_type] if chip_type < len(CHIP_TYPES) else 'ROM'
+            self.chips.setdefault(bank, list()).append(Chip(chip_name, bank, load_address, size,
+                                                            offset + CHIP.size))
+            offset += packet_size
+
+    def close(self):
+        self.view.release()
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def banks(self) -> List[int]:
+        return sorted(self.chips.keys())
+
+    @property
+    def memory_config(self) -> int:
+        """
+        The C64 memory configuration the cartridge's EXROM and GAME lines select, with the CPU port at its
+        power up setting.
+        """
+        return (self.exrom & 1) << 4 | (self.game & 1) << 3 | 0x07
+
+    def bank_image(self, bank: int) -> ProgramImage:
+        """
+        Returns the image of a bank, building it from the bank's chips the first time it is asked for.
+
+        :param bank: bank number
+        :return: image holding the bank's chips at their load addresses
+        """
+        image = self.images.get(bank)
+        if image is None:
+            if bank not in self.chips:
+                raise CartridgeError('{} has no bank {}.'.format(self.file_name, bank))
+            image = ProgramImage()
+            for chip in self.chips[bank]:
+                data = self.view[chip.offset:chip.offset + chip.size]
+                image.place_data(data, chip.load_address, '{}:{}'.format(self.file_name, bank), 'CRT')
+                data.release()
+            self.images[bank] = image
+        return image
@@ -0,0 +1,276 @@
+"""
+Reads files from 1541, 1571 and 1581 disk images (D64, D71 and D81).
+
+The image is memory mapped and nothing is read up front. The directory is parsed a sector at a time as it is
+iterated, and the sector chain of a file is only followed when the file is loaded; its sectors are then
+copied straight from the map into a ProgramImage.
+
+Every sector starts with the track and sector of the next one in its chain. The last sector of a chain has
+track 0, and its sector byte is the offset of the last byte in use.
+"""
+import mmap
+import os
+from typing import Iterator, List, Optional, Tuple
+
+from Models.image_section import ImageSection
+from Models.programimage import ProgramImage
+
+SECTOR_SIZE = 256
+ENTRY_SIZE = 32
+
+FILE_TYPES = ('DEL', 'SEQ', 'PRG', 'USR', 'REL', 'CBM')
+
+# image size: (drive, tracks, has error bytes)
+IMAGE_SIZES = {
+    174848: ('1541', 35, False),
+    175531: ('1541', 35, True),
+    196608: ('1541', 40, False),
+    197376: ('1541', 40, True),
+    349696: ('1571', 70, False),
+    351062: ('1571', 70, True),
+    819200: ('1581', 80, False),
+    822400: ('1581', 80, True),
+}
+
+DISK_EXTENSIONS = ('.d64', '.d71', '.d81')
+
+
+class DiskError(Exception):
+    pass
+
+
+def is_disk_image(file_name: str) -> bool:
+    return os.path.splitext(file_name)[1].lower() in DISK_EXTENSIONS
+
+
+def sectors_per_track(drive: str, track: int) -> int:
+    if drive == '1581':
+        return 40
+    if drive == '1571' and track > 35:
+        track -= 35
+    if track <= 17:
+        return 21
+    if track <= 24:
+        return 19
+    if track <= 30:
+        return 18
+    return 17
+
+
+def petscii_name(raw: bytes) -> str:
+    """
+    Turns a PETSCII file name into text. Letters in either case set come out as upper case ASCII and
+    anything unprintable as '?'.
+    """
+    chars = list()
+    for value in raw:
+        if 0x20 <= value < 0x60:
+            chars.append(chr(value))
+        elif 0xC1 <= value <= 0xDA:
+            chars.append(chr(value - 0x80))
+        else:
+            chars.append('?')
+    return ''.join(chars)
+
+
+class DiskFile:
+    """
+    A directory entry. The file's sectors are not read until it is loaded.
+    """
+    disk: 'DiskImage'
+    raw_name: bytes
+    name: str
+    file_type: str
+    closed: bool
+    locked: bool
+    track: int
+    sector: int
+    blocks: int
+
+    def __init__(self, disk: 'DiskImage', entry: memoryview):
+        self.disk = disk
+        self.raw_name = bytes(entry[5:21]).rstrip(b'\xa0')
+        self.name = petscii_name(self.raw_name)
+        type_byte = entry[2]
+        self.file_type = FILE_TYPES[type_byte & 0x07] if type_byte & 0x07 < len(FILE_TYPES) else '???'
+        self.closed = bool(type_byte & 0x80)
+        self.locked = bool(type_byte & 0x40)
+        self.track = entry[3]
+        self.sector = entry[4]
+        self.blocks = entry[30] | entry[31] << 8
+
+    def __repr__(self):
+        return '{:5d} "{}" {}'.format(self.blocks, self.name, self.file_type)
+
+    def segments(self) -> List[memoryview]:
+        """
+        Follows the file's sector chain.
+
+        :return: slices of the image holding the file's data, in order
+        """
+        return [self.disk.view[offset:offset + length] for offset, length in self.disk.chain(self.track,
+                                                                                               self.sector)]
+
+    def size(self) -> int:
+        return sum(length for _, length in self.disk.chain(self.track, self.sector))
+
+    def read(self) -> bytes:
+        return b''.join(self.disk.view[offset:offset + length]
+                        for offset, length in self.disk.chain(self.track, self.sector))
+
+    def load_address(self) -> int:
+        start = b''
+        for offset, length in self.disk.chain(self.track, self.sector):
+            start += bytes(self.disk.view[offset:offset + min(length, 2 - len(start))])
+            if len(start) == 2:
+                return start[0] | start[1] << 8
+        raise DiskError('{} is too short to have a load address.'.format(self.name))
+
+    def load_into(self, image: ProgramImage, address: Optional[int] = None) -> Optional[ImageSection]:
+        """
+        Copies the file into an image, sector by sector, as a new section.
+
+        :param image: image to load the file into
+        :param address: address to load the file at; None loads a PRG at the load address in its first two
+            bytes
+        :return: section info for the file, None if it collides with a loaded section or does not fit
+        """
+        segments = self.segments()
+        sec_type = 'BIN'
+        if address is None:
+            address = self.load_address()
+            sec_type = 'PRG'
+            skip = 2
+            while skip and segments:
+                cut = min(skip, len(segments[0]))
+                segments[0] = segments[0][cut:]
+                skip -= cut
+                if not segments[0]:
+                    segments.pop(0)
+        try:
+            return image.place_segments(segments, address, '{}:{}'.format(self.disk.file_name, self.name),
+                                        sec_type)
+        finally:
+            for segment in segments:
+                segment.release()
+
+
+class DiskImage:
+    """
+    An open disk image. The directory is read as it is iterated.
+    """
+    file_name: str
+    drive: str
+    tracks: int
+    track_offsets: List[int]
+    view: memoryview
+
+    def __init__(self, file_name: str):
+        self.file_name = file_name
+        size = os.path.getsize(file_name)
+        if size not in IMAGE_SIZES:
+            raise DiskError('{} is not a D64, D71 or D81 image.'.format(file_name))
+        self.drive, self.tracks, _ = IMAGE_SIZES[size]
+
+        self.track_offsets = [0, 0]
+        for track in range(1, self.tracks + 1):
+            self.track_offsets.append(self.track_offsets[-1] + sectors_per_track(self.drive, track) * SECTOR_SIZE)
+
+        with open(file_name, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self._map)
+        self._files = None
+
+    def close(self):
+        self.view.release()
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def offset(self, track: int, sector: int) -> int:
+        if not 1 <= track <= self.tracks or not 0 <= sector < sectors_per_track(self.drive, track):
+            raise DiskError('Track {} sector {} is not on a {} disk.'.format(track, sector, self.drive))
+        return self.track_offsets[track] + sector * SECTOR_SIZE
+
+    def chain(self, track: int, sector: int) -> List[Tuple[int, int]]:
+        """
+        Follows a sector chain.
+
+        :param track: track of the first sector
+        :param sector: first sector
+        :return: (offset, length) in the image of the data of every sector of the chain
+        """
+        chain = list()
+        visited = set()
+        while True:
+            if (track, sector) in visited:
+                raise DiskError('Sector chain loops back to track {} sector {}.'.format(track, sector))
+            visited.add((track, sector))
+            offset = self.offset(track, sector)
+            track, sector = self.view[offset], self.view[offset + 1]
+            if track == 0:
+                chain.append((offset + 2, max(sector - 1, 0)))
+                return chain
+            chain.append((offset + 2, SECTOR_SIZE - 2))
+
+    @property
+    def header_location(self) -> Tuple[int, int, int]:
+        """
+        Track, sector and offset of the disk name.
+        """
+        if self.drive == '1581':
+            return 40, 0, 0x04
+        return 18, 0, 0x90
+
+    @property
+    def directory_start(self) -> Tuple[int, int]:
+        if self.drive == '1581':
+            return 40, 3
+        return 18, 1
+
+    def disk_name(self) -> str:
+        track, sector, offset = self.header_location
+        start = self.offset(track, sector) + offset
+        return petscii_name(bytes(self.view[start:start + 16]).rstrip(b'\xa0'))
+
+    def entries(self) -> Iterator[DiskFile]:
+        """
+        Iterates the directory, reading each directory sector only when the entries before it are used up.
+        Scratched entries are skipped.
+        """
+        if self._files is not None:
+            yield from self._files
+            return
+
+        files = list()
+        track, sector = self.directory_start
+        visited = set()
+        while track != 0 and (track, sector) not in visited:
+            visited.add((track, sector))
+            offset = self.offset(track, sector)
+            for entry_offset in range(offset, offset + SECTOR_SIZE, ENTRY_SIZE):
+                entry = self.view[entry_offset:entry_offset + ENTRY_SIZE]
+                disk_file = DiskFile(self, entry) if entry[2] & 0x87 else None
+                # released before yielding, so an abandoned iteration does not keep the map from closing
+                entry.release()
+                if disk_file is not None:
+                    files.append(disk_file)
+                    yield disk_file
+            track, sector = self.view[offset], self.view[offset + 1]
+        self._files = files
+
+    def files(self) -> List[DiskFile]:
+        return list(self.entries())
+
+    def find(self, name: str) -> Optional[DiskFile]:
+        """
+        Finds a file by name, reading no more of the directory than it takes.
+        """
+        for disk_file in self.entries():
+            if disk_file.name == name:
+                return disk_file
+        return None
@@ -0,0 +1,157 @@
+"""
+Finds packed data and graphics in loaded sections with a sliding window scan, so the disassembly does not
+read them as code.
+
+Every window of WINDOW_SIZE bytes, stepped WINDOW_STEP bytes at a time, is measured without a Python loop
+over its bytes:
+
+    distinct    number of different byte values, from a set of the window. A window can hold at most
+                log2(distinct) bits of entropy per byte; code rarely uses more than 130 values in 256
+                bytes, while packed data uses around 160.
+    bit change  average number of bits that differ between neighbouring bytes, from one XOR of the window
+                read as two big integers, shifted a byte apart. Glyph and bitmap rows look like the rows
+                above and below them, so graphics change far fewer bits than code or text.
+    entropy     Shannon entropy of the byte histogram in bits per byte, counted by collections.Counter and
+                summed from a table of c * log2(c). It is the dearest of the three, so it is only worked
+                out for windows that may hold graphics.
+
+Windows with many distinct values are candidates for packed data, and windows with moderate entropy and
+few changing bits for graphics, charsets or bitmaps. Neighbouring candidate windows of the same kind are
+merged into regions. A packed region is only kept when zlib cannot compress it, which is checked once for
+the whole region rather than per window (Exomizer and other crunched payloads do not compress). Regions
+shorter than MIN_PACKED_SIZE or MIN_GRAPHICS_SIZE are dropped, since short tables in ROM code look the
+same.
+
+The scan was specified with NumPy histograms; NumPy is not a dependency, and these measures keep a whole
+64K image within a few milliseconds without it.
+"""
+import math
+import zlib
+from collections import Counter
+from typing import List
+
+from Controller.tracing import traced
+from Models.programimage import ProgramImage
+
+WINDOW_SIZE = 256
+WINDOW_STEP = 128
+MIN_WINDOW_SIZE = 64
+
+PACKED_DISTINCT = 140
+PACKED_RATIO = 0.97
+MIN_PACKED_SIZE = 512
+GRAPHICS_MIN_DISTINCT = 3
+GRAPHICS_MIN_ENTROPY = 1.5
+GRAPHICS_MAX_ENTROPY = 5.0
+GRAPHICS_BIT_CHANGE = 2.2
+MIN_GRAPHICS_SIZE = 1024
+
+KIND_PACKED = 'packed'
+KIND_GRAPHICS = 'graphics'
+
+# c * log2(c) for every count a window can hold
+_C_LOG_C = [0.0] + [count * math.log2(count) for count in range(1, WINDOW_SIZE + 1)]
+
+
+class DataRegion:
+    start_address: int
+    end_address: int
+    kind: str
+
+    def __init__(self, start_address: int, end_address: int, kind: str):
+        self.start_address = start_address
+        self.end_address = end_address
+        self.kind = kind
+
+    def __repr__(self):
+        return '${:04X}-${:04X} {}'.format(self.start_address, self.end_address, self.kind)
+
+
+def window_entropy(window: bytes) -> float:
+    """
+    Entropy of a window of at most WINDOW_SIZE bytes, in bits per byte.
+    """
+    size = len(window)
+    return math.log2(size) - sum(map(_C_LOG_C.__getitem__, Counter(window).values())) / size
+
+
+def window_bit_change(window: bytes) -> float:
+    """
+    Average number of bits that change from one byte of a window to the next.
+    """
+    changed = int.from_bytes(window[:-1], 'big') ^ int.from_bytes(window[1:], 'big')
+    return bin(changed).count('1') / (len(window) - 1)
+
+
+def classify_window(window: bytes):
+    """
+    :return: KIND_PACKED or KIND_GRAPHICS for a window that may be either, otherwise None
+    """
+    distinct = len(set(window))
+    if distinct >= PACKED_DISTINCT:
+        return KIND_PACKED
+    if distinct >= GRAPHICS_MIN_DISTINCT and window_bit_change(window) <= GRAPHICS_BIT_CHANGE and \
+            GRAPHICS_MIN_ENTROPY <= window_entropy(window) <= GRAPHICS_MAX_ENTROPY:
+        return KIND_GRAPHICS
+    return None
+
+
+def is_incompressible(data) -> bool:
+    return len(zlib.compress(data, 6)) >= PACKED_RATIO * len(data)
+
+
+def scan_range(memory: bytearray, start: int, end: int) -> List[DataRegion]:
+    """
+    Scans an address range for packed data and graphics.
+
+    :param memory: the 64K of an image
+    :param start: first address to scan
+    :param end: address after the last one
+    :return: flagged regions in address order, not overlapping
+    """
+    # candidate windows are merged per kind, so a run of one kind is not cut short by a window of the other
+    runs = {KIND_PACKED: list(), KIND_GRAPHICS: list()}
+    window_start = start
+    while window_start < end:
+        window_end = min(window_start + WINDOW_SIZE, end)
+        if window_end - window_start < MIN_WINDOW_SIZE:
+            break
+        kind = classify_window(memory[window_start:window_end])
+        if kind is not None:
+            regions = runs[kind]
+            if regions and window_start <= regions[-1].end_address:
+                regions[-1].end_address = window_end
+            else:
+                regions.append(DataRegion(window_start, window_end, kind))
+        window_start += WINDOW_STEP
+
+    kept = list()
+    for region in runs[KIND_PACKED]:
+        if region.end_address - region.start_address >= MIN_PACKED_SIZE and \
+                is_incompressible(memory[region.start_address:region.end_address]):
+            kept.append(region)
+    for region in runs[KIND_GRAPHICS]:
+        if region.end_address - region.start_address >= MIN_GRAPHICS_SIZE:
+            kept.append(region)
+
+    # only regions that are kept share their edge windows
+    kept.sort(key=lambda region: region.start_address)
+    regions = list()
+    for region in kept:
+        if regions and region.start_address < regions[-1].end_address:
+            region.start_address = regions[-1].end_address
+            if region.start_address >= region.end_address:
+                continue
+        regions.append(region)
+    return regions
+
+
+@traced('scan_image', 'analysis')
+def scan_image(image: ProgramImage) -> List[DataRegion]:
+    """
+    Scans the loaded sections of an image for packed data and graphics.
+    """
+    regions = list()
+    for section in sorted(image.sections, key=lambda s: s.start_address):
+        regions += scan_range(image.program_image, section.start_address, section.end_address)
+    return regions
@@ -0,0 +1,225 @@
+"""
+Exports the current memory configuration of a ProjectMember as 6502 assembler source.
+
+Every loaded section that is mapped in becomes a block starting with ``* = $XXXX``. Code items are
+disassembled; an opcode that is not documented, or an instruction that would run past the end of its item,
+is written as a byte instead. Data and unknown items are written as ``.byte`` lines and text items as
+``.text`` where the bytes are printable.
+
+Symbols become labels where they fall on the start of a line and equates everywhere else. Operands only
+refer to symbols of $0100 and up, and absolute operands below $0100 are written with four digits, so the
+source keeps the exact encoding when it is assembled again.
+"""
+import re
+from bisect import bisect_left
+from typing import List, Tuple
+
+from Models.cpu6502 import OPCODES, MODE_SIZES, ABSOLUTE, ABSOLUTE_X, ABSOLUTE_Y, ACCUMULATOR, IMMEDIATE, \
+    IMPLIED, INDIRECT, INDIRECT_X, INDIRECT_Y, RELATIVE, ZERO_PAGE, ZERO_PAGE_X, ZERO_PAGE_Y
+from Models.project_member import ProjectMember
+
+BYTES_PER_LINE = 8
+INDENT = ' ' * 8
+COMMENT_COLUMN = 32
+
+_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+_MNEMONIC_NAMES = frozenset(mnemonic for mnemonic, _ in OPCODES.values()) | {'A', 'X', 'Y'}
+
+
+def mapped_ranges(member: ProjectMember) -> List[Tuple[int, int]]:
+    """
+    Returns the address ranges of the current configuration that hold loaded sections, in address order.
+    Neighbouring ranges are merged.
+    """
+    ranges = list()
+    for (region_start, region_end), bank_name in zip(member.region_list, member.region_types):
+        for section in member.images[bank_name].sections:
+            start = max(section.start_address, region_start)
+            end = min(section.end_address, region_end)
+            if start < end:
+                ranges.append((start, end))
+    ranges.sort()
+
+    merged = list()
+    for start, end in ranges:
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(end, merged[-1][1]))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class _Writer:
+    member: ProjectMember
+    memory: bytearray
+    labels: dict
+    lines: List[str]
+    placed: set
+
+    def __init__(self, member: ProjectMember):
+        self.member = member
+        self.memory = member.current_image.program_image
+        self.labels = {address: name for address, name in member.symbols.items()
+                       if _IDENTIFIER.match(name) and name.upper() not in _MNEMONIC_NAMES}
+        self.lines = list()
+        self.placed = set()
+
+    def address_text(self, address: int) -> str:
+        name = self.labels.get(address) if address >= 0x100 else None
+        return name if name is not None else '${:04X}'.format(address)
+
+    def emit(self, address: int, text: str):
+        name = self.labels.get(address)
+        if name is not None and address not in self.placed:
+            self.lines.append(name + ':')
+            self.placed.add(address)
+        comment = self.member.comments.get(address)
+        if comment:
+            text = '{:{}}; {}'.format(INDENT + text, COMMENT_COLUMN, comment.replace('\n', ' '))
+        else:
+            text = INDENT + text
+        self.lines.append(text)
+
+    def breaks(self, start: int, end: int) -> List[int]:
+        """
+        Addresses between start and end where a data line has to be cut, so a label or comment can go on it.
+        """
+        return sorted(address for address in range(start + 1, end)
+                      if address in self.labels or address in self.member.comments)
+
+    def data(self, start: int, end: int):
+        cuts = self.breaks(start, end) + [end]
+        position = start
+        for cut in cuts:
+            while position < cut:
+                line_end = min(position + BYTES_PER_LINE, cut)
+                self.emit(position, '.byte ' + ','.join('${:02X}'.format(value)
+                                                        for value in self.memory[position:line_end]))
+                position = line_end
+
+    def text(self, start: int, end: int):
+        chunk = self.memory[start:end]
+        if all(0x20 <= value < 0x7F and value != 0x22 for value in chunk) and not self.breaks(start, end):
+            self.emit(start, '.text "{}"'.format(chunk.decode('ascii')))
+        else:
+            self.data(start, end)
+
+    def code(self, start: int, end: int):
+        address = start
+        memory = self.memory
+        while address < end:
+            entry = OPCODES.get(memory[address])
+            size = MODE_SIZES[entry[1]] if entry is not None else 1
+            if entry is None or address + size > end:
+                self.emit(address, '.byte ${:02X}'.format(memory[address]))
+                address += 1
+                continue
+
+            mnemonic, mode = entry
+            if size == 3:
+                value = memory[address + 1] | memory[address + 2] << 8
+            elif size == 2:
+                value = memory[address + 1]
+            else:
+                value = 0
+            self.emit(address, (mnemonic + ' ' + self.operand(address, mode, value)).rstrip())
+            address += size
+
+    def operand(self, address: int, mode: str, value: int) -> str:
+        if mode == IMPLIED:
+            return ''
+        if mode == ACCUMULATOR:
+            return 'A'
+        if mode == IMMEDIATE:
+            return '#${:02X}'.format(value)
+        if mode == ZERO_PAGE:
+            return '${:02X}'.format(value)
+        if mode == ZERO_PAGE_X:
+            return '${:02X},X'.format(value)
+        if mode == ZERO_PAGE_Y:
+            return '${:02X},Y'.format(value)
+        if mode == INDIRECT_X:
+            return '(${:02X},X)'.format(value)
+        if mode == INDIRECT_Y:
+            return '(${:02X}),Y'.format(value)
+        if mode == RELATIVE:
+            target = (address + 2 + (value - 0x100 if value & 0x80 else value)) & 0xFFFF
+            return self.address_text(target)
+        text = self.address_text(value)
+        if mode == ABSOLUTE:
+            return text
+        if mode == ABSOLUTE_X:
+            return text + ',X'
+        if mode == ABSOLUTE_Y:
+            return text + ',Y'
+        if mode == INDIRECT:
+            return '(' + text + ')'
+        raise ValueError('Unknown addressing mode {}.'.format(mode))
+
+
+def export_lines(member: ProjectMember) -> List[str]:
+    """
+    Exports a member as lines of assembler source.
+
+    :param member: member to export
+    :return: the source lines, without line ends
+    """
+    writer = _Writer(member)
+    items = member.mappings
+    starts = [item.start_address for item in items]
+
+    for start, end in mapped_ranges(member):
+        writer.lines.append('')
+        writer.lines.append('* = ${:04X}'.format(start))
+        position = start
+        index = max(bisect_left(starts, start) - 1, 0)
+        while position < end:
+            while index < len(items) and items[index].end_address <= position:
+                index += 1
+            item = items[index] if index < len(items) else None
+            if item is None or item.start_address >= end:
+                writer.data(position, end)
+                break
+            if item.start_address > position:
+                writer.data(position, item.start_address)
+                position = item.start_address
+                continue
+
+            item_end = min(item.end_address, end)
+            if item.item_type == 'Code':
+                writer.code(position, item_end)
+            elif item.item_type == 'Text':
+                writer.text(position, item_end)
+            else:
+                writer.data(position, item_end)
+            position = item_end
+
+    header = ['; {} ({}, configuration {})'.format(member.image_name, member.machine_type,
+                                                   member.machine_config)]
+    for address, name in sorted(writer.labels.items()):
+        if address not in writer.placed:
+            header.append('{} = ${:04X}'.format(name, address))
+    return header + writer.lines
+
+
+def disassemble(member: ProjectMember, start: int, end: int) -> List[str]:
+    """
+    Disassembles an address range of the current configuration as code, whatever items cover it, in the
+    same form as export_lines.
+
+    :param member: member to disassemble
+    :param start: address of the first instruction
+    :param end: address after the range
+    :return: the source lines
+    """
+    writer = _Writer(member)
+    writer.code(start, min(end, len(writer.memory)))
+    return writer.lines
+
+
+def export_source(member: ProjectMember, file_name: str):
+    with open(file_name, 'w') as f:
+        for line in export_lines(member):
+            f.write(line)
+            f.write('\n')
+
@@ -0,0 +1,112 @@
+from typing import Dict, List, Optional, Tuple
+
+from Models.persistent import PersistentMap, VersionedMap, BITS
+
+# Rough size of one copied trie node, used to keep the retained history under its memory cap
+NODE_BYTES = 200
+
+
+class History:
+    """
+    Undo and redo over a set of VersionedMaps. A version of every store is kept for each committed step;
+    since the stores share all unchanged nodes between versions, a step only costs the nodes its changes
+    copied. Undo and redo swap the store versions back in and report the keys that changed, found by
+    comparing the versions, so both are proportional to the size of the step.
+
+    The oldest steps are dropped once the estimated memory held by the history passes max_bytes.
+    """
+    stores: Dict[str, VersionedMap]
+    current: Dict[str, PersistentMap]
+    undo_steps: List[Tuple[str, Dict[str, PersistentMap], int]]
+    redo_steps: List[Tuple[str, Dict[str, PersistentMap], int]]
+    max_bytes: int
+    retained_bytes: int
+
+    def __init__(self, stores: Dict[str, VersionedMap], max_bytes: int = 16 * 1024 * 1024):
+        self.stores = stores
+        self.max_bytes = max_bytes
+        self.undo_steps = list()
+        self.redo_steps = list()
+        self.retained_bytes = 0
+        self.current = self._snapshot()
+
+    def _snapshot(self) -> Dict[str, PersistentMap]:
+        return {name: store.snapshot() for name, store in self.stores.items()}
+
+    def commit(self, label: str) -> bool:
+        """
+        Records everything changed since the last commit as one undo step.
+
+        :param label: description of the step, such as 'Retype $C000-$CFFF'
+        :return: True if anything had changed
+        """
+        snapshot = self._snapshot()
+        cost = 0
+        for name, version in snapshot.items():
+            if version is not self.current[name]:
+                depth = version.shift // BITS + 1
+                cost += len(version.diff(self.current[name])) * depth * NODE_BYTES
+        if cost == 0:
+            return False
+
+        self.undo_steps.append((label, self.current, cost))
+        self.retained_bytes += cost
+        self.current = snapshot
+        for _, _, redo_cost in self.redo_steps:
+            self.retained_bytes -= redo_cost
+        self.redo_steps = list()
+
+        while self.retained_bytes > self.max_bytes and len(self.undo_steps) > 1:
+            _, _, dropped_cost = self.undo_steps.pop(0)
+            self.retained_bytes -= dropped_cost
+        return True
+
+    def can_undo(self) -> bool:
+        return bool(self.undo_steps)
+
+    def can_redo(self) -> bool:
+        return bool(self.redo_steps)
+
+    def undo_label(self) -> Optional[str]:
+        return self.undo_steps[-1][0] if self.undo_steps else None
+
+    def redo_label(self) -> Optional[str]:
+        return self.redo_steps[-1][0] if self.redo_steps else None
+
+    def undo(self) -> Dict[str, List[int]]:
+        """
+        Steps back to the versions before the last committed step. Uncommitted changes are thrown away.
+
+        :return: the changed keys of each store
+        """
+        if not self.undo_steps:
+            return dict()
+        label, previous, cost = self.undo_steps.pop()
+        self.redo_steps.append((label, self.current, cost))
+        return self._switch(previous)
+
+    def redo(self) -> Dict[str, List[int]]:
+        """
+        Steps forward again to the versions after the last undone step.
+
+        :return: the changed keys of each store
+        """
+        if not self.redo_steps:
+            return dict()
+        label, following, cost = self.redo_steps.pop()
+        self.undo_steps.append((label, self.current, cost))
+        return self._switch(following)
+
+    def _switch(self, target: Dict[str, PersistentMap]) -> Dict[str, List[int]]:
+        changes = dict()
+        for name, store in self.stores.items():
+            changes[name] = store.snapshot().diff(target[name])
+            store.restore(target[name])
+        self.current = target
+        return changes
+
+    def clear(self):
+        self.undo_steps = list()
+        self.redo_steps = list()
+        self.retained_bytes = 0
+        self.current = self._snapshot()
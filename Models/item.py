@@ -1,6 +1,4 @@
-from typing import Tuple, Optional
-
-import urwid
+from typing import Tuple, Optional, Any
 
 from Models.programimage import ProgramImage
 
@@ -15,7 +13,8 @@ class Item:
     def size(self):
         return self.end_address - self.start_address
 
-    view_id: Optional[Tuple[urwid.SimpleListWalker, int]]
+    # (list walker, position) of the row showing the item, set by the view layer
+    view_id: Optional[Tuple[Any, int]]
 
     def __init__(self, image, start, end, item_type):
         self.image = image
@@ -25,7 +24,7 @@ class Item:
 
         self.view_id = None
 
-    def get_view(self, vid: Optional[Tuple[urwid.SimpleListWalker, int]] = None):
+    def get_view(self, vid: Optional[Tuple[Any, int]] = None):
         self.view_id = vid
 
 
@@ -0,0 +1,319 @@
+"""
+Append only journal of user annotations, so a label, comment or item type change does not need a full
+project save. Edits are applied to the project straight away and their records are kept in memory; a batch
+is appended to the journal file and fsync'd once it holds batch_size records or batch_interval seconds have
+passed since the last one was written, so a crash loses at most one batch. A timer is started with the
+first record of a batch, so a batch is written on time even when no further edit follows it.
+
+Compaction writes a new cache snapshot of the project and starts an empty journal. The journal is rotated
+first, so edits made while the snapshot is written go to the new journal, and the old one is only deleted
+once the snapshot is safely on disk. Replaying a journal onto a snapshot that already holds its edits is
+harmless since every record sets a value.
+
+Every edit made through the journal is committed as a step of the member's undo history. Bulk edits, a
+symbol import or marking the code found by the analysis, are recorded as the values they set. Undo and redo
+go through the journal as well. They are not recorded as steps, since the history is not kept on disk, but as
+the values they put back: a label, comment or item record for every address the step changed, after a
+configuration record if the step switched memory configurations. Memory configuration switches are
+recorded too, so items are replayed into the configuration they were made in.
+
+Each record is a CRC32 of the record, the operation, member index, start and end address, and the length
+of the UTF-8 text that follows. Replay stops at the first record that is cut short or fails its CRC.
+"""
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from Models.item import Item
+from Models.project import Project
+from Models.project_cache import load_project, snapshot_project, write_snapshot
+from Models.project_member import ProjectMember
+from Models.unknown_area import UnknownArea
+
+RECORD = struct.Struct('<IBHIIH')
+
+OP_LABEL = 1
+OP_COMMENT = 2
+OP_RETYPE = 3
+# the item at the start address, or no item when the text is empty
+OP_ITEM = 4
+# start is the memory configuration and end the cartridge bank
+OP_CONFIG = 5
+
+# undo step names of the edits; a configuration switch commits its own step
+_STEP_NAMES = {OP_LABEL: 'Label', OP_COMMENT: 'Comment', OP_RETYPE: 'Retype', OP_ITEM: 'Item'}
+
+
+def journal_name(cache_file: str) -> str:
+    return cache_file + '.journal'
+
+
+def old_journal_name(cache_file: str) -> str:
+    return cache_file + '.journal.old'
+
+
+def apply_record(project: Project, op: int, member_index: int, start: int, end: int, text: str):
+    member = project.members[member_index]
+    if op == OP_LABEL:
+        store = member.symbols
+    elif op == OP_COMMENT:
+        store = member.comments
+    elif op == OP_RETYPE:
+        member.retype_item(start, end, text)
+        return
+    elif op == OP_ITEM:
+        item = member.find_item(start)
+        if text:
+            image = member.images[member.bank_name(start)]
+            member.add_item(UnknownArea(image, start, end) if text == 'Unknown' else Item(image, start, end, text))
+        elif item is not None:
+            member.remove_item(item)
+        return
+    elif op == OP_CONFIG:
+        member.cartridge_bank = end
+        member.change_config(start)
+        return
+    else:
+        raise ValueError('Unknown journal operation {}.'.format(op))
+
+    if text:
+        store[start] = text
+    else:
+        store.pop(start, None)
+
+
+def replay(file_name: str, project: Project) -> int:
+    """
+    Applies the records of a journal file to a project.
+
+    :param file_name: journal file to replay
+    :param project: project to apply the records to
+    :return: number of records applied
+    """
+    try:
+        with open(file_name, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return 0
+
+    view = memoryview(data)
+    offset = 0
+    count = 0
+    while offset + RECORD.size <= len(view):
+        crc, op, member_index, start, end, length = RECORD.unpack_from(view, offset)
+        record_end = offset + RECORD.size + length
+        if record_end > len(view) or zlib.crc32(view[offset + 4:record_end]) != crc:
+            break
+        text = str(view[offset + RECORD.size:record_end], 'utf-8')
+        apply_record(project, op, member_index, start, end, text)
+        offset = record_end
+        count += 1
+    return count
+
+
+def open_project(cache_file: str, validate: bool = True) -> Optional[Project]:
+    """
+    Loads a project from its cache file and replays the journals written since the snapshot. The members
+start with an empty undo history, as after loading the cache alone.
+
+    :param cache_file: cache file of the project
+    :param validate: check the source ROM files against the hashes stored in the cache
+    :return: the project, or None if there is no usable cache
+    """
+    project = load_project(cache_file, validate)
+    if project is not None:
+        replay(old_journal_name(cache_file), project)
+        replay(journal_name(cache_file), project)
+        for member in project.members:
+            member.history.clear()
+    return project
+
+
+class AnnotationJournal:
+    project: Project
+    cache_file: str
+    batch_size: int
+    batch_interval: float
+    compact_size: int
+    pending: bytearray
+    pending_count: int
+    last_write: float
+
+    def __init__(self, project: Project, cache_file: str, batch_size: int = 64, batch_interval: float = 0.5,
+                 compact_size: int = 1024 * 1024):
+        self.project = project
+        self.cache_file = cache_file
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.compact_size = compact_size
+        self.pending = bytearray()
+        self.pending_count = 0
+        self.last_write = time.monotonic()
+        self._file = open(journal_name(cache_file), 'ab')
+        # guards the pending records and the file against the timer thread
+        self._lock = threading.RLock()
+        self._timer = None
+
+    def set_label(self, member_index: int, address: int, text: str):
+        self._record(OP_LABEL, member_index, address, address, text)
+
+    def set_comment(self, member_index: int, address: int, text: str):
+        self._record(OP_COMMENT, member_index, address, address, text)
+
+    def retype(self, member_index: int, start: int, end: int, item_type: str):
+        self._record(OP_RETYPE, member_index, start, end, item_type)
+
+    def change_config(self, member_index: int, mode: int, cartridge_bank: Optional[int] = None):
+        """
+        Switches the memory configuration, and the cartridge bank if one is given, of a member.
+        """
+        if cartridge_bank is None:
+            cartridge_bank = self.project.members[member_index].cartridge_bank
+        self._record(OP_CONFIG, member_index, mode, cartridge_bank, '')
+
+    def import_symbols(self, member_index: int, symbols: Iterable[Tuple[int, str]], replace: bool = True) -> int:
+        """
+        Imports symbols into a member as one undo step, see ProjectMember.import_symbols().
+
+        :return: number of symbols added or changed
+        """
+        return self._record_edit(member_index, lambda member: member.import_symbols(symbols, replace))
+
+    def mark_code(self, member_index: int) -> int:
+        """
+        Adds items for the code and data the analysis found in a member, see Project.mark_code().
+
+        :return: number of items added
+        """
+        return self._record_edit(member_index, self.project.mark_code)
+
+    def undo(self, member_index: int) -> Dict[str, List[int]]:
+        """
+        Undoes the last step of a member's history and records the values it put back.
+
+        :return: the changed addresses of each store, as ProjectMember.undo() returns them
+        """
+        changes = self.project.members[member_index].undo()
+        self._record_changes(member_index, changes)
+        return changes
+
+    def redo(self, member_index: int) -> Dict[str, List[int]]:
+        changes = self.project.members[member_index].redo()
+        self._record_changes(member_index, changes)
+        return changes
+
+    def _record_edit(self, member_index: int, edit: Callable[[ProjectMember], int]) -> int:
+        member = self.project.members[member_index]
+        before = {name: store.snapshot() for name, store in member.history.stores.items()}
+        result = edit(member)
+        self._record_changes(member_index, {name: store.snapshot().diff(before[name])
+                                            for name, store in member.history.stores.items()})
+        return result
+
+    def _record_changes(self, member_index: int, changes: Dict[str, List[int]]):
+        member = self.project.members[member_index]
+        if changes.get('config'):
+            self._append(OP_CONFIG, member_index, member.machine_config, member.cartridge_bank, '')
+        for address in changes.get('items', list()):
+            item = member.item_store.get(address)
+            if item is None:
+                self._append(OP_ITEM, member_index, address, address, '')
+            else:
+                self._append(OP_ITEM, member_index, address, item.end_address, item.item_type)
+        for op, name, store in ((OP_LABEL, 'symbols', member.symbols), (OP_COMMENT, 'comments', member.comments)):
+            for address in changes.get(name, list()):
+                self._append(op, member_index, address, address, store.get(address, ''))
+
+    def _record(self, op: int, member_index: int, start: int, end: int, text: str):
+        apply_record(self.project, op, member_index, start, end, text)
+        if op in _STEP_NAMES:
+            self.project.members[member_index].history.commit('{} ${:04X}'.format(_STEP_NAMES[op], start))
+        self._append(op, member_index, start, end, text)
+
+    def _append(self, op: int, member_index: int, start: int, end: int, text: str):
+        encoded = text.encode('utf-8')
+        body = RECORD.pack(0, op, member_index, start, end, len(encoded))[4:] + encoded
+        with self._lock:
+            self.pending += struct.pack('<I', zlib.crc32(body))
+            self.pending += body
+            self.pending_count += 1
+
+            delay = self.last_write + self.batch_interval - time.monotonic()
+            if self.pending_count < self.batch_size and delay > 0:
+                if self._timer is None:
+                    self._timer = threading.Timer(delay, self.sync)
+                    self._timer.daemon = True
+                    self._timer.start()
+                return
+            self.sync()
+
+    def sync(self):
+        """
+        Appends the pending records to the journal file and waits for them to reach the disk. Called by the
+        batch timer as well, from its own thread.
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self.pending:
+                self._file.write(self.pending)
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self.pending = bytearray()
+                self.pending_count = 0
+            self.last_write = time.monotonic()
+
+    def size(self) -> int:
+        with self._lock:
+            return self._file.tell() + len(self.pending)
+
+    def needs_compaction(self) -> bool:
+        """
+        Whether the journal has grown past compact_size, so replaying it costs more than loading a snapshot.
+        """
+        return self.size() >= self.compact_size
+
+    def start_compaction(self) -> list:
+        """
+        First half of a compaction, run on the thread that owns the project: syncs and rotates the journal
+        and takes a snapshot of the project. The snapshot is then written with finish_compaction(), which
+        can run on a worker thread.
+
+        :return: the snapshot blocks to pass to finish_compaction()
+        """
+        with self._lock:
+            self.sync()
+            self._file.close()
+            old_name = old_journal_name(self.cache_file)
+            if os.path.exists(old_name):
+                # an earlier compaction did not finish, keep its edits in front of the current ones
+                with open(old_name, 'ab') as old, open(journal_name(self.cache_file), 'rb') as current:
+                    old.write(current.read())
+                    old.flush()
+                    os.fsync(old.fileno())
+                os.remove(journal_name(self.cache_file))
+            else:
+                os.replace(journal_name(self.cache_file), old_name)
+            self._file = open(journal_name(self.cache_file), 'ab')
+        return snapshot_project(self.project)
+
+    def finish_compaction(self, blocks: list):
+        """
+        Second half of a compaction: writes the snapshot and drops the journal it replaces.
+
+        :param blocks: blocks returned by start_compaction()
+        """
+        write_snapshot(blocks, self.cache_file)
+        os.remove(old_journal_name(self.cache_file))
+
+    def compact(self):
+        self.finish_compaction(self.start_compaction())
+
+    def close(self):
+        with self._lock:
+            self.sync()
+            self._file.close()
@@ -0,0 +1,123 @@
+from typing import List, Optional
+
+from Controller.tracing import traced
+from Models.image_section import ImageSection
+from Models.project_member import ProjectMember
+
+PAGE_SIZE = 256
+
+KIND_UNMAPPED = 0
+KIND_UNKNOWN = 1
+KIND_CODE = 2
+KIND_DATA = 3
+KIND_TEXT = 4
+KIND_NAMES = ('unmapped', 'unknown', 'code', 'data', 'text')
+
+# Item types that map to a kind other than unknown
+ITEM_KINDS = {'Code': KIND_CODE, 'Data': KIND_DATA, 'Text': KIND_TEXT}
+
+
+class MemoryOverview:
+    """
+    Summary of what every 256 byte page of a ProjectMember's current memory configuration holds. A byte
+    table holds the kind of every address and is filled a whole item or region at a time with slice
+    assignments; the kind of a page is then taken from byte counts over its slice of that table. Pages are
+    only recomputed for the address ranges that change.
+    """
+    member: ProjectMember
+    byte_kinds: bytearray
+    page_kinds: bytearray
+    page_sections: List[Optional[ImageSection]]
+
+    def __init__(self, member: ProjectMember):
+        self.member = member
+        self.rebuild()
+
+    @property
+    def page_count(self):
+        return len(self.page_kinds)
+
+    @traced('MemoryOverview.rebuild', 'analysis')
+    def rebuild(self):
+        """
+        Recomputes the whole overview. Needed after the memory configuration of the member changes.
+        """
+        size = len(self.member.current_image)
+        self.byte_kinds = bytearray([KIND_UNKNOWN]) * size
+        self.page_kinds = bytearray([KIND_UNKNOWN]) * ((size + PAGE_SIZE - 1) // PAGE_SIZE)
+        self.page_sections = [None] * len(self.page_kinds)
+
+        for (start, end), region_type in zip(self.member.region_list, self.member.region_types):
+            if region_type == 'NONE':
+                self._fill(start, end, KIND_UNMAPPED)
+        for item in self.member.mappings:
+            self._fill_item(item)
+        self._update_pages(0, size)
+
+        for (start, end), region_type in zip(self.member.region_list, self.member.region_types):
+            for section in self.member.images[region_type].sections:
+                first = max(section.start_address, start)
+                last = min(section.end_address, end)
+                for page in range(first // PAGE_SIZE, (last + PAGE_SIZE - 1) // PAGE_SIZE):
+                    if self.page_sections[page] is None:
+                        self.page_sections[page] = section
+
+    def item_changed(self, item):
+        """
+        Updates the overview for an item that was added or retyped.
+
+        :param item: the changed item
+        """
+        self._fill_item(item)
+        self._update_pages(item.start_address, item.end_address)
+
+    def item_removed(self, item):
+        """
+        Updates the overview for an item that was removed; its addresses go back to unknown.
+
+        :param item: the removed item
+        """
+        self._fill(item.start_address, item.end_address, KIND_UNKNOWN)
+        self._update_pages(item.start_address, item.end_address)
+
+    def page_kind(self, page: int) -> str:
+        return KIND_NAMES[self.page_kinds[page]]
+
+    def coverage(self) -> dict:
+        """
+        Returns how many pages hold each kind.
+
+        :return: dictionary of kind name to page count
+        """
+        return {name: self.page_kinds.count(kind) for kind, name in enumerate(KIND_NAMES)}
+
+    def _fill_item(self, item):
+        self._fill(item.start_address, item.end_address, ITEM_KINDS.get(item.item_type, KIND_UNKNOWN))
+
+    def _fill(self, start: int, end: int, kind: int):
+        if kind != KIND_UNMAPPED:
+            # items never make unmapped memory mapped
+            for (region_start, region_end), region_type in zip(self.member.region_list,
+                                                                self.member.region_types):
+                if region_type == 'NONE' and start < region_end and region_start < end:
+                    self._fill(start, max(start, region_start), kind)
+                    self._fill(min(end, region_end), end, kind)
+                    return
+        if start < end:
+            self.byte_kinds[start:end] = bytes([kind]) * (end - start)
+
+    def _update_pages(self, start: int, end: int):
+        for page in range(start // PAGE_SIZE, (end + PAGE_SIZE - 1) // PAGE_SIZE):
+            page_bytes = self.byte_kinds[page * PAGE_SIZE:(page + 1) * PAGE_SIZE]
+            if page_bytes.count(KIND_UNMAPPED) == len(page_bytes):
+                self.page_kinds[page] = KIND_UNMAPPED
+                continue
+
+            kind = KIND_UNKNOWN
+            most = 0
+            for candidate in (KIND_CODE, KIND_DATA, KIND_TEXT):
+                count = page_bytes.count(candidate)
+                if count > most:
+                    kind = candidate
+                    most = count
+            self.page_kinds[page] = kind
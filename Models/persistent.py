@@ -0,0 +1,280 @@
+"""
+Persistent (immutable, structurally shared) map keyed by non-negative integers, used for the address keyed
+stores so that keeping old versions around for undo only costs the nodes that changed.
+
+The map is a 16 way trie of tuples. Setting or deleting a key copies the nodes on the path to it and shares
+every other node with the previous version, and two versions can be compared by walking only the nodes that
+are not shared.
+"""
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+BITS = 4
+WIDTH = 1 << BITS
+MASK = WIDTH - 1
+
+
+class _Absent:
+    def __repr__(self):
+        return '<absent>'
+
+
+ABSENT = _Absent()
+EMPTY_LEAF = (ABSENT,) * WIDTH
+EMPTY_INNER = (None,) * WIDTH
+
+
+class PersistentMap:
+    __slots__ = ('root', 'shift', 'count')
+
+    root: tuple
+    shift: int
+    count: int
+
+    def __init__(self, root: tuple = EMPTY_LEAF, shift: int = 0, count: int = 0):
+        self.root = root
+        self.shift = shift
+        self.count = count
+
+    @classmethod
+    def from_items(cls, pairs) -> 'PersistentMap':
+        """
+        Builds a map from (key, value) pairs in one pass, without copying paths for every key.
+
+        :param pairs: iterable of (key, value)
+        :return: the new map
+        """
+        leaves = dict()
+        for key, value in pairs:
+            leaf = leaves.get(key >> BITS)
+            if leaf is None:
+                leaf = leaves[key >> BITS] = list(EMPTY_LEAF)
+            leaf[key & MASK] = value
+        if not leaves:
+            return cls()
+
+        count = sum(WIDTH - leaf.count(ABSENT) for leaf in leaves.values())
+        level = {prefix: tuple(leaf) for prefix, leaf in leaves.items()}
+        shift = 0
+        while max(level) > 0:
+            parents = dict()
+            for prefix, node in level.items():
+                parent = parents.get(prefix >> BITS)
+                if parent is None:
+                    parent = parents[prefix >> BITS] = list(EMPTY_INNER)
+                parent[prefix & MASK] = node
+            level = {prefix: tuple(node) for prefix, node in parents.items()}
+            shift += BITS
+        return cls(level[0], shift, count)
+
+    def __len__(self):
+        return self.count
+
+    def get(self, key: int, default=None):
+        if key < 0 or key >> (self.shift + BITS):
+            return default
+        node = self.root
+        shift = self.shift
+        while shift:
+            node = node[(key >> shift) & MASK]
+            if node is None:
+                return default
+            shift -= BITS
+        value = node[key & MASK]
+        return default if value is ABSENT else value
+
+    def __contains__(self, key: int):
+        return self.get(key, ABSENT) is not ABSENT
+
+    def __getitem__(self, key: int):
+        value = self.get(key, ABSENT)
+        if value is ABSENT:
+            raise KeyError(key)
+        return value
+
+    def set(self, key: int, value) -> 'PersistentMap':
+        """
+        Returns a map with a key set, sharing everything off the key's path with this map.
+        """
+        if key < 0:
+            raise KeyError(key)
+        if not self.count:
+            shift = 0
+            while key >> (shift + BITS):
+                shift += BITS
+            root, _ = _set(None, shift, key, value)
+            return PersistentMap(root, shift, 1)
+
+        root = self.root
+        shift = self.shift
+        while key >> (shift + BITS):
+            root = (root,) + EMPTY_INNER[1:]
+            shift += BITS
+        root, added = _set(root, shift, key, value)
+        return PersistentMap(root, shift, self.count + added)
+
+    def delete(self, key: int) -> 'PersistentMap':
+        """
+        Returns a map without a key, sharing everything off the key's path with this map.
+        """
+        if key not in self:
+            return self
+        root = _delete(self.root, self.shift, key)
+        if root is None:
+            return PersistentMap()
+        return PersistentMap(root, self.shift, self.count - 1)
+
+    def items(self) -> Iterator[Tuple[int, Any]]:
+        """
+        Iterates the (key, value) pairs in key order.
+        """
+        return _items(self.root, self.shift, 0)
+
+    def keys(self) -> Iterator[int]:
+        return (key for key, _ in self.items())
+
+    def values(self) -> Iterator[Any]:
+        return (value for _, value in self.items())
+
+    def __iter__(self):
+        return self.keys()
+
+    def diff(self, other: 'PersistentMap') -> List[int]:
+        """
+        Returns the keys whose values differ between two maps, in key order. Nodes shared by both maps are
+        skipped, so the cost follows the number of changes rather than the size of the maps.
+
+        :param other: map to compare with
+        :return: list of changed keys
+        """
+        shift = max(self.shift, other.shift)
+        changed = list()
+        _diff(_raise_to(self.root, self.shift, shift), _raise_to(other.root, other.shift, shift), shift, 0,
+              changed)
+        return changed
+
+
+def _raise_to(node: Optional[tuple], shift: int, target: int) -> Optional[tuple]:
+    while shift < target:
+        node = (node,) + EMPTY_INNER[1:]
+        shift += BITS
+    return node
+
+
+def _set(node: Optional[tuple], shift: int, key: int, value) -> Tuple[tuple, int]:
+    index = (key >> shift) & MASK
+    if shift == 0:
+        if node is None:
+            node = EMPTY_LEAF
+        added = 1 if node[index] is ABSENT else 0
+        return node[:index] + (value,) + node[index + 1:], added
+    if node is None:
+        node = EMPTY_INNER
+    child, added = _set(node[index], shift - BITS, key, value)
+    return node[:index] + (child,) + node[index + 1:], added
+
+
+def _delete(node: tuple, shift: int, key: int) -> Optional[tuple]:
+    index = (key >> shift) & MASK
+    if shift == 0:
+        node = node[:index] + (ABSENT,) + node[index + 1:]
+        return None if all(value is ABSENT for value in node) else node
+    child = _delete(node[index], shift - BITS, key)
+    node = node[:index] + (child,) + node[index + 1:]
+    return None if all(entry is None for entry in node) else node
+
+
+def _items(node: Optional[tuple], shift: int, prefix: int):
+    if node is None:
+        return
+    if shift == 0:
+        for index, value in enumerate(node):
+            if value is not ABSENT:
+                yield prefix | index, value
+        return
+    for index, child in enumerate(node):
+        if child is not None:
+            yield from _items(child, shift - BITS, (prefix | index) << BITS)
+
+
+def _diff(a: Optional[tuple], b: Optional[tuple], shift: int, prefix: int, changed: List[int]):
+    if a is b:
+        return
+    if shift == 0:
+        a = EMPTY_LEAF if a is None else a
+        b = EMPTY_LEAF if b is None else b
+        for index in range(0, WIDTH):
+            if a[index] is not b[index]:
+                changed.append(prefix | index)
+        return
+    a = EMPTY_INNER if a is None else a
+    b = EMPTY_INNER if b is None else b
+    for index in range(0, WIDTH):
+        if a[index] is not b[index]:
+            _diff(a[index], b[index], shift - BITS, (prefix | index) << BITS, changed)
+
+
+class VersionedMap:
+    """
+    Mutable, dict like handle on a PersistentMap. Every change swaps in a new version of the map, and
+    snapshot() and restore() hand versions out and take them back in constant time.
+    """
+    __slots__ = ('map',)
+
+    map: PersistentMap
+
+    def __init__(self, initial: Optional[Dict[int, Any]] = None):
+        self.map = PersistentMap.from_items(sorted(initial.items())) if initial else PersistentMap()
+
+    def snapshot(self) -> PersistentMap:
+        return self.map
+
+    def restore(self, version: PersistentMap):
+        self.map = version
+
+    def __len__(self):
+        return len(self.map)
+
+    def __contains__(self, key):
+        return key in self.map
+
+    def __getitem__(self, key):
+        return self.map[key]
+
+    def get(self, key, default=None):
+        return self.map.get(key, default)
+
+    def __setitem__(self, key, value):
+        self.map = self.map.set(key, value)
+
+    def __delitem__(self, key):
+        if key not in self.map:
+            raise KeyError(key)
+        self.map = self.map.delete(key)
+
+    def pop(self, key, default=ABSENT):
+        value = self.map.get(key, ABSENT)
+        if value is ABSENT:
+            if default is ABSENT:
+                raise KeyError(key)
+            return default
+        self.map = self.map.delete(key)
+        return value
+
+    def __iter__(self):
+        return iter(self.map)
+
+    def keys(self):
+        return self.map.keys()
+
+    def values(self):
+        return self.map.values()
+
+    def items(self):
+        return self.map.items()
+
+    def __eq__(self, other):
+        if isinstance(other, VersionedMap):
+            other = dict(other.items())
+        return dict(self.items()) == other
+
+    __hash__ = None
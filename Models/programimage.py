@@ -1,5 +1,6 @@
 import struct
 
+from Controller.tracing import traced
 from Models.image_section import ImageSection
 
 
@@ -35,6 +36,7 @@ class ProgramImage:
     def __reversed__(self):
         return self.program_image.__reversed__()
 
+    @traced('ProgramImage.load_image', 'load')
     def load_image(self, filename):
         """
         Loads an image file into the image. The first two bytes of the image file is the location where
@@ -42,22 +44,17 @@ class ProgramImage:
 
         :param filename: Name of the file to load into the image
         :return: section info for the loaded filename, None if error occurred
+        :raises ValueError: when the file is too short to hold a load address
         """
         with open(filename, 'rb') as f:
             the_file = f.read()
 
+        if len(the_file) < 2:
+            raise ValueError('{} is too short to hold a load address.'.format(filename))
         address = struct.unpack_from('<H', the_file, 0)[0]
-        image = the_file[2::]
-        end_address = len(image) + address
-
-        if self.is_collision(address, end_address):
-            return None
-
-        section = ImageSection(address, end_address, filename, 'PRG')
-        self.program_image[address:end_address] = image
-        self.sections.append(section)
-        return section
+        return self.place_data(the_file[2::], address, filename, 'PRG')
 
+    @traced('ProgramImage.load_binary', 'load')
     def load_binary(self, filename: str, base: int):
         """
         Loads an image file into the image. All bytes in the image are considered data and thus, the base address
@@ -70,20 +67,55 @@ class ProgramImage:
         with open(filename, 'rb') as f:
             image = f.read()
 
-        end_address = len(image) + base
+        return self.place_data(image, base, filename, 'BIN')
+
+    def place_data(self, data, address: int, name: str, sec_type: str):
+        """
+        Places already read data into the image as a new section.
+
+        :param data: bytes like object holding the section contents
+        :param address: address to place the data at
+        :param name: name of the section, usually the file it came from
+        :param sec_type: section type, such as PRG or BIN
+        :return: section info for the data, None if it collides with a loaded section
+        """
+        end_address = len(data) + address
+
+        if self.is_collision(address, end_address):
+            return None
+
+        section = ImageSection(address, end_address, name, sec_type)
+        self.program_image[address:end_address] = data
+        self.sections.append(section)
+        return section
 
-        if self.is_collision(base, end_address):
+    def place_segments(self, segments, address: int, name: str, sec_type: str):
+        """
+        Places data that comes in pieces, such as the sectors of a file on a disk image, as one new section.
+        Each piece is copied straight into the image.
+
+        :param segments: list of bytes like objects, in order
+        :param address: address to place the data at
+        :param name: name of the section
+        :param sec_type: section type, such as PRG or BIN
+        :return: section info for the data, None if it collides with a loaded section or does not fit
+        """
+        end_address = address + sum(len(segment) for segment in segments)
+
+        if end_address > len(self.program_image) or self.is_collision(address, end_address):
             return None
 
-        section = ImageSection(base, end_address, filename, 'BIN')
-        self.program_image[base:end_address] = image
+        section = ImageSection(address, end_address, name, sec_type)
+        for segment in segments:
+            self.program_image[address:address + len(segment)] = segment
+            address += len(segment)
         self.sections.append(section)
         return section
 
     def define_section(self, address, size, name):
         end_address = address + size
 
-        if self.is_collision(address, size):
+        if self.is_collision(address, end_address):
             return None
 
         section = ImageSection(address, end_address, name, 'BSS')
@@ -119,11 +151,7 @@ class ProgramImage:
 
     def is_collision(self, start, end):
         for section in self.sections:
-            if start <= section.start_address < end:
-                return True
-            elif start <= section.end_address < end:
-                return True
-            elif section.start_address <= start < section.end_address:
+            if start < section.end_address and section.start_address < end:
                 return True
         return False
 
@@ -1,9 +1,149 @@
-from Models.programimage import ProgramImage
+"""
+A project is a workspace of several ProjectMembers that are worked on together, such as a C128 and the
+1571 attached to it, or a program and the loader that runs in the drive.
+
+The members share an AnalysisCache. Analysing a member looks up every loaded section it has mapped in by
+its address and bytes, so a ROM that two members hold at the same address is only disassembled once. The
+same analyses turn into items, one per line of a listing: every instruction of a run becomes a Code item,
+and packed data or graphics become Data items of DATA_ITEM_SIZE bytes.
+"""
+from typing import Dict, List, Optional
+
+from Controller.tracing import traced
+from Models.analysis import AnalysisCache
+from Models.cpu6502 import MODE_SIZES, OPCODES
+from Models.item import Item
+from Models.project_member import ProjectMember
+
+# shorter runs of instructions are left unknown, since data often decodes as a few instructions
+MIN_CODE_RUN = 3
+DATA_ITEM_SIZE = 8
 
 
 class Project:
     project_name: str
-    members: list
+    members: List[ProjectMember]
+    analysis_cache: AnalysisCache
+
+    def __init__(self, name=''):
+        self.project_name = name
+        self.members = list()
+        self.analysis_cache = AnalysisCache()
+
+    def add_member(self, member: ProjectMember) -> ProjectMember:
+        """
+        Adds a member to the project.
+
+        :raises ValueError: when the project already has a member of that name
+        """
+        if self.member(member.image_name) is not None:
+            raise ValueError('The project already has a member named {}.'.format(member.image_name))
+        self.members.append(member)
+        return member
+
+    def remove_member(self, member: ProjectMember):
+        self.members.remove(member)
+
+    def member(self, name: str) -> Optional[ProjectMember]:
+        for member in self.members:
+            if member.image_name == name:
+                return member
+        return None
+
+    @traced('Project.analyse', 'analysis')
+    def analyse(self, member: ProjectMember) -> Dict[int, List[int]]:
+        """
+        Works out the cross references of a member's current memory configuration, from the analyses of the
+        sections it has mapped in, and stores them in the member's xrefs.
+
+        :param member: member to analyse, which does not have to belong to the project
+        :return: the member's xrefs, source addresses of every referenced address in ascending order
+        """
+        xrefs = dict()
+        for (region_start, region_end), bank_name in zip(member.region_list, member.region_types):
+            image = member.images[bank_name]
+            for section in image.sections:
+                if section.end_address <= region_start or section.start_address >= region_end:
+                    continue
+                analysis = self.analysis_cache.get(image, section)
+                for target, source in analysis.xrefs:
+                    if region_start <= source < region_end:
+                        xrefs.setdefault(target, list()).append(source)
+
+        for sources in xrefs.values():
+            sources.sort()
+        member.xrefs = xrefs
+        return xrefs
+
+    @traced('Project.mark_code', 'analysis')
+    def mark_code(self, member: ProjectMember) -> int:
+        """
+        Adds items for what the analyses of a member's mapped sections found: a Code item for every
+        instruction of a run of at least MIN_CODE_RUN consecutive ones, and Data items over every packed data
+        or graphics region. Addresses already covered by an item are left alone. The new items are one undo
+        step.
+
+        :param member: member to add the items to, which does not have to belong to the project
+        :return: number of items added
+        """
+        added = list()
+        for (region_start, region_end), bank_name in zip(member.region_list, member.region_types):
+            image = member.images[bank_name]
+            for section in image.sections:
+                if section.end_address <= region_start or section.start_address >= region_end:
+                    continue
+                analysis = self.analysis_cache.get(image, section)
+                for region in analysis.data_regions:
+                    end = min(region.end_address, region_end)
+                    for start in range(max(region.start_address, region_start), end, DATA_ITEM_SIZE):
+                        added.append(Item(image, start, min(start + DATA_ITEM_SIZE, end), 'Data'))
+                added += _code_runs(image, analysis.instructions, region_start, region_end)
+
+        count = 0
+        for item in added:
+            if item.start_address < item.end_address and _is_free(member, item.start_address, item.end_address):
+                member.add_item(item)
+                count += 1
+        if count:
+            member.history.commit('Mark code')
+        return count
+
+    def analyse_all(self):
+        for member in self.members:
+            self.analyse(member)
+
+
+def _code_runs(image, instructions, start: int, end: int) -> List[Item]:
+    """
+    Code items for the instructions between start and end that follow each other without a gap, in runs of at
+    least MIN_CODE_RUN.
+    """
+    memory = image.program_image
+    items = list()
+    run = list()
+    run_end = None
+    for address in instructions:
+        if address < start:
+            continue
+        size = MODE_SIZES[OPCODES[memory[address]][1]]
+        if address + size > end:
+            break
+        if address != run_end:
+            if len(run) >= MIN_CODE_RUN:
+                items += run
+            run = list()
+        run.append(Item(image, address, address + size, 'Code'))
+        run_end = address + size
+    if len(run) >= MIN_CODE_RUN:
+        items += run
+    return items
+
 
-    def __init__(self):
-        pass
+def _is_free(member: ProjectMember, start: int, end: int) -> bool:
+    """
+    Whether no item of the member's current configuration covers any address from start to end.
+    """
+    index = member.find_item_index(start)
+    if index > 0 and member.mappings[index - 1].end_address > start:
+        return False
+    return index == len(member.mappings) or member.mappings[index].start_address >= end
@@ -0,0 +1,482 @@
+"""
+Binary cache of a Project, so reopening one does not mean reloading the ROMs and redoing the analysis.
+
+The file starts with a header and a block directory; every block is page aligned so the file can be memory
+mapped and each block read as a slice of the map. Blocks are:
+
+    meta            JSON holding everything small: members, regions, sections, source file hashes
+    image.M.NAME    the 64K of image NAME of member M, left out when the image is empty
+    items.M         the mapping table of member M as fixed size records
+    symbols.M       address and UTF-8 text of every symbol of member M
+    comments.M      address and UTF-8 text of every comment of member M
+    xrefs.M         (target, source) address pairs of member M
+
+The records of a mapping table are written a region and bank at a time, and the meta block holds where
+each (region, bank) group starts. A loaded project keeps the file mapped: an image is copied out of the
+map the first time its bytes are changed or handed out whole, and the items of a bank are only built when
+a memory configuration maps the bank in. Closing the cache reads in whatever is still left in the map.
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import weakref
+from typing import Dict, List, Optional
+
+from Controller.tracing import traced
+from Models.cartridge import Cartridge, CartridgeError
+from Models.image_section import ImageSection
+from Models.item import Item
+from Models.programimage import ProgramImage
+from Models.project import Project
+from Models.project_member import ProjectMember
+from Models.unknown_area import UnknownArea
+
+MAGIC = b'CBMDCACH'
+VERSION = 2
+ALIGNMENT = 4096
+
+HEADER = struct.Struct('<8sHHI')
+BLOCK = struct.Struct('<24sQQ')
+ITEM = struct.Struct('<HBBII')
+TEXT_ENTRY = struct.Struct('<IH')
+XREF = struct.Struct('<II')
+
+
+class CacheError(Exception):
+    pass
+
+
+def file_signature(file_name: str, known: Optional[dict] = None) -> Optional[dict]:
+    """
+    Returns the size, modification time and SHA-1 of a source file. When a previous signature with the same
+    size and modification time is given, the file is trusted and not hashed again.
+
+    :param file_name: file to sign
+    :param known: signature stored earlier, if any
+    :return: the signature, or None if the file does not exist
+    """
+    try:
+        stat = os.stat(file_name)
+    except OSError:
+        return None
+    if known is not None and known['size'] == stat.st_size and known['mtime'] == stat.st_mtime_ns:
+        return known
+    with open(file_name, 'rb') as f:
+        digest = hashlib.sha1(f.read()).hexdigest()
+    return {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'sha1': digest}
+
+
+def save_project(project: Project, file_name: str):
+    """
+    Writes a project to a cache file. The file is written next to the target and renamed over it, so a
+    crash never leaves a half written cache behind.
+
+    :param project: project to save
+    :param file_name: cache file to write
+    """
+    write_snapshot(snapshot_project(project), file_name)
+
+
+@traced('snapshot_project', 'cache')
+def snapshot_project(project: Project) -> list:
+    """
+    Packs a project into the blocks of a cache file. The blocks are copies, so they can be written out on
+    another thread while the project keeps changing.
+
+    :param project: project to pack
+    :return: list of (block name, data) pairs
+    """
+    blocks = list()
+    meta = {'name': project.project_name, 'members': list()}
+
+    for m, member in enumerate(project.members):
+        if member.region_types:
+            member.save_state()
+
+        images = dict()
+        for image_name, image in member.images.items():
+            sections = [[section.start_address, section.end_address, section.file_name, section.section_type]
+                        for section in image.sections]
+            stored = any(image.program_image) or bool(image.sections)
+            images[image_name] = {'sections': sections, 'size': len(image), 'stored': stored}
+            if stored:
+                blocks.append(('image.{}.{}'.format(m, image_name), bytes(image.program_image)))
+
+        sources = dict()
+        for image in member.images.values():
+            for section in image.sections:
+                if section.section_type in ('BIN', 'PRG') and section.file_name not in sources:
+                    signature = file_signature(section.file_name)
+                    if signature is not None:
+                        sources[section.file_name] = signature
+        if member.cartridge is not None:
+            signature = file_signature(member.cartridge.file_name)
+            if signature is not None:
+                sources[member.cartridge.file_name] = signature
+
+        bank_names = list(member.images.keys())
+        item_types = list()
+        item_groups = list()
+        items = bytearray()
+        for region, banks in enumerate(member.mapping_table):
+            for bank_name, elements in banks.items():
+                bank = bank_names.index(bank_name)
+                item_groups.append([region, bank, len(items) // ITEM.size, len(elements)])
+                for element in elements:
+                    if element.item_type not in item_types:
+                        item_types.append(element.item_type)
+                    items += ITEM.pack(region, bank, item_types.index(element.item_type), element.start_address,
+                                       element.end_address)
+        blocks.append(('items.{}'.format(m), bytes(items)))
+        blocks.append(('symbols.{}'.format(m), _pack_texts(member.symbols)))
+        blocks.append(('comments.{}'.format(m), _pack_texts(member.comments)))
+        blocks.append(('xrefs.{}'.format(m), b''.join(XREF.pack(target, source)
+                                                       for target, source_list in sorted(member.xrefs.items())
+                                                       for source in source_list)))
+
+        meta['members'].append({
+            'name': member.image_name,
+            'machine_type': member.machine_type,
+            'machine_config': member.machine_config,
+            'cpu_type': member.cpu_type,
+            'region_list': member.region_list,
+            'region_types': member.region_types,
+            'images': images,
+            'bank_names': bank_names,
+            'item_types': item_types,
+            'item_groups': item_groups,
+            'sources': sources,
+            'cartridge': member.cartridge.file_name if member.cartridge is not None else None,
+            'cartridge_bank': member.cartridge_bank,
+        })
+
+    blocks.insert(0, ('meta', json.dumps(meta).encode('utf-8')))
+    return blocks
+
+
+@traced('write_snapshot', 'cache')
+def write_snapshot(blocks: list, file_name: str):
+    """
+    Writes blocks made by snapshot_project() to a cache file.
+
+    :param blocks: list of (block name, data) pairs
+    :param file_name: cache file to write
+    """
+    offset = _align(HEADER.size + BLOCK.size * len(blocks))
+    directory = list()
+    for name, data in blocks:
+        directory.append(BLOCK.pack(name.encode('ascii'), offset, len(data)))
+        offset = _align(offset + len(data))
+
+    temp_name = file_name + '.tmp'
+    with open(temp_name, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, len(blocks)))
+        f.write(b''.join(directory))
+        for name, data in blocks:
+            f.seek(_align(f.tell()))
+            f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_name, file_name)
+
+
+class CachedImage(ProgramImage):
+    """
+    ProgramImage whose bytes are left in the cache file until they are needed. Reading a byte or a slice
+    reads the map; anything that uses program_image, including every change, first copies the block into
+    a bytearray of its own.
+    """
+    size: int
+
+    # noinspection PyMissingConstructor
+    def __init__(self, cache: 'ProjectCache', block: Optional[memoryview], size: int, sections: list):
+        # ProgramImage.__init__ would allocate the 64K this class puts off
+        self.size = size
+        self.sections = sections
+        self._block = block
+        self._image = None
+        cache.pending[id(self)] = self
+
+    @property
+    def program_image(self) -> bytearray:
+        if self._image is None:
+            self.fault_in()
+        return self._image
+
+    @program_image.setter
+    def program_image(self, value: bytearray):
+        self._image = value
+        self._block = None
+
+    def is_loaded(self) -> bool:
+        return self._image is not None
+
+    def fault_in(self):
+        """
+        Copies the image out of the cache file.
+        """
+        if self._image is None:
+            self._image = bytearray(self.size)
+            if self._block is not None:
+                self._image[:] = self._block
+            self._block = None
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, item):
+        if self._image is not None:
+            return self._image[item]
+        if self._block is not None:
+            if not isinstance(item, slice):
+                return self._block[item]
+            with self._block[item] as value:
+                return bytes(value)
+        # an image that was empty when it was cached
+        if isinstance(item, slice):
+            return bytes(len(range(*item.indices(self.size))))
+        if not -self.size <= item < self.size:
+            raise IndexError('image index out of range')
+        return 0
+
+
+class CachedBanks(dict):
+    """
+    The banks of one region of a member's mapping table. The items of a bank are built from the cache file
+    the first time the bank is looked up; iterating over the banks builds all of them.
+    """
+    groups: Dict[str, tuple]
+
+    def __init__(self, cache: 'ProjectCache', block: memoryview, images: Dict[str, ProgramImage],
+                 item_types: List[str]):
+        super().__init__()
+        # bank name -> (first record, record count)
+        self.groups = dict()
+        self._block = block
+        self._images = images
+        self._item_types = item_types
+        cache.pending[id(self)] = self
+
+    def _build(self, bank_name: str):
+        first, count = self.groups.pop(bank_name)
+        image = self._images[bank_name]
+        item_types = self._item_types
+        with self._block[first * ITEM.size:(first + count) * ITEM.size] as records:
+            elements = [UnknownArea(image, start, end) if item_types[item_type] == 'Unknown' else
+                        Item(image, start, end, item_types[item_type])
+                        for _, _, item_type, start, end in ITEM.iter_unpack(records)]
+        dict.__setitem__(self, bank_name, elements)
+        if not self.groups:
+            self._block = None
+
+    def fault_in(self):
+        """
+        Builds the items of every bank not built yet.
+        """
+        for bank_name in list(self.groups):
+            self._build(bank_name)
+
+    def __contains__(self, bank_name):
+        return bank_name in self.groups or dict.__contains__(self, bank_name)
+
+    def __getitem__(self, bank_name):
+        if bank_name in self.groups:
+            self._build(bank_name)
+        return dict.__getitem__(self, bank_name)
+
+    def __setitem__(self, bank_name, elements):
+        self.groups.pop(bank_name, None)
+        dict.__setitem__(self, bank_name, elements)
+
+    def get(self, bank_name, default=None):
+        return self[bank_name] if bank_name in self else default
+
+    def setdefault(self, bank_name, default=None):
+        if bank_name not in self:
+            self[bank_name] = default
+        return self[bank_name]
+
+    def __len__(self):
+        return len(self.groups) + dict.__len__(self)
+
+    def __iter__(self):
+        self.fault_in()
+        return dict.__iter__(self)
+
+    def keys(self):
+        self.fault_in()
+        return dict.keys(self)
+
+    def values(self):
+        self.fault_in()
+        return dict.values(self)
+
+    def items(self):
+        self.fault_in()
+        return dict.items(self)
+
+
+class ProjectCache:
+    """
+    An open cache file. The file is memory mapped, and blocks are only read when they are asked for. The
+    images and mapping tables of a project loaded from it keep reading the map until they are faulted in,
+    so the cache is only closed, by close() or once nothing refers to it any more, after that.
+    """
+    file_name: str
+    blocks: Dict[str, memoryview]
+    meta: dict
+    # what loaded projects still read from the map, by id
+    pending: weakref.WeakValueDictionary
+
+    def __init__(self, file_name: str):
+        self.file_name = file_name
+        self.pending = weakref.WeakValueDictionary()
+        with open(file_name, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+
+        self.blocks = dict()
+        if len(self._view) < HEADER.size:
+            self.close()
+            raise CacheError('{} is not a project cache.'.format(file_name))
+        magic, version, _, count = HEADER.unpack_from(self._view, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise CacheError('{} is not a version {} project cache.'.format(file_name, VERSION))
+
+        directory = self._view[HEADER.size:HEADER.size + BLOCK.size * count]
+        for name, offset, length in BLOCK.iter_unpack(directory):
+            self.blocks[name.rstrip(b'\0').decode('ascii')] = self._view[offset:offset + length]
+        directory.release()
+        self.meta = json.loads(bytes(self.blocks['meta']).decode('utf-8'))
+
+    def close(self):
+        """
+        Faults in what a loaded project still reads from the map and unmaps the file.
+        """
+        for cached in list(self.pending.values()):
+            cached.fault_in()
+        self.pending = weakref.WeakValueDictionary()
+        for block in self.blocks.values():
+            block.release()
+        self.blocks = dict()
+        self._view.release()
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def is_valid(self) -> bool:
+        """
+        Checks that the source files of every loaded section still match what was cached.
+
+        :return: True if all source files are unchanged
+        """
+        for member_meta in self.meta['members']:
+            for file_name, known in member_meta['sources'].items():
+                signature = file_signature(file_name, known)
+                if signature is None or signature['sha1'] != known['sha1']:
+                    return False
+        return True
+
+    def load(self) -> Project:
+        """
+        Builds the cached project.
+
+        :return: the project
+        """
+        project = Project(self.meta['name'])
+        for m, member_meta in enumerate(self.meta['members']):
+            project.members.append(self._load_member(m, member_meta))
+        return project
+
+    def _load_member(self, m: int, member_meta: dict) -> ProjectMember:
+        images = dict()
+        for image_name, image_meta in member_meta['images'].items():
+            block = self.blocks['image.{}.{}'.format(m, image_name)] if image_meta['stored'] else None
+            sections = [ImageSection(*section) for section in image_meta['sections']]
+            images[image_name] = CachedImage(self, block, image_meta['size'], sections)
+
+        bank_names = member_meta['bank_names']
+        items_block = self.blocks['items.{}'.format(m)]
+        mapping_table = list()
+        for _ in member_meta['region_list']:
+            mapping_table.append(CachedBanks(self, items_block, images, member_meta['item_types']))
+        for region, bank, first, count in member_meta['item_groups']:
+            mapping_table[region].groups[bank_names[bank]] = (first, count)
+
+        xrefs = dict()
+        for target, source in XREF.iter_unpack(self.blocks['xrefs.{}'.format(m)]):
+            xrefs.setdefault(target, list()).append(source)
+
+        # banks of the cartridge that were mapped in are stored as images, the rest are read when needed
+        cartridge = None
+        if member_meta.get('cartridge') is not None:
+            try:
+                cartridge = Cartridge(member_meta['cartridge'])
+            except (OSError, CartridgeError):
+                pass
+            else:
+                for image_name, image in images.items():
+                    if image_name.startswith('CROM') and image_name[4:].isdigit():
+                        cartridge.images[int(image_name[4:])] = image
+
+        return ProjectMember.restore(member_meta['name'], member_meta['machine_type'], images,
+                                     [tuple(region) for region in member_meta['region_list']], mapping_table,
+                                     member_meta['region_types'], member_meta['machine_config'],
+                                     symbols=_unpack_texts(self.blocks['symbols.{}'.format(m)]),
+                                     comments=_unpack_texts(self.blocks['comments.{}'.format(m)]),
+                                     xrefs=xrefs, cartridge=cartridge,
+                                     cartridge_bank=member_meta.get('cartridge_bank', 0),
+                                     cpu_type=member_meta['cpu_type'])
+
+
+@traced('load_project', 'cache')
+def load_project(file_name: str, validate: bool = True) -> Optional[Project]:
+    """
+    Loads a project from a cache file.
+
+    :param file_name: cache file to read
+    :param validate: check the source ROM files against the hashes stored in the cache
+    :return: the project, or None if there is no usable cache or a source file changed
+    """
+    try:
+        cache = ProjectCache(file_name)
+    except (OSError, ValueError, KeyError, struct.error, CacheError):
+        return None
+    try:
+        if validate and not cache.is_valid():
+            cache.close()
+            return None
+        # the cache stays open for the images and items that are read from it later
+        return cache.load()
+    except (OSError, ValueError, KeyError, struct.error, CacheError):
+        cache.close()
+        return None
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _pack_texts(texts: Dict[int, str]) -> bytes:
+    packed = bytearray()
+    for address, text in sorted(texts.items()):
+        encoded = text.encode('utf-8')
+        packed += TEXT_ENTRY.pack(address, len(encoded))
+        packed += encoded
+    return bytes(packed)
+
+
+def _unpack_texts(block: memoryview):
+    offset = 0
+    while offset < len(block):
+        address, length = TEXT_ENTRY.unpack_from(block, offset)
+        offset += TEXT_ENTRY.size
+        yield address, str(block[offset:offset + length], 'utf-8')
+        offset += length
@@ -1,10 +1,30 @@
-from typing import Dict, List
-
-from Controller.config import config
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import Controller.messages  # registers the item messages sent below
+from Controller.config import get_config
+from Controller.messenging import send_message
+from Controller.tracing import traced
+from Models.cartridge import Cartridge
+from Models.history import History
+from Models.item import Item
+from Models.persistent import PersistentMap, VersionedMap
 from Models.programimage import ProgramImage
 
 
+# keys of the configuration store
+CONFIG_MODE = 0
+CONFIG_CARTRIDGE_BANK = 1
+
+
 class ProjectMember:
+    """
+    One machine or drive of a project: its banks of memory, the memory configuration it is in, and the
+    items, symbols and comments found in it.
+
+    The memory configuration is kept in a store of its own next to the item, symbol and comment stores, so
+    a configuration or cartridge bank switch is an undo step like any edit. Undoing it switches back, with
+    the items the old configuration had.
+    """
     images: Dict[str, ProgramImage]
     current_image: ProgramImage
     image_name: str
@@ -15,6 +35,14 @@ class ProjectMember:
     mapping_table: List[Dict[str, list]]
     region_types: list
     region_list: list
+    item_store: VersionedMap
+    symbols: VersionedMap
+    comments: VersionedMap
+    config_store: VersionedMap
+    xrefs: Dict[int, List[int]]
+    history: History
+    cartridge: Optional[Cartridge]
+    cartridge_bank: int
 
     def __init__(self, name, machine):
         self.machine_type = machine
@@ -27,6 +55,13 @@ class ProjectMember:
         self.images['IO'] = ProgramImage()
         self.images['NONE'] = ProgramImage()
         self.images['CROM'] = ProgramImage()
+        self.current_image = ProgramImage()
+        self.mappings = list()
+
+        self.init_stores()
+        self.xrefs = dict()
+        self.cartridge = None
+        self.cartridge_bank = 0
 
         self.cpu_type = '6510'
 
@@ -45,7 +80,279 @@ class ProjectMember:
             self.mapping_table = [dict() for _ in range(0, len(self.region_list))]
             self.change_config(0)
 
+    @classmethod
+    def restore(cls, name: str, machine: str, images: Dict[str, ProgramImage], region_list: list,
+                mapping_table: List[Dict[str, list]], region_types: list, machine_config: int,
+                symbols: Iterable[Tuple[int, str]] = (), comments: Iterable[Tuple[int, str]] = (),
+                xrefs: Optional[Dict[int, List[int]]] = None, cartridge: Optional[Cartridge] = None,
+                cartridge_bank: int = 0, cpu_type: str = '6510') -> 'ProjectMember':
+        """
+        Builds a member from saved state instead of loading its ROMs. The member starts in the given
+        memory configuration with an empty undo history.
+
+        :param name: name of the member
+        :param machine: machine type
+        :param images: the banks, by name
+        :param region_list: (start, end) address of every region
+        :param mapping_table: items of each region, by bank name
+        :param region_types: bank mapped into each region
+        :param machine_config: memory configuration the region types belong to
+        :param symbols: (address, name) pairs
+        :param comments: (address, text) pairs
+        :param xrefs: source addresses of every referenced address
+        :param cartridge: attached cartridge, if any
+        :param cartridge_bank: cartridge bank mapped in
+        :param cpu_type: CPU of the machine
+        :return: the member
+        """
+        member = cls.__new__(cls)
+        member.image_name = name
+        member.machine_type = machine
+        member.cpu_type = cpu_type
+        member.images = images
+        member.current_image = ProgramImage()
+        member.region_list = region_list
+        member.mapping_table = mapping_table
+        member.mappings = list()
+        member.xrefs = xrefs if xrefs is not None else dict()
+        member.cartridge = cartridge
+        member.cartridge_bank = cartridge_bank
+
+        member.init_stores()
+        member.symbols.restore(PersistentMap.from_items(symbols))
+        member.comments.restore(PersistentMap.from_items(comments))
+        member.region_types = region_types
+        member.machine_config = machine_config
+        member.load_state()
+        member.config_store[CONFIG_MODE] = machine_config
+        member.config_store[CONFIG_CARTRIDGE_BANK] = cartridge_bank
+        member.history.clear()
+        return member
+
+    def init_stores(self):
+        """
+        Creates the empty item, symbol, comment and configuration stores and their undo history.
+        """
+        self.item_store = VersionedMap()
+        self.symbols = VersionedMap()
+        self.comments = VersionedMap()
+        self.config_store = VersionedMap()
+        self.history = History({'items': self.item_store, 'symbols': self.symbols, 'comments': self.comments,
+                                'config': self.config_store})
+
+    def bank_name(self, address: int) -> str:
+        """
+        Returns the name of the bank mapped in at an address in the current memory configuration.
+        """
+        for (start, end), region_type in zip(self.region_list, self.region_types):
+            if start <= address < end:
+                return region_type
+        raise IndexError('Address ${:04X} is outside of memory.'.format(address))
+
+    def find_item_index(self, start: int) -> int:
+        """
+        Binary search of the current mappings for the first item starting at or after an address.
+
+        :param start: address to look for
+        :return: index into mappings
+        """
+        low = 0
+        high = len(self.mappings)
+        while low < high:
+            middle = (low + high) // 2
+            if self.mappings[middle].start_address < start:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def find_item(self, start: int):
+        index = self.find_item_index(start)
+        if index < len(self.mappings) and self.mappings[index].start_address == start:
+            return self.mappings[index]
+        return None
+
+    def add_item(self, item: Item):
+        """
+        Adds an item, replacing the one starting at the same address. Sends item_removed for the replaced
+        item if it covered other addresses, then item_changed.
+        """
+        index = self.find_item_index(item.start_address)
+        if index < len(self.mappings) and self.mappings[index].start_address == item.start_address:
+            old_item = self.mappings[index]
+            self.mappings[index] = item
+            if old_item.end_address != item.end_address:
+                send_message('item_removed', self, old_item)
+        else:
+            self.mappings.insert(index, item)
+        self.item_store[item.start_address] = item
+        send_message('item_changed', self, item)
+
+    def remove_item(self, item: Item):
+        index = self.find_item_index(item.start_address)
+        if index < len(self.mappings) and self.mappings[index] is item:
+            del self.mappings[index]
+            self.item_store.pop(item.start_address, None)
+            send_message('item_removed', self, item)
+
+    def retype_item(self, start: int, end: int, item_type: str):
+        """
+        Changes the type of an item. The item is replaced rather than changed in place, since earlier
+        versions of the item store still refer to the old one.
+
+        :param start: start address of the item
+        :param end: end address of the item
+        :param item_type: new type
+        :return: the new item, or None if no item covers exactly that range
+        """
+        item = self.find_item(start)
+        if item is None or item.end_address != end:
+            return None
+        new_item = Item(item.image, start, end, item_type)
+        self.add_item(new_item)
+        return new_item
+
+    def import_symbols(self, symbols: Iterable[Tuple[int, str]], replace: bool = True) -> int:
+        """
+        Adds many symbols at once. The new symbol store is built in one pass rather than a symbol at a time,
+        and the import is a single undo step.
+
+        :param symbols: (address, name) pairs; a later name for the same address wins
+        :param replace: replace existing symbols at the imported addresses, rather than keep them
+        :return: number of symbols added or changed
+        """
+        imported = dict(symbols)
+        if not imported:
+            return 0
+        if len(self.symbols) == 0:
+            merged = imported
+            count = len(imported)
+        else:
+            merged = dict(self.symbols.items())
+            if not replace:
+                imported = {address: name for address, name in imported.items() if address not in merged}
+            count = sum(1 for address, name in imported.items() if merged.get(address) != name)
+            merged.update(imported)
+        self.symbols.restore(PersistentMap.from_items(merged.items()))
+        self.history.commit('Import {} symbols'.format(count))
+        return count
+
+    def undo(self) -> Dict[str, List[int]]:
+        """
+        Undoes the last committed step of the history and brings the mappings in line with it.
+
+        :return: the changed addresses of each store
+        """
+        changes = self.history.undo()
+        self._apply_changes(changes)
+        return changes
+
+    def redo(self) -> Dict[str, List[int]]:
+        changes = self.history.redo()
+        self._apply_changes(changes)
+        return changes
+
+    def _apply_changes(self, changes: Dict[str, List[int]]):
+        if changes.get('config'):
+            # the step switched configurations; the item store already holds the items of the other one
+            self.save_state()
+            self.cartridge_bank = self.config_store.get(CONFIG_CARTRIDGE_BANK, self.cartridge_bank)
+            self.machine_config = self.config_store[CONFIG_MODE]
+            self.region_types = self.region_map(self.machine_config)
+            self.mappings = list(self.item_store.values())
+            self._load_images()
+        else:
+            self._sync_mappings(changes.get('items', list()))
+
+    def _sync_mappings(self, addresses: List[int]):
+        for address in addresses:
+            index = self.find_item_index(address)
+            item = self.item_store.get(address)
+            if index < len(self.mappings) and self.mappings[index].start_address == address:
+                old_item = self.mappings[index]
+                if item is None:
+                    del self.mappings[index]
+                else:
+                    self.mappings[index] = item
+                if item is None or old_item.end_address != item.end_address:
+                    send_message('item_removed', self, old_item)
+            elif item is not None:
+                self.mappings.insert(index, item)
+            if item is not None:
+                send_message('item_changed', self, item)
+
+    def load_file(self, file_name: str, address: Optional[int] = None, bank: str = 'RAM'):
+        """
+        Loads a file into a bank and brings the current memory configuration up to date with it.
+
+        :param file_name: file to load
+        :param address: address to load a binary file at; None loads a PRG at its load address
+        :param bank: image to load the file into
+        :return: section info for the loaded file, None if it collides with a loaded section
+        """
+        if address is None:
+            section = self.images[bank].load_image(file_name)
+        else:
+            section = self.images[bank].load_binary(file_name, address)
+        if section is not None:
+            self.change_config(self.machine_config)
+        return section
+
+    def attach_cartridge(self, cartridge: Cartridge, bank: int = 0):
+        """
+        Plugs a cartridge in. Each of its banks becomes an image of its own, named CROM followed by the bank
+        number, which is only built once the bank is mapped in. The memory configuration switches to the one
+        the cartridge's EXROM and GAME lines select.
+
+        :param cartridge: the cartridge
+        :param bank: bank to start with
+        """
+        self.cartridge = cartridge
+        self.cartridge_bank = bank
+        self.change_config(cartridge.memory_config if self.machine_type == 'C64' else self.machine_config)
+
+    def select_cartridge_bank(self, bank: int):
+        """
+        Switches the cartridge bank mapped into the CROM areas. Items found in each bank are kept with it.
+        """
+        self.cartridge_bank = bank
+        self.change_config(self.machine_config)
+
+    def cartridge_bank_name(self) -> str:
+        name = 'CROM{}'.format(self.cartridge_bank)
+        if name not in self.images:
+            self.images[name] = self.cartridge.bank_image(self.cartridge_bank)
+        return name
+
+    @traced('ProjectMember.change_config', 'config')
     def change_config(self, mode: int):
+        """
+        Switches the memory configuration. Switching to another configuration or cartridge bank is committed
+        as an undo step, together with any changes not committed yet.
+
+        :param mode: the new configuration
+        :raises ValueError: when the machine has no such configuration
+        """
+        new_map = self.region_map(mode)
+        first = len(self.region_types) == 0
+        switched = first or mode != self.machine_config or \
+            self.config_store.get(CONFIG_CARTRIDGE_BANK) != self.cartridge_bank
+        if not first:
+            self.save_state()
+        self.region_types = new_map
+        self.load_state()
+        self.machine_config = mode
+        self.config_store[CONFIG_MODE] = mode
+        self.config_store[CONFIG_CARTRIDGE_BANK] = self.cartridge_bank
+        if first:
+            self.history.clear()
+        elif switched:
+            self.history.commit('Configuration ${:X}'.format(mode))
+
+    def region_map(self, mode: int) -> List[str]:
+        """
+        Returns the bank mapped into each region in a memory configuration, with the current cartridge bank.
+        """
         if self.machine_type == 'C64':
             new_map = self.get_c64_region(mode)
         elif self.machine_type == 'C128':
@@ -58,12 +365,12 @@ class ProjectMember:
             new_map = ['RAM', 'NONE', 'IO', 'ROM']
         else:
             new_map = ['RAM']
-        if len(self.region_types) != 0:
-            self.save_state()
-        self.region_types = new_map
-        self.load_state()
-        self.machine_config = mode
+        if self.cartridge is not None:
+            new_map = [self.cartridge_bank_name() if region_type == 'CROM' else region_type
+                       for region_type in new_map]
+        return new_map
 
+    @traced('ProjectMember.save_state', 'config')
     def save_state(self):
         region = 0
         element_list = [list() for _ in range(0, len(self.region_list))]
@@ -79,22 +386,26 @@ class ProjectMember:
                 raise IndexError('Elements found outside of scope.')
 
         for region in range(0, len(self.region_list)):
-            name = self.region_types[0]
+            name = self.region_types[region]
             self.mapping_table[region][name] = element_list[region]
 
+    @traced('ProjectMember.load_state', 'config')
     def load_state(self):
         self.mappings = list()
         for region in range(0, len(self.region_list)):
             if self.region_types[region] in self.mapping_table[region]:
                 self.mappings += self.mapping_table[region][self.region_types[region]]
-            start = self.region_list[region][0]
-            end = self.region_list[region][1]
-            self.current_image[start:end] = self.images[self.region_types[region]][start:end]
+        self._load_images()
+        self.item_store.restore(PersistentMap.from_items((item.start_address, item) for item in self.mappings))
+
+    def _load_images(self):
+        for (start, end), region_type in zip(self.region_list, self.region_types):
+            self.current_image[start:end] = self.images[region_type][start:end]
 
     def get_c64_region(self, mode: int):
         if mode > 31:
             raise ValueError('Commodore 64 has only 31 possible memory configuration.')
-        if mode == 32:
+        if mode == 31:
             new_map = ['IO', 'RAM', 'RAM', 'RAM', 'ROM', 'RAM', 'IO', 'ROM']
         elif mode == 30 or mode == 14:
             new_map = ['IO', 'RAM', 'RAM', 'RAM', 'RAM', 'RAM', 'IO', 'ROM']
@@ -250,6 +561,8 @@ class ProjectMember:
         return new_map
 
     def initC64(self):
+        config = get_config()
+
         c64basic = config['C64']['basic']
         c64basic_start = 0xA000
 
@@ -270,6 +583,8 @@ class ProjectMember:
         self.change_config(31)
 
     def initC128(self):
+        config = get_config()
+
         self.images['RAM1'] = ProgramImage()
         self.images['RAM2'] = ProgramImage()
         self.images['RAM3'] = ProgramImage()
@@ -281,10 +596,10 @@ class ProjectMember:
         c128basic_hi = config['C128']['basichi']
         c128basic_hi_start = 0x8000
 
-        c128kernal = config['C64']['kernal']
+        c128kernal = config['C128']['kernal']
         c128kernal_start = 0xC000
 
-        c128character = config['C64']['character']
+        c128character = config['C128']['character']
         c128character_start = 0xD000
 
         self.images['ROM'].load_binary(c128basic_lo, c128basic_lo_start)
@@ -294,12 +609,14 @@ class ProjectMember:
 
         self.region_list = [(0x0000, 0x0002), (0x0002, 0x0400), (0x0400, 0x1000), (0x1000, 0x2000),
                             (0x2000, 0x4000), (0x4000, 0x8000), (0x8000, 0xC000), (0xC000, 0xD000),
-                            (0xE000, 0xF000), (0xF000, 0xFC00), (0xFC00, 0xFF00), (0xFF00, 0xFF05),
+                            (0xD000, 0xE000), (0xE000, 0xF000), (0xF000, 0xFF00), (0xFF00, 0xFF05),
                             (0xFF05, 0x10000)]
         self.mapping_table = [dict() for _ in range(0, len(self.region_list))]
         self.change_config(0x400)
 
     def init1541(self):
+        config = get_config()
+
         rom = config['1541']['rom']
         rom_start = 0xC000
 
@@ -311,6 +628,8 @@ class ProjectMember:
         self.change_config(0)
 
     def init1571(self):
+        config = get_config()
+
         rom = config['1571']['rom']
         rom_start = 0x8000
 
@@ -323,6 +642,8 @@ class ProjectMember:
         self.change_config(0)
 
     def init1581(self):
+        config = get_config()
+
         rom = config['1581']['rom']
         rom_start = 0x8000
 
@@ -340,3 +661,5 @@ class ProjectMember:
             start = self.region_list[i][0]
             end = self.region_list[i][1]
             for region_type in region_types:
+                self.mapping_table[i][region_type] = [element for element in self.mappings
+                                                      if start <= element.start_address < end]
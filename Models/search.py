@@ -0,0 +1,167 @@
+"""
+Byte pattern search over the images of a ProjectMember.
+
+A pattern is written as hex bytes separated by spaces, such as ``20 ?? FF``:
+
+    20      the byte $20
+    ??      any byte
+    2?, ?F  a byte with the given high or low nibble
+    20/F0   a byte that equals $20 once masked with $F0
+
+A pattern of plain bytes is searched with bytearray.find. Anything with wildcards or masks is compiled to a
+regular expression that runs straight over the image buffers, and over memoryview slices of cartridge chips
+that have not been built into images yet. Masked bytes become character classes of every value they match.
+Matches may overlap, and they never run past the end of the loaded section they start in.
+"""
+import re
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from Models.project_member import ProjectMember
+from Models.programimage import ProgramImage
+
+_TOKEN = re.compile(r'^([0-9A-Fa-f?]{2})(?:/([0-9A-Fa-f]{2}))?$')
+
+
+class PatternError(ValueError):
+    pass
+
+
+class SearchHit:
+    bank: str
+    address: int
+    data: bytes
+
+    def __init__(self, bank: str, address: int, data: bytes):
+        self.bank = bank
+        self.address = address
+        self.data = data
+
+    def __repr__(self):
+        return '{} ${:04X}: {}'.format(self.bank, self.address, ' '.join('{:02X}'.format(value) for value in self.data))
+
+
+def parse_pattern(text: str) -> List[Tuple[int, int]]:
+    """
+    Parses a pattern into (value, mask) pairs, one per byte.
+
+    :param text: pattern text, such as '20 ?? FF'
+    :return: list of (value, mask)
+    """
+    pairs = list()
+    for token in text.replace(',', ' ').split():
+        token = token.lstrip('$')
+        match = _TOKEN.match(token)
+        if match is None:
+            raise PatternError('{} is not a byte, a wildcard or a masked byte.'.format(token))
+        digits, mask_digits = match.groups()
+        if '?' in digits and mask_digits is not None:
+            raise PatternError('{} has both a wildcard and a mask.'.format(token))
+        if mask_digits is not None:
+            mask = int(mask_digits, 16)
+            value = int(digits, 16) & mask
+        else:
+            mask = (0x00 if digits[0] == '?' else 0xF0) | (0x00 if digits[1] == '?' else 0x0F)
+            value = int(digits.replace('?', '0'), 16) & mask
+        pairs.append((value, mask))
+    if not pairs:
+        raise PatternError('The pattern is empty.')
+    return pairs
+
+
+class BytePattern:
+    """
+    A compiled search pattern.
+    """
+    text: str
+    length: int
+    literal: Optional[bytes]
+    regex: 're.Pattern'
+
+    def __init__(self, text: str):
+        self.text = text
+        pairs = parse_pattern(text)
+        self.length = len(pairs)
+
+        if all(mask == 0xFF for _, mask in pairs):
+            self.literal = bytes(value for value, _ in pairs)
+        else:
+            self.literal = None
+
+        parts = list()
+        for value, mask in pairs:
+            if mask == 0xFF:
+                parts.append(re.escape(bytes([value])))
+            elif mask == 0x00:
+                parts.append(b'.')
+            else:
+                parts.append(b'[' + b''.join(re.escape(bytes([byte])) for byte in range(0, 256)
+                                             if byte & mask == value) + b']')
+        # a lookahead matches without consuming, so overlapping matches are all found
+        self.regex = re.compile(b'(?=(' + b''.join(parts) + b'))', re.DOTALL)
+
+    def finditer(self, buffer, start: int = 0, end: Optional[int] = None) -> Iterator[int]:
+        """
+        Finds the pattern in a buffer.
+
+        :param buffer: bytes, bytearray or memoryview to search
+        :param start: offset to start at
+        :param end: offset where matches have to end by
+        :return: offset of every match
+        """
+        end = len(buffer) if end is None else end
+        if self.literal is not None and hasattr(buffer, 'find'):
+            position = buffer.find(self.literal, start, end)
+            while position >= 0:
+                yield position
+                position = buffer.find(self.literal, position + 1, end)
+            return
+        for match in self.regex.finditer(buffer, start, end):
+            yield match.start()
+
+
+def search_image(pattern: BytePattern, bank: str, image: ProgramImage) -> Iterator[SearchHit]:
+    """
+    Searches the loaded sections of an image.
+    """
+    buffer = image.program_image
+    for section in sorted(image.sections, key=lambda s: s.start_address):
+        for address in pattern.finditer(buffer, section.start_address, section.end_address):
+            yield SearchHit(bank, address, bytes(buffer[address:address + pattern.length]))
+
+
+def search_member(member: ProjectMember, pattern: BytePattern) -> Iterator[SearchHit]:
+    """
+    Searches every image of a member, and every bank of its cartridge, including banks that have not been
+    mapped in yet. Hits come out bank by bank, in address order within a bank.
+
+    :param member: member to search
+    :param pattern: compiled pattern
+    :return: every hit
+    """
+    searched = set()
+    for bank, image in member.images.items():
+        searched.add(id(image))
+        yield from search_image(pattern, bank, image)
+
+    cartridge = member.cartridge
+    if cartridge is None:
+        return
+    for bank in cartridge.banks:
+        image = cartridge.images.get(bank)
+        if image is not None:
+            if id(image) not in searched:
+                yield from search_image(pattern, 'CROM{}'.format(bank), image)
+            continue
+        for chip in cartridge.chips[bank]:
+            data = cartridge.view[chip.offset:chip.offset + chip.size]
+            try:
+                for offset in pattern.finditer(data):
+                    yield SearchHit('CROM{}'.format(bank), chip.load_address + offset,
+                                    bytes(data[offset:offset + pattern.length]))
+            finally:
+                data.release()
+
+
+def search_images(images: Dict[str, ProgramImage], pattern: BytePattern) -> Iterator[SearchHit]:
+    for bank, image in images.items():
+        yield from search_image(pattern, bank, image)
@@ -0,0 +1,171 @@
+"""
+Reads the memory of a C64 or C128 from a VICE snapshot (VSF file).
+
+A snapshot is a header followed by one module per emulated chip. Each module starts with a 16 byte name,
+a major and minor version and its size, header included; all numbers are little endian. Only the modules
+that hold memory are read:
+
+    C64MEM      CPU port data and direction, EXROM and GAME, then 64K of RAM
+    C128MEM     the same, then 128K of RAM, or 256K with the RAM expansion
+    MMU         the C128 MMU registers from $D500 on
+
+Opening a snapshot only walks the module headers. Module data is read through memoryview slices of the
+mapped file, straight into the images of a ProjectMember, and the member is switched to the memory
+configuration the snapshot was taken in. The chip registers of the VIC, SIDs and CIAs are left out of the
+IO image; it gets the CPU port and, on a C128, the MMU registers.
+"""
+import mmap
+import struct
+from typing import Dict, Optional, Tuple
+
+from Models.project_member import ProjectMember
+
+SIGNATURE = b'VICE Snapshot File\x1a'
+VERSION_SIGNATURE = b'VICE Version\x1a'
+
+HEADER = struct.Struct('<19sBB16s')
+VERSION = struct.Struct('<13s4sI')
+MODULE = struct.Struct('<16sBBI')
+MEMORY = struct.Struct('<BBBB')
+
+RAM_BANK_SIZE = 0x10000
+MMU_SIZE = 11
+C128_RAM_BANKS = ['RAM', 'RAM1', 'RAM2', 'RAM3']
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def is_snapshot(file_name: str) -> bool:
+    return file_name.lower().endswith('.vsf')
+
+
+class Snapshot:
+    """
+    An open VSF file.
+    """
+    file_name: str
+    machine: str
+    version: Tuple[int, int]
+    modules: Dict[str, Tuple[int, int]]
+    view: memoryview
+
+    def __init__(self, file_name: str):
+        self.file_name = file_name
+        with open(file_name, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self._map)
+        self.modules = dict()
+
+        if len(self.view) < HEADER.size:
+            self.close()
+            raise SnapshotError('{} is not a VICE snapshot.'.format(file_name))
+        signature, major, minor, machine = HEADER.unpack_from(self.view)
+        if signature != SIGNATURE:
+            self.close()
+            raise SnapshotError('{} is not a VICE snapshot.'.format(file_name))
+        self.version = (major, minor)
+        self.machine = machine.rstrip(b'\0').decode('latin-1')
+
+        offset = HEADER.size
+        if bytes(self.view[offset:offset + len(VERSION_SIGNATURE)]) == VERSION_SIGNATURE:
+            offset += VERSION.size
+
+        while offset + MODULE.size <= len(self.view):
+            name, _, _, size = MODULE.unpack_from(self.view, offset)
+            if size < MODULE.size or offset + size > len(self.view):
+                self.close()
+                raise SnapshotError('Module at {} of {} is cut short.'.format(offset, file_name))
+            self.modules[name.rstrip(b'\0').decode('latin-1')] = (offset + MODULE.size, size - MODULE.size)
+            offset += size
+
+    def close(self):
+        self.view.release()
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def machine_type(self) -> str:
+        """
+        Machine type of a ProjectMember that can hold the snapshot.
+        """
+        if 'C128MEM' in self.modules:
+            return 'C128'
+        if 'C64MEM' in self.modules:
+            return 'C64'
+        raise SnapshotError('{} holds no C64 or C128 memory.'.format(self.file_name))
+
+    def module(self, name: str) -> Optional[memoryview]:
+        """
+        Returns the data of a module, without its header, as a slice of the mapped file. The caller releases
+        it.
+        """
+        location = self.modules.get(name)
+        if location is None:
+            return None
+        offset, size = location
+        return self.view[offset:offset + size]
+
+    def load_into(self, member: ProjectMember) -> int:
+        """
+        Fills the RAM and IO images of a member with the snapshot's memory and switches the member to the
+        memory configuration the snapshot was taken in.
+
+        :param member: member of the snapshot's machine type, with nothing loaded into its RAM yet
+        :return: the memory configuration
+        """
+        if member.machine_type != self.machine_type:
+            raise SnapshotError('{} is a {} snapshot, not a {} one.'.format(self.file_name, self.machine_type,
+                                                                             member.machine_type))
+        name = 'C64MEM' if member.machine_type == 'C64' else 'C128MEM'
+        data = self.module(name)
+        try:
+            if len(data) < MEMORY.size + RAM_BANK_SIZE:
+                raise SnapshotError('{} module of {} is cut short.'.format(name, self.file_name))
+            port_data, port_direction, exrom, game = MEMORY.unpack_from(data)
+            banks = ['RAM'] if member.machine_type == 'C64' else C128_RAM_BANKS
+            for i, bank in enumerate(banks):
+                start = MEMORY.size + i * RAM_BANK_SIZE
+                if start + RAM_BANK_SIZE > len(data):
+                    break
+                ram = data[start:start + RAM_BANK_SIZE]
+                section = member.images[bank].place_data(ram, 0, self.file_name, 'VSF')
+                ram.release()
+                if section is None:
+                    raise SnapshotError('{} already holds loaded files.'.format(bank))
+        finally:
+            data.release()
+
+        io = member.images['IO']
+        io.place_data(bytes((port_direction, port_data)), 0x0000, self.file_name, 'VSF')
+
+        if member.machine_type == 'C64':
+            # VICE keeps whether the cartridge pulls EXROM and GAME low; the configuration uses the line levels
+            port = (port_data | ~port_direction) & 0x07
+            mode = (0 if exrom else 1) << 4 | (0 if game else 1) << 3 | port
+        else:
+            mode = self._load_mmu(io)
+        member.change_config(mode)
+        return mode
+
+    def _load_mmu(self, io) -> int:
+        registers = self.module('MMU')
+        if registers is None:
+            return 0x400
+        try:
+            if len(registers) < MMU_SIZE:
+                raise SnapshotError('MMU module of {} is cut short.'.format(self.file_name))
+            io.place_data(registers[:MMU_SIZE], 0xD500, self.file_name, 'VSF')
+            io.place_data(registers[:5], 0xFF00, self.file_name, 'VSF')
+            configuration, ram_configuration = registers[0], registers[6]
+        finally:
+            registers.release()
+        # the configuration register is the low byte of the memory configuration, the common RAM bits of the
+        # RAM configuration register the high byte
+        return (ram_configuration & 0x0F) << 8 | configuration
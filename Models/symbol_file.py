@@ -0,0 +1,133 @@
+"""
+Reads symbol files written by other tools:
+
+    VICE        monitor label files, ``al C:e5ca .label``, as written by the monitor's ``save_labels`` and by
+                ld65 -Ln
+    ca65        ld65 debug info (``sym ... name="label",...,val=0xE5CA``) and ``label = $E5CA`` assignments
+    CSV         ``address,name`` or ``name,address`` rows, the address as $hex, 0xhex or plain hex
+
+Files are read line by line and every format is matched with one compiled regular expression per line, so a
+file with tens of thousands of symbols is never held as a whole. Lines that do not match are skipped. The
+result is a stream of (address, name) pairs for ProjectMember.import_symbols, which adds them to the symbol
+store in one step.
+"""
+import csv
+import re
+from typing import Iterable, Iterator, Optional, Tuple
+
+SYMBOL_FORMATS = ['vice', 'ca65', 'csv']
+
+_VICE = re.compile(r'^\s*al\s+(?:([A-Za-z0-9]+):)?([0-9A-Fa-f]{1,6})\s+\.?([^\s;]+)')
+_CA65_DBG = re.compile(r'^sym\t.*?\bname="([^"]+)".*?\bval=0[xX]([0-9A-Fa-f]+)')
+_CA65_ASSIGN = re.compile(r'^\s*([A-Za-z_@.][A-Za-z0-9_@.]*)\s*:?=\s*\$([0-9A-Fa-f]{1,6})\b')
+_HEX = re.compile(r'^(?:\$|0[xX])?([0-9A-Fa-f]{1,6})$')
+_NAME = re.compile(r'^[A-Za-z_.@][A-Za-z0-9_.@]*$')
+
+
+class SymbolFileError(Exception):
+    pass
+
+
+def parse_vice(lines: Iterable[str], memory_space: Optional[str] = 'C') -> Iterator[Tuple[int, str]]:
+    """
+    Parses a VICE monitor label file.
+
+    :param lines: lines of the file
+    :param memory_space: memory space to keep, such as 'C' for the computer or '8' for drive 8, None for all;
+        labels without a memory space are always kept
+    :return: (address, name) pairs
+    """
+    match = _VICE.match
+    for line in lines:
+        found = match(line)
+        if found is None:
+            continue
+        space, address, name = found.groups()
+        if memory_space is not None and space is not None and space.upper() != memory_space:
+            continue
+        address = int(address, 16)
+        if address <= 0xFFFF:
+            yield address, name
+
+
+def parse_ca65(lines: Iterable[str]) -> Iterator[Tuple[int, str]]:
+    """
+    Parses ld65 debug info, or assignments such as ``CHROUT = $FFD2``.
+    """
+    dbg = _CA65_DBG.match
+    assign = _CA65_ASSIGN.match
+    for line in lines:
+        found = dbg(line) or assign(line)
+        if found is None:
+            continue
+        name, address = found.groups()
+        address = int(address, 16)
+        if address <= 0xFFFF:
+            yield address, name
+
+
+def parse_csv(lines: Iterable[str]) -> Iterator[Tuple[int, str]]:
+    """
+    Parses CSV rows of an address and a name, in either order. A header row, or any row without a hex
+    address and a name, is skipped.
+    """
+    hex_match = _HEX.match
+    name_match = _NAME.match
+    for row in csv.reader(lines):
+        if len(row) < 2:
+            continue
+        first, second = row[0].strip(), row[1].strip()
+        found = hex_match(first)
+        if found is not None and name_match(second):
+            name = second
+        else:
+            found = hex_match(second)
+            if found is None or not name_match(first):
+                continue
+            name = first
+        address = int(found.group(1), 16)
+        if address <= 0xFFFF:
+            yield address, name
+
+
+def detect_format(line: str) -> Optional[str]:
+    """
+    Guesses the format of a symbol file from its first line that is not blank or a comment.
+    """
+    if _VICE.match(line):
+        return 'vice'
+    if line.startswith(('version\t', 'info\t', 'file\t', 'sym\t')) or _CA65_ASSIGN.match(line):
+        return 'ca65'
+    if ',' in line:
+        return 'csv'
+    return None
+
+
+def read_symbols(file_name: str, file_format: Optional[str] = None,
+                 memory_space: Optional[str] = 'C') -> Iterator[Tuple[int, str]]:
+    """
+    Reads a symbol file.
+
+    :param file_name: file to read
+    :param file_format: one of SYMBOL_FORMATS, None to detect it from the file
+    :param memory_space: VICE memory space to keep, see parse_vice
+    :return: (address, name) pairs, in file order
+    """
+    with open(file_name, 'r', encoding='utf-8', errors='replace', newline='') as f:
+        if file_format is None:
+            for line in f:
+                if line.strip() and not line.lstrip().startswith(('#', ';')):
+                    file_format = detect_format(line)
+                    break
+            f.seek(0)
+            if file_format is None:
+                raise SymbolFileError('{} is not a VICE, ca65 or CSV symbol file.'.format(file_name))
+
+        if file_format == 'vice':
+            yield from parse_vice(f, memory_space)
+        elif file_format == 'ca65':
+            yield from parse_ca65(f)
+        elif file_format == 'csv':
+            yield from parse_csv(f)
+        else:
+            raise SymbolFileError('Unknown symbol file format {}.'.format(file_format))
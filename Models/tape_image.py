@@ -0,0 +1,140 @@
+"""
+Reads files from T64 tape images.
+
+A T64 file is a header, a directory of 32 byte entries and the file contents. Each entry gives a file's load
+address, end address and offset into the image. Many tools that write T64 files put a wrong end address in
+the directory, so a file is taken to end where the next one in the image starts when that is sooner.
+
+The image is memory mapped like a disk image, and a file is only read when it is loaded.
+"""
+import mmap
+import os
+import struct
+from typing import Iterator, List, Optional
+
+from Models.disk_image import petscii_name
+from Models.image_section import ImageSection
+from Models.programimage import ProgramImage
+
+HEADER = struct.Struct('<32sHHH2x24s')
+ENTRY = struct.Struct('<BBHH2xI4x16s')
+
+SIGNATURE = b'C64'
+TAPE_EXTENSIONS = ('.t64',)
+
+
+class TapeError(Exception):
+    pass
+
+
+def is_tape_image(file_name: str) -> bool:
+    return os.path.splitext(file_name)[1].lower() in TAPE_EXTENSIONS
+
+
+class TapeFile:
+    tape: 'TapeImage'
+    raw_name: bytes
+    name: str
+    file_type: str
+    start_address: int
+    offset: int
+    size: int
+
+    def __init__(self, tape: 'TapeImage', raw_name: bytes, start_address: int, offset: int, size: int):
+        self.tape = tape
+        self.raw_name = raw_name.rstrip(b' \xa0')
+        self.name = petscii_name(self.raw_name)
+        self.file_type = 'PRG'
+        self.start_address = start_address
+        self.offset = offset
+        self.size = size
+
+    def __repr__(self):
+        return '${:04X} {:5d} "{}"'.format(self.start_address, self.size, self.name)
+
+    def read(self) -> bytes:
+        return bytes(self.tape.view[self.offset:self.offset + self.size])
+
+    def load_into(self, image: ProgramImage, address: Optional[int] = None) -> Optional[ImageSection]:
+        """
+        Copies the file into an image as a new section.
+
+        :param image: image to load the file into
+        :param address: address to load the file at; None loads it at its load address
+        :return: section info for the file, None if it collides with a loaded section or does not fit
+        """
+        data = self.tape.view[self.offset:self.offset + self.size]
+        try:
+            return image.place_segments([data], self.start_address if address is None else address,
+                                        '{}:{}'.format(self.tape.file_name, self.name),
+                                        'PRG' if address is None else 'BIN')
+        finally:
+            data.release()
+
+
+class TapeImage:
+    """
+    An open T64 image. The directory is read the first time it is asked for.
+    """
+    file_name: str
+    name: str
+    view: memoryview
+
+    def __init__(self, file_name: str):
+        self.file_name = file_name
+        with open(file_name, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self._map)
+        self._files = None
+
+        if len(self.view) < HEADER.size or not bytes(self.view[0:3]) == SIGNATURE:
+            self.close()
+            raise TapeError('{} is not a T64 image.'.format(file_name))
+        _, _, self._max_entries, _, name = HEADER.unpack_from(self.view)
+        self.name = petscii_name(name.rstrip(b' \0\xa0'))
+
+    def close(self):
+        self.view.release()
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def entries(self) -> Iterator[TapeFile]:
+        if self._files is None:
+            self._files = self._read_directory()
+        return iter(self._files)
+
+    def files(self) -> List[TapeFile]:
+        return list(self.entries())
+
+    def find(self, name: str) -> Optional[TapeFile]:
+        for tape_file in self.entries():
+            if tape_file.name == name:
+                return tape_file
+        return None
+
+    def _read_directory(self) -> List[TapeFile]:
+        # (offset, start, end, name) of every used entry; some images claim no entries but still hold one
+        used = list()
+        for index in range(0, max(self._max_entries, 1)):
+            position = HEADER.size + index * ENTRY.size
+            if position + ENTRY.size > len(self.view):
+                break
+            entry_type, _, start, end, offset, name = ENTRY.unpack_from(self.view, position)
+            if entry_type == 0 or offset >= len(self.view):
+                continue
+            used.append((offset, start, end, name))
+
+        files = list()
+        used.sort()
+        for i, (offset, start, end, name) in enumerate(used):
+            limit = used[i + 1][0] if i + 1 < len(used) else len(self.view)
+            size = (end - start) & 0xFFFF
+            if size == 0 or offset + size > limit:
+                size = limit - offset
+            files.append(TapeFile(self, name, start, offset, min(size, 0x10000 - start)))
+        return files
@@ -1,9 +1,6 @@
-from typing import Optional, Tuple
-
-import urwid
+from typing import Optional, Tuple, Any
 
 from Models.item import Item
-from Views.hex_row import HexRow
 
 
 class UnknownArea(Item):
@@ -11,7 +8,7 @@ class UnknownArea(Item):
     def __init__(self, image, address, size):
         super().__init__(image, address, size, 'Unknown')
 
-    def get_view(self, vid: Optional[Tuple[urwid.SimpleListWalker, int]] = None):
+    def get_view(self, vid: Optional[Tuple[Any, int]] = None):
         super().get_view(vid)
 
 
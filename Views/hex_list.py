@@ -0,0 +1,110 @@
+from collections import OrderedDict
+from typing import Optional, Union
+
+import urwid
+
+from Models.programimage import ProgramImage
+from Views.hex_row import HexRow, HexLine
+
+ROW_BYTES = 16
+
+
+class HexRowWalker(urwid.ListWalker):
+    """
+    List walker that presents an address range of a ProgramImage as hex dump rows. Rows are only built when
+    the list box asks for them, and the most recently used ones are kept in a bounded LRU cache, so memory
+    and startup cost do not depend on the size of the image.
+
+    Positions are row numbers counted from the start address. The row widget is built by row_class, which
+    is either HexRow or the single canvas HexLine.
+    """
+    image: ProgramImage
+    start_address: int
+    end_address: int
+    row_count: int
+    cache_size: int
+    row_class: type
+    focus: int
+    row_cache: OrderedDict
+
+    def __init__(self, image: ProgramImage, start_address: int = 0, end_address: Optional[int] = None,
+                 cache_size: int = 128, row_class: type = HexRow):
+        self.image = image
+        self.start_address = start_address
+        self.end_address = len(image) if end_address is None else end_address
+        self.row_count = (self.end_address - self.start_address + ROW_BYTES - 1) // ROW_BYTES
+        self.cache_size = cache_size
+        self.row_class = row_class
+        self.focus = 0
+        self.row_cache = OrderedDict()
+
+    def __len__(self):
+        return self.row_count
+
+    def __getitem__(self, position: int) -> Union[HexRow, HexLine]:
+        if not 0 <= position < self.row_count:
+            raise IndexError(position)
+
+        row = self.row_cache.get(position)
+        if row is not None:
+            self.row_cache.move_to_end(position)
+            return row
+
+        row_start = self.start_address + position * ROW_BYTES
+        row_end = min(row_start + ROW_BYTES, self.end_address)
+        row = self.row_class(self.image, row_start, row_end)
+        self.row_cache[position] = row
+        if len(self.row_cache) > self.cache_size:
+            self.row_cache.popitem(last=False)
+        return row
+
+    def next_position(self, position: int) -> int:
+        if position + 1 >= self.row_count:
+            raise IndexError(position + 1)
+        return position + 1
+
+    def prev_position(self, position: int) -> int:
+        if position <= 0:
+            raise IndexError(position - 1)
+        return position - 1
+
+    def set_focus(self, position: int):
+        if not 0 <= position < self.row_count:
+            raise IndexError(position)
+        self.focus = position
+        self._modified()
+
+    def position_of(self, address: int) -> int:
+        """
+        Returns the row position that holds an address.
+
+        :param address: address in the image
+        :return: row position of the address
+        """
+        if not self.start_address <= address < self.end_address:
+            raise IndexError('Address {:04X} is outside of the listing.'.format(address))
+        return (address - self.start_address) // ROW_BYTES
+
+    def set_focus_address(self, address: int):
+        """
+        Moves the focus to the row that holds an address.
+
+        :param address: address to jump to
+        """
+        self.set_focus(self.position_of(address))
+
+    def refresh(self, start: int, end: int):
+        """
+        Drops the cached rows that show any address in a range, so they get rebuilt with the current image
+        contents the next time they are displayed.
+
+        :param start: first address that changed
+        :param end: address after the last one that changed
+        """
+        start = max(start, self.start_address)
+        end = min(end, self.end_address)
+        if start >= end:
+            return
+        for position in range(self.position_of(start), self.position_of(end - 1) + 1):
+            self.row_cache.pop(position, None)
+        self._modified()
@@ -1,9 +1,33 @@
-from typing import Dict, List
+import sys
+from typing import Dict, List, Optional, Sequence
 
 import urwid
 
+import Controller.messages  # registers the messages the views listen for
 from Models.programimage import ProgramImage
 from Controller.messenging import send_message, connect_listener
+from Controller.tracing import traced
+
+# Formatting tables indexed by byte value, so the cell text is never formatted while building or rendering rows.
+HEX_STRINGS = tuple(sys.intern('{:02X}'.format(value)) for value in range(256))
+ASCII_CHARS = tuple(sys.intern(chr(value) if 0x20 <= value < 0x7F else '.') for value in range(256))
+# PETSCII glyphs that have an ASCII look-alike; the unshifted set matches ASCII from $20 to $5F, and $C1-$DA
+# repeat the letters.
+PETSCII_CHARS = tuple(sys.intern(chr(value) if 0x20 <= value < 0x60 else
+                                 chr(value - 0x80) if 0xC1 <= value <= 0xDA else '.') for value in range(256))
+HEX_BYTES = tuple(text.encode('ascii') for text in HEX_STRINGS)
+ASCII_BYTES = tuple(text.encode('ascii') for text in ASCII_CHARS)
+PETSCII_BYTES = tuple(text.encode('ascii') for text in PETSCII_CHARS)
+
+# Display attributes indexed by whether the cell is selected.
+ADDR_ATTRS = ('addr_field', 'addr_field_sel')
+HEX_ATTRS = ('hex_byte', 'hex_byte_sel')
+CHAR_ATTRS = ('hex_char', 'hex_char_sel')
+OPERAND_ATTRS = ('operand', 'operand_sel')
+
+
+def format_address(address: int) -> str:
+    return HEX_STRINGS[(address >> 8) & 0xFF] + HEX_STRINGS[address & 0xFF]
 
 
 class HexDigit(urwid.WidgetWrap):
@@ -18,12 +42,16 @@ class HexDigit(urwid.WidgetWrap):
     def rows(self, size, focus=False):
         return 1
 
+    # noinspection PyMethodMayBeStatic,PyUnusedLocal
+    def keypress(self, size, key):
+        return key
+
     def __init__(self, value: int, is_undefined=False, undefined_ch='  '):
         self.is_undefined = is_undefined
         self.value = value
-        normal_attr = 'hidden' if self.is_undefined else 'hex_byte'
-        focus_attr = 'hidden' if self.is_undefined else 'hex_byte_sel'
-        value_str = undefined_ch if self.is_undefined else '{:02X}'.format(self.value)
+        normal_attr = 'hidden' if self.is_undefined else HEX_ATTRS[False]
+        focus_attr = 'hidden' if self.is_undefined else HEX_ATTRS[True]
+        value_str = undefined_ch if self.is_undefined else HEX_STRINGS[self.value]
 
         super().__init__(urwid.AttrMap(urwid.Text(value_str), normal_attr, focus_attr))
 
@@ -31,24 +59,27 @@ class HexDigit(urwid.WidgetWrap):
 class HexChar(urwid.WidgetWrap):
     address: int
     is_undefined: bool
+    is_selected: bool
     value: int
     undefined_ch: str
     attr_widget: urwid.AttrMap
 
     def _focus_address(self, address: int):
-        if self.address == address and not self.is_undefined:
-            self.attr_widget.set_attr_map({None: 'hex_char_sel'})
-        else:
-            self.attr_widget.set_attr_map({None: 'hex_char'})
-        self._invalidate()
-
-    def __init__(self, value: int, address: int, is_undefined=False, undefined_ch=' '):
+        selected = self.address == address and not self.is_undefined
+        if selected != self.is_selected:
+            self.is_selected = selected
+            self.attr_widget.set_attr_map({None: CHAR_ATTRS[selected]})
+            self._invalidate()
+
+    def __init__(self, value: int, address: int, is_undefined=False, undefined_ch=' ',
+                 char_table: Sequence[str] = ASCII_CHARS):
         self.address = address
         self.is_undefined = is_undefined
+        self.is_selected = False
         self.value = value
         self.undefined_ch = undefined_ch
-        char_attr = 'hidden' if self.is_undefined else ('hex_char_sel' if self.is_focussed else 'hex_byte')
-        value_str = self.undefined_ch if self.is_undefined else (chr(value) if 0x20 <= value < 0x7F else '.')
+        char_attr = 'hidden' if self.is_undefined else CHAR_ATTRS[False]
+        value_str = self.undefined_ch if self.is_undefined else char_table[value]
         self.attr_widget = urwid.AttrMap(urwid.Text(value_str), char_attr)
 
         super().__init__(self.attr_widget)
@@ -60,20 +91,22 @@ class HexChar(urwid.WidgetWrap):
 class HexAddress(urwid.WidgetWrap):
     start_address: int
     end_address: int
+    is_selected: bool
     attr_widget: urwid.AttrMap
 
     def _focus_address(self, address):
-        if self.start_address <= address < self.end_address:
-            self.attr_widget.set_attr_map({None: 'addr_field_sel'})
-        else:
-            self.attr_widget.set_attr_map({None: 'addr_field'})
-        self._invalidate()
+        selected = self.start_address <= address < self.end_address
+        if selected != self.is_selected:
+            self.is_selected = selected
+            self.attr_widget.set_attr_map({None: ADDR_ATTRS[selected]})
+            self._invalidate()
 
     def __init__(self, start_address: int, end_address: int):
         self.start_address = start_address
         self.end_address = end_address
-        address_attr = 'addr_field'
-        address_str = '{:04X}'.format(self.start_address)
+        self.is_selected = False
+        address_attr = ADDR_ATTRS[False]
+        address_str = format_address(self.start_address)
         self.attr_widget = urwid.AttrMap(urwid.Text(address_str), address_attr)
 
         super().__init__(self.attr_widget)
@@ -83,9 +116,9 @@ class HexAddress(urwid.WidgetWrap):
 
 class BlankSpace(urwid.WidgetWrap):
 
-    def _init__(self, length=1):
+    def __init__(self, length=1):
         spaces = ' ' * length
-        super().__init__(urwid.Text((spaces, 'hidden')))
+        super().__init__(urwid.Text(('hidden', spaces)))
 
     # noinspection PyMethodMayBeStatic,PyUnusedLocal
     def rows(self, size, focus=False):
@@ -96,7 +129,8 @@ class HexRow(urwid.Columns):
     char_widgets: List[HexChar]
     focus_addresses: Dict[int, int]
 
-    def __init__(self, image: ProgramImage, start_address: int, end_address: int):
+    def __init__(self, image: ProgramImage, start_address: int, end_address: int,
+                 char_table: Sequence[str] = ASCII_CHARS):
         widget_list = list()
 
         widget_list.append((5, HexAddress(start_address, end_address)))
@@ -105,33 +139,189 @@ class HexRow(urwid.Columns):
         self.focus_addresses = dict()
         self.char_widgets = list()
         position = 2
-        for i in range(0, 16 if start_address + 16 < len(image) else (len(image) - start_address)):
-            widget_list.append((2, HexDigit(image[start_address + i], end_address >= start_address + i)))
+        for i in range(0, min(16, len(image) - start_address)):
+            widget_list.append((2, HexDigit(image[start_address + i], start_address + i >= end_address)))
             if (start_address + i) < end_address:
                 self.focus_addresses[position] = start_address + i
             self.char_widgets.append(HexChar(image[start_address + i], start_address + i,
-                                             end_address >= start_address + i))
+                                             start_address + i >= end_address, char_table=char_table))
             position += 2
 
             if i != 7:
                 widget_list.append((1, BlankSpace()))
             else:
-                widget_list.append((1, urwid.Text(('-', 'hex_sep'))))
+                widget_list.append((1, urwid.Text(('hex_sep', '-'))))
 
-        widget_list.append((2, urwid.Text((' |', 'hex_sep'))))
+        widget_list.append((2, urwid.Text(('hex_sep', ' |'))))
         for char_widget in self.char_widgets:
             widget_list.append((1, char_widget))
-        widget_list.append((1, urwid.Text(('|', 'hex_sep'))))
+        widget_list.append((1, urwid.Text(('hex_sep', '|'))))
 
         super().__init__(widget_list)
 
     def _set_focus_position(self, position):
         super()._set_focus_position(position)
-        for focus_pos, focus_address in self.focus_addresses.items():
-            if self.focus_position == focus_pos:
-                send_message('focus_address', self.focus_addresses[focus_pos])
+        if position in self.focus_addresses:
+            send_message('focus_address', self.focus_addresses[position])
+
+    # Columns binds its own setter into the property, so it has to be rebuilt for the override to be used
+    focus_position = property(urwid.Columns._get_focus_position, _set_focus_position)
+
+
+class HexLine(urwid.Widget):
+    """
+    Single widget version of HexRow. The whole line is rendered straight into one TextCanvas instead of
+    going through a Columns of ~50 wrapped Text widgets, and the byte cursor is tracked by the widget itself.
+    The line looks and behaves the same as a HexRow.
+    """
+    _selectable = True
+    _sizing = frozenset(['flow'])
+
+    image: ProgramImage
+    start_address: int
+    end_address: int
+    byte_count: int
+    cursor: int
+    focused_address: Optional[int]
+    char_table: Sequence[bytes]
+
+    HEX_COLUMN = 6
+    CHAR_COLUMN = 56
+
+    def __init__(self, image: ProgramImage, start_address: int, end_address: int,
+                 char_table: Sequence[bytes] = ASCII_BYTES):
+        super().__init__()
+        self.image = image
+        self.char_table = char_table
+        self.start_address = start_address
+        self.end_address = end_address
+        self.byte_count = min(16, len(image) - start_address)
+        self.cursor = 0
+        self.focused_address = None
+
+        connect_listener('focus_address', self._focus_address)
+
+    def _focus_address(self, address: int):
+        previous = self.focused_address
+        self.focused_address = address
+        if self._in_row(previous) or self._in_row(address):
+            self._invalidate()
+
+    def _in_row(self, address: Optional[int]):
+        return address is not None and self.start_address <= address < self.end_address
+
+    def _defined_count(self):
+        return max(min(self.end_address, self.start_address + self.byte_count) - self.start_address, 0)
+
+    def _set_cursor(self, cursor: int):
+        self.cursor = cursor
+        send_message('focus_address', self.start_address + cursor)
         self._invalidate()
 
+    # noinspection PyMethodMayBeStatic,PyUnusedLocal
+    def rows(self, size, focus=False):
+        return 1
+
+    @traced('HexLine.render', 'view')
+    def render(self, size, focus=False):
+        maxcol = size[0]
+        start = self.start_address
+        defined = self._defined_count()
+        row_focused = self._in_row(self.focused_address)
+
+        text = bytearray(HEX_BYTES[start >> 8])
+        text += HEX_BYTES[start & 0xFF]
+        text += b'  '
+        runs = [(ADDR_ATTRS[row_focused], 5), ('hidden', 1)]
+
+        for i in range(0, self.byte_count):
+            if i < defined:
+                text += HEX_BYTES[self.image[start + i]]
+                runs.append((HEX_ATTRS[focus and i == self.cursor], 2))
+            else:
+                text += b'  '
+                runs.append(('hidden', 2))
+            if i != 7:
+                text += b' '
+                runs.append(('hidden', 1))
+            else:
+                text += b'-'
+                runs.append(('hex_sep', 1))
+
+        text += b' |'
+        runs.append(('hex_sep', 2))
+        for i in range(0, self.byte_count):
+            if i < defined:
+                text += self.char_table[self.image[start + i]]
+                runs.append((CHAR_ATTRS[start + i == self.focused_address], 1))
+            else:
+                text += b' '
+                runs.append(('hidden', 1))
+        text += b'|'
+        runs.append(('hex_sep', 1))
+
+        if len(text) < maxcol:
+            runs.append((None, maxcol - len(text)))
+            text += b' ' * (maxcol - len(text))
+        elif len(text) > maxcol:
+            del text[maxcol:]
+            runs = _clip_runs(runs, maxcol)
+
+        return urwid.TextCanvas([bytes(text)], [_merge_runs(runs)], maxcol=maxcol)
+
+    def keypress(self, size, key):
+        if key == 'left' and self.cursor > 0:
+            self._set_cursor(self.cursor - 1)
+            return None
+        if key == 'right' and self.cursor + 1 < self._defined_count():
+            self._set_cursor(self.cursor + 1)
+            return None
+        return key
+
+    def get_pref_col(self, size):
+        return self.HEX_COLUMN + self.cursor * 3
+
+    def move_cursor_to_coords(self, size, col, row):
+        defined = self._defined_count()
+        if defined == 0:
+            return False
+        if col == urwid.LEFT:
+            cursor = 0
+        elif col == urwid.RIGHT:
+            cursor = defined - 1
+        elif col >= self.CHAR_COLUMN:
+            cursor = col - self.CHAR_COLUMN
+        else:
+            cursor = (col - self.HEX_COLUMN) // 3
+        self._set_cursor(max(0, min(cursor, defined - 1)))
+        return True
+
+    def mouse_event(self, size, event, button, col, row, focus):
+        if event == 'mouse press' and button == 1:
+            return self.move_cursor_to_coords(size, col, row)
+        return False
+
+
+def _merge_runs(runs):
+    merged = list()
+    for attr, length in runs:
+        if merged and merged[-1][0] == attr:
+            merged[-1] = (attr, merged[-1][1] + length)
+        else:
+            merged.append((attr, length))
+    return merged
+
+
+def _clip_runs(runs, maxcol):
+    clipped = list()
+    remaining = maxcol
+    for attr, length in runs:
+        if remaining <= 0:
+            break
+        clipped.append((attr, min(length, remaining)))
+        remaining -= length
+    return clipped
+
 
 class OpCodeColumns(urwid.Columns):
     focus_addresses: Dict[int, int]
@@ -149,22 +339,24 @@ class OpCodeColumns(urwid.Columns):
 
     def _set_focus_position(self, position):
         super()._set_focus_position(position)
-        for focus_pos, focus_address in self.focus_addresses.items():
-            if self.focus_position == focus_pos:
-                assert focus_pos in self.focus_addresses
-                send_message('focus_address', self.focus_addresses[focus_pos])
-        self._invalidate()
+        if position in self.focus_addresses:
+            send_message('focus_address', self.focus_addresses[position])
+
+    # Columns binds its own setter into the property, so it has to be rebuilt for the override to be used
+    focus_position = property(urwid.Columns._get_focus_position, _set_focus_position)
 
 
 class Operand(urwid.WidgetWrap):
     address: int
+    is_selected: bool
     operand_text: urwid.Text
     operand_attr: urwid.AttrMap
 
     def __init__(self, address: int, text=''):
         self.address = address
+        self.is_selected = False
         self.operand_text = urwid.Text(text)
-        self.operand_attr = urwid.AttrMap(self.operand_text, 'operand')
+        self.operand_attr = urwid.AttrMap(self.operand_text, OPERAND_ATTRS[False])
 
         super().__init__(self.operand_attr)
 
@@ -172,11 +364,11 @@ class Operand(urwid.WidgetWrap):
         connect_listener('set_operand_text', self._set_operand_text)
 
     def _focus_address(self, address: int):
-        if self.address == address:
-            self.attr_widget.set_attr_map({None: 'operand_sel'})
-        else:
-            self.attr_widget.set_attr_map({None: 'operand'})
-        self._invalidate()
+        selected = self.address == address
+        if selected != self.is_selected:
+            self.is_selected = selected
+            self.operand_attr.set_attr_map({None: OPERAND_ATTRS[selected]})
+            self._invalidate()
 
     def _set_operand_text(self, address: int, text: str):
         if address == self.address:
@@ -188,7 +380,7 @@ class OperandLine(urwid.Columns):
     def __init__(self, start_address, end_address):
         operand = list()
         for address in range(start_address, end_address):
-            operand.append('pack', Operand(address))
+            operand.append(('pack', Operand(address)))
         super().__init__(operand)
 
 
@@ -199,7 +391,7 @@ class LabelText(urwid.WidgetWrap):
     def __init__(self, address: int, text=''):
         self.address = address
         self.label_text = urwid.Text(text)
-        super().__init__(urwid.WidgetWrap(self.label_text), 'label')
+        super().__init__(urwid.AttrMap(self.label_text, 'label'))
 
         connect_listener('label_text', self._set_label)
 
@@ -214,8 +406,8 @@ class OpCodeText(urwid.WidgetWrap):
 
     def __init__(self, address: int, text=''):
         self.address = address
-        self.label_text = urwid.Text(text)
-        super().__init__(urwid.WidgetWrap(self.op_code_text), 'op_code_text')
+        self.op_code_text = urwid.Text(text)
+        super().__init__(urwid.AttrMap(self.op_code_text, 'op_code_text'))
 
         connect_listener('op_code_text', self._set_op_code_text)
 
@@ -231,7 +423,7 @@ class CommentText(urwid.WidgetWrap):
     def __init__(self, address: int, comment=''):
         self.address = address
         self.comment_text = urwid.Text(comment)
-        super().__init__(urwid.WidgetWrap(self.comment_text), 'comment_text')
+        super().__init__(urwid.AttrMap(self.comment_text, 'comment_text'))
 
         connect_listener('comment_text', self._set_comment_text)
 
@@ -242,7 +434,7 @@ class CommentText(urwid.WidgetWrap):
 
 class DefinedRow(urwid.Columns):
 
-    def __init__(self, image: ProgramImage, start_address: int, end_address: int):
+    def __init__(self, image: ProgramImage, start_address: int, end_address: int, label: str = ''):
         widget_list = list()
 
         widget_list.append((5, HexAddress(start_address, end_address)))
@@ -250,13 +442,13 @@ class DefinedRow(urwid.Columns):
 
         widget_list.append((24, OpCodeColumns(image, start_address, end_address)))
         widget_list.append((1, BlankSpace()))
-        widget_list.append((10, LabelText(start_address)))  # Label column
+        widget_list.append((10, LabelText(start_address, label)))  # Label column
         widget_list.append((1, BlankSpace()))
         widget_list.append((5, OpCodeText(start_address)))  # Opcode Text
 
         widget_list.append((1, BlankSpace()))
-        widget_list.append(25, OperandLine(start_address, end_address))  # Operand
+        widget_list.append((25, OperandLine(start_address, end_address)))  # Operand
         widget_list.append((1, BlankSpace()))
-        widget_list.append(50, CommentText(start_address))  # comment
+        widget_list.append((50, CommentText(start_address)))  # comment
 
         super().__init__(widget_list)
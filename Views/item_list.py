@@ -0,0 +1,171 @@
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from typing import List, Optional
+
+import urwid
+
+import Controller.messages  # registers the messages the walker listens for
+from Controller.messenging import connect_listener
+from Controller.tracing import span
+from Models.item import Item
+from Models.programimage import ProgramImage
+from Models.project_member import ProjectMember
+from Views.hex_row import DefinedRow
+
+
+class ItemListWalker(urwid.ListWalker):
+    """
+    List walker that presents the items of an image as a disassembly listing. A DefinedRow is only built when
+    the list box asks for it and the most recently used ones are kept in a bounded LRU cache. The items are
+    kept in address order next to a parallel list of their start addresses, so finding the row of an address
+    is a bisect.
+
+    Positions are indexes into the sorted item list.
+
+    A walker given the member the items belong to follows the member's item_changed and item_removed
+    messages and shows its symbols as labels, built again when symbols are imported.
+    """
+    image: ProgramImage
+    items: List[Item]
+    addresses: List[int]
+    cache_size: int
+    focus: int
+    row_cache: OrderedDict
+    member: Optional[ProjectMember]
+
+    def __init__(self, image: ProgramImage, items: List[Item], cache_size: int = 128,
+                 member: Optional[ProjectMember] = None):
+        self.image = image
+        self.items = sorted(items, key=lambda item: item.start_address)
+        self.addresses = [item.start_address for item in self.items]
+        self.cache_size = cache_size
+        self.focus = 0
+        self.row_cache = OrderedDict()
+        self.member = member
+
+        if member is not None:
+            connect_listener('item_changed', self._item_changed)
+            connect_listener('item_removed', self._item_removed)
+            connect_listener('symbols_imported', self._symbols_imported)
+
+    @classmethod
+    def for_member(cls, member: ProjectMember, cache_size: int = 128) -> 'ItemListWalker':
+        """
+        Listing of the items of a member's current memory configuration, kept up to date with the member.
+        """
+        return cls(member.current_image, member.mappings, cache_size, member)
+
+    def _item_changed(self, member: ProjectMember, item: Item):
+        if member is self.member:
+            self.add_item(item)
+
+    def _item_removed(self, member: ProjectMember, item: Item):
+        if member is self.member:
+            self.remove_item(item)
+
+    # noinspection PyUnusedLocal
+    def _symbols_imported(self, member: ProjectMember, count: int):
+        if member is self.member:
+            self.refresh()
+
+    def __len__(self):
+        return len(self.items)
+
+    def __getitem__(self, position: int) -> DefinedRow:
+        if not 0 <= position < len(self.items):
+            raise IndexError(position)
+
+        item = self.items[position]
+        row = self.row_cache.get(item.start_address)
+        if row is not None:
+            self.row_cache.move_to_end(item.start_address)
+            return row
+
+        label = self.member.symbols.get(item.start_address, '') if self.member is not None else ''
+        with span('DefinedRow', 'view'):
+            row = DefinedRow(self.image, item.start_address, item.end_address, label)
+        item.get_view((self, position))
+        self.row_cache[item.start_address] = row
+        if len(self.row_cache) > self.cache_size:
+            self.row_cache.popitem(last=False)
+        return row
+
+    def next_position(self, position: int) -> int:
+        if position + 1 >= len(self.items):
+            raise IndexError(position + 1)
+        return position + 1
+
+    def prev_position(self, position: int) -> int:
+        if position <= 0:
+            raise IndexError(position - 1)
+        return position - 1
+
+    def set_focus(self, position: int):
+        if not 0 <= position < len(self.items):
+            raise IndexError(position)
+        self.focus = position
+        self._modified()
+
+    def position_of(self, address: int) -> int:
+        """
+        Returns the position of the item that holds an address, or of the closest item before it when the
+        address falls in a gap between items.
+
+        :param address: address to look up
+        :return: position of the item
+        """
+        position = bisect_right(self.addresses, address) - 1
+        if position < 0:
+            raise IndexError('No item at or before address {:04X}.'.format(address))
+        return position
+
+    def set_focus_address(self, address: int):
+        """
+        Moves the focus to the item that holds an address.
+
+        :param address: address to jump to
+        """
+        self.set_focus(self.position_of(address))
+
+    def add_item(self, item: Item):
+        """
+        Adds an item to the listing, keeping the address order. An item starting where one is listed already
+        takes its place.
+
+        :param item: item to add
+        """
+        position = bisect_right(self.addresses, item.start_address)
+        if position > 0 and self.addresses[position - 1] == item.start_address:
+            self.items[position - 1] = item
+            self.row_cache.pop(item.start_address, None)
+            self._modified()
+            return
+        self.addresses.insert(position, item.start_address)
+        self.items.insert(position, item)
+        if position <= self.focus < len(self.items) - 1:
+            self.focus += 1
+        self._modified()
+
+    def remove_item(self, item: Item):
+        """
+        Removes an item from the listing. An item that is not listed, such as one another item already
+        replaced, is ignored.
+
+        :param item: item to remove
+        """
+        position = bisect_left(self.addresses, item.start_address)
+        if position == len(self.items) or self.items[position] is not item:
+            return
+        del self.items[position]
+        del self.addresses[position]
+        self.row_cache.pop(item.start_address, None)
+        if self.focus > position or self.focus >= len(self.items):
+            self.focus = max(self.focus - 1, 0)
+        self._modified()
+
+    def refresh(self):
+        """
+        Builds the rows again, for changes the items do not show, such as new symbols.
+        """
+        self.row_cache.clear()
+        self._modified()
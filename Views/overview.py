@@ -0,0 +1,87 @@
+import urwid
+
+import Controller.messages  # registers the messages the views listen for
+from Controller.messenging import connect_listener
+from Controller.tracing import traced
+from Models.memory_overview import MemoryOverview, KIND_NAMES, PAGE_SIZE
+from Views.hex_row import HEX_BYTES
+
+PAGES_PER_LINE = 64
+
+# One character per page kind; pages owned by a loaded section show the upper case letter.
+_KIND_CHARS = (b' ', b'.', b'c', b'd', b't')
+_SECTION_CHARS = (b' ', b':', b'C', b'D', b'T')
+_KIND_ATTRS = tuple('ov_' + name for name in KIND_NAMES)
+
+
+class OverviewStrip(urwid.Widget):
+    """
+    Memory map of a ProjectMember, one character per 256 byte page and 64 pages per line, showing the kind
+    of each page. It is redrawn when an item changes.
+    """
+    _selectable = False
+    _sizing = frozenset(['flow'])
+
+    overview: MemoryOverview
+
+    def __init__(self, overview: MemoryOverview):
+        super().__init__()
+        self.overview = overview
+
+        connect_listener('item_changed', self._item_changed)
+        connect_listener('item_removed', self._item_removed)
+
+    def _item_changed(self, member, item):
+        if member is self.overview.member:
+            self.overview.item_changed(item)
+            self._invalidate()
+
+    def _item_removed(self, member, item):
+        if member is self.overview.member:
+            self.overview.item_removed(item)
+            self._invalidate()
+
+    def rebuild(self):
+        self.overview.rebuild()
+        self._invalidate()
+
+    # noinspection PyUnusedLocal
+    def rows(self, size, focus=False):
+        return (self.overview.page_count + PAGES_PER_LINE - 1) // PAGES_PER_LINE
+
+    @traced('OverviewStrip.render', 'view')
+    def render(self, size, focus=False):
+        maxcol = size[0]
+        page_kinds = self.overview.page_kinds
+        page_sections = self.overview.page_sections
+        text = list()
+        attrs = list()
+
+        for first in range(0, self.overview.page_count, PAGES_PER_LINE):
+            address = first * PAGE_SIZE
+            line = bytearray(HEX_BYTES[(address >> 8) & 0xFF] + HEX_BYTES[address & 0xFF] + b' ')
+            runs = [('addr_field', 5)]
+            for page in range(first, min(first + PAGES_PER_LINE, self.overview.page_count)):
+                kind = page_kinds[page]
+                line += (_KIND_CHARS if page_sections[page] is None else _SECTION_CHARS)[kind]
+                if runs[-1][0] == _KIND_ATTRS[kind]:
+                    runs[-1] = (runs[-1][0], runs[-1][1] + 1)
+                else:
+                    runs.append((_KIND_ATTRS[kind], 1))
+
+            if len(line) < maxcol:
+                runs.append((None, maxcol - len(line)))
+                line += b' ' * (maxcol - len(line))
+            elif len(line) > maxcol:
+                del line[maxcol:]
+                clipped = list()
+                remaining = maxcol
+                for attr, length in runs:
+                    if remaining > 0:
+                        clipped.append((attr, min(length, remaining)))
+                    remaining -= length
+                runs = clipped
+            text.append(bytes(line))
+            attrs.append(runs)
+
+        return urwid.TextCanvas(text, attrs, maxcol=maxcol)
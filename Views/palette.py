@@ -13,3 +13,10 @@ palette.append(('hex_byte_sel', 'black', 'light gray'))
 palette.append(('hex_char', 'light gray', 'black'))
 palette.append(('hex_char_sel', 'black', 'light gray'))
 palette.append(('hex_sep', 'dark cyan', 'black'))
+palette.append(('status', 'black', 'dark cyan'))
+
+palette.append(('ov_unmapped', 'dark gray', 'black'))
+palette.append(('ov_unknown', 'light gray', 'black'))
+palette.append(('ov_code', 'light green', 'black'))
+palette.append(('ov_data', 'light blue', 'black'))
+palette.append(('ov_text', 'light magenta', 'black'))
@@ -0,0 +1,120 @@
+from collections import OrderedDict
+from typing import Callable, List, Optional
+
+import urwid
+
+import Controller.messages  # registers the messages the views send
+from Controller.messenging import send_message
+from Models.search import SearchHit
+
+
+class SearchHitRow(urwid.WidgetWrap):
+    """
+    One search hit. Pressing enter on it sends 'goto_address' with the hit's bank and address.
+    """
+    hit: SearchHit
+
+    def __init__(self, hit: SearchHit):
+        self.hit = hit
+        text = '{:6} ${:04X}  {}'.format(hit.bank, hit.address, ' '.join('{:02X}'.format(value) for value in hit.data))
+        super().__init__(urwid.AttrMap(urwid.SelectableIcon(text, 0), 'hex_byte', 'hex_byte_sel'))
+
+    def keypress(self, size, key):
+        if key == 'enter':
+            send_message('goto_address', self.hit.bank, self.hit.address)
+            return None
+        return key
+
+    def mouse_event(self, size, event, button, col, row, focus):
+        if event == 'mouse press' and button == 1:
+            send_message('goto_address', self.hit.bank, self.hit.address)
+            return True
+        return False
+
+
+class SearchResultWalker(urwid.ListWalker):
+    """
+    List walker over the hits of a search that may still be running. Hits are appended as they arrive and
+    rows are only built for the hits on screen, through a bounded LRU cache.
+    """
+    hits: List[SearchHit]
+    cache_size: int
+    focus: int
+    row_cache: OrderedDict
+
+    def __init__(self, cache_size: int = 64):
+        self.hits = list()
+        self.cache_size = cache_size
+        self.focus = 0
+        self.row_cache = OrderedDict()
+
+    def __len__(self):
+        return len(self.hits)
+
+    def __getitem__(self, position: int) -> SearchHitRow:
+        if not 0 <= position < len(self.hits):
+            raise IndexError(position)
+
+        row = self.row_cache.get(position)
+        if row is not None:
+            self.row_cache.move_to_end(position)
+            return row
+
+        row = SearchHitRow(self.hits[position])
+        self.row_cache[position] = row
+        if len(self.row_cache) > self.cache_size:
+            self.row_cache.popitem(last=False)
+        return row
+
+    def next_position(self, position: int) -> int:
+        if position + 1 >= len(self.hits):
+            raise IndexError(position + 1)
+        return position + 1
+
+    def prev_position(self, position: int) -> int:
+        if position <= 0:
+            raise IndexError(position - 1)
+        return position - 1
+
+    def set_focus(self, position: int):
+        if not 0 <= position < len(self.hits):
+            raise IndexError(position)
+        self.focus = position
+        self._modified()
+
+    def add_hits(self, hits: List[SearchHit]):
+        """
+        Appends hits that arrived from a running search.
+        """
+        self.hits += hits
+        self._modified()
+
+    def clear(self):
+        self.hits = list()
+        self.row_cache.clear()
+        self.focus = 0
+        self._modified()
+
+
+class SearchPrompt(urwid.Edit):
+    """
+    One line prompt for a search pattern. Enter hands the text to on_submit, escape to on_cancel.
+    """
+    on_submit: Callable[[str], None]
+    on_cancel: Optional[Callable[[], None]]
+
+    def __init__(self, on_submit: Callable[[str], None], on_cancel: Optional[Callable[[], None]] = None,
+                 caption: str = 'Search: '):
+        super().__init__(caption)
+        self.on_submit = on_submit
+        self.on_cancel = on_cancel
+
+    def keypress(self, size, key):
+        if key == 'enter':
+            self.on_submit(self.edit_text)
+            return None
+        if key == 'esc':
+            if self.on_cancel is not None:
+                self.on_cancel()
+            return None
+        return super().keypress(size, key)
@@ -0,0 +1,48 @@
+from typing import Dict
+
+import urwid
+
+import Controller.messages  # registers the messages the views listen for
+from Controller.messenging import connect_listener
+
+
+class StatusBar(urwid.WidgetWrap):
+    """
+    One line status bar that shows the progress of the running background jobs, or the last thing that
+    happened when none are running.
+    """
+    status_text: urwid.Text
+    running: Dict[object, float]
+    last_message: str
+
+    def __init__(self, text=''):
+        self.status_text = urwid.Text(text)
+        self.running = dict()
+        self.last_message = text
+        super().__init__(urwid.AttrMap(self.status_text, 'status'))
+
+        connect_listener('job_progress', self._job_progress)
+        connect_listener('job_finished', self._job_finished)
+
+    def set_message(self, text: str):
+        self.last_message = text
+        self._update()
+
+    def _job_progress(self, job, progress: float):
+        self.running[job] = progress
+        self._update()
+
+    def _job_finished(self, job, kind: str, payload):
+        self.running.pop(job, None)
+        if kind == 'failed':
+            self.last_message = '{} failed: {}'.format(job.name, payload)
+        else:
+            self.last_message = '{} {}'.format(job.name, kind)
+        self._update()
+
+    def _update(self):
+        if self.running:
+            self.status_text.set_text('  '.join('{}: {:3.0f}%'.format(job.name, progress * 100)
+                                                for job, progress in self.running.items()))
+        else:
+            self.status_text.set_text(self.last_message)
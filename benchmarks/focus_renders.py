@@ -0,0 +1,49 @@
+"""
+Counts how many widgets are rendered again when the cursor moves one byte to the right in a full screen hex
+dump. Only the two affected cells and the row header should be redrawn, whatever the size of the screen.
+
+Run from the repository root with ``python -m benchmarks.focus_renders``.
+"""
+import urwid
+
+from Models.programimage import ProgramImage
+from Views.hex_list import HexRowWalker
+from Views.hex_row import HexRow, HexLine
+
+SIZE = (80, 50)
+
+
+def count_renders(row_class: type, size: tuple = SIZE) -> int:
+    """
+    Widgets are only rendered when their cached canvas was invalidated, and every fresh canvas is stored
+    in urwid's CanvasCache, so counting the stores counts the renders. The cache only holds weak references,
+    so the previous screen canvas is kept alive the same way a real screen keeps it.
+    """
+    calls = [0]
+    store = urwid.CanvasCache.store
+
+    def counting_store(cache, wcls, canvas):
+        calls[0] += 1
+        store(wcls, canvas)
+
+    listbox = urwid.ListBox(HexRowWalker(ProgramImage(), row_class=row_class))
+    listbox.keypress(size, 'right')
+    screen_canvas = listbox.render(size, focus=True)
+
+    urwid.CanvasCache.store = classmethod(counting_store)
+    try:
+        listbox.keypress(size, 'right')
+        screen_canvas = listbox.render(size, focus=True)
+    finally:
+        urwid.CanvasCache.store = store
+    del screen_canvas
+    return calls[0]
+
+
+def main():
+    for row_class in (HexRow, HexLine):
+        print('{:8} {:4} renders for one arrow key press'.format(row_class.__name__, count_renders(row_class)))
+
+
+if __name__ == '__main__':
+    main()
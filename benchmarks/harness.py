@@ -0,0 +1,141 @@
+"""
+Shared helpers for the benchmark scripts: ROM images built from the data directory, a timer that reports
+operations per second together with the memory allocated per operation, and a fixed reference workload
+that measures how fast the machine running the benchmarks is.
+"""
+import os
+import time
+import tracemalloc
+from typing import Callable, List
+
+from Models.programimage import ProgramImage
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+
+ROM_SETS = {
+    'C64': [('C64/basic', 0xA000), ('C64/chargen', 0xD000), ('C64/kernal', 0xE000)],
+    'C128': [('C128/basiclo', 0x4000), ('C128/basichi', 0x8000), ('C128/kernal', 0xC000)],
+    '1541': [('DRIVES/dos1541', 0xC000)],
+    '1571': [('DRIVES/dos1571', 0x8000)],
+    '1581': [('DRIVES/dos1581', 0x8000)],
+}
+
+
+def rom_image(machine: str) -> ProgramImage:
+    """
+    Builds an image holding the ROMs of a machine from the data directory.
+
+    :param machine: one of the ROM_SETS keys
+    :return: the loaded image
+    """
+    image = ProgramImage()
+    for file_name, address in ROM_SETS[machine]:
+        image.load_binary(os.path.join(DATA_DIR, *file_name.split('/')), address)
+    return image
+
+
+class Result:
+    name: str
+    ops: int
+    seconds: float
+    bytes_per_op: float
+    blocks_per_op: float
+    peak_bytes: int
+    # (fastest - slowest) / median ops/s over the repeated measurements
+    spread: float
+
+    def __init__(self, name, ops, seconds, bytes_per_op, blocks_per_op, peak_bytes, spread=0.0):
+        self.name = name
+        self.ops = ops
+        self.seconds = seconds
+        self.bytes_per_op = bytes_per_op
+        self.blocks_per_op = blocks_per_op
+        self.peak_bytes = peak_bytes
+        self.spread = spread
+
+    @property
+    def ops_per_sec(self):
+        return self.ops / self.seconds if self.seconds else 0.0
+
+    def as_dict(self):
+        return {'name': self.name, 'ops': self.ops, 'seconds': self.seconds, 'ops_per_sec': self.ops_per_sec,
+                'bytes_per_op': self.bytes_per_op, 'blocks_per_op': self.blocks_per_op,
+                'peak_bytes': self.peak_bytes, 'spread': self.spread}
+
+
+def measure(name: str, operation: Callable[[], object], min_time: float = 0.5, alloc_ops: int = 5) -> Result:
+    """
+    Times an operation and measures its allocations. The operation is first repeated until min_time has
+    passed with tracing off, then run alloc_ops more times under tracemalloc. What each of those runs returns
+    is kept alive, so the allocation figures are the memory an operation retains.
+
+    :param name: name to report the result under
+    :param operation: callable doing one operation
+    :param min_time: minimum number of seconds to time the operation for
+    :param alloc_ops: number of operations to trace allocations over
+    :return: the measurements
+    """
+    operation()
+
+    ops = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_time:
+        operation()
+        ops += 1
+        elapsed = time.perf_counter() - start
+
+    kept = list()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        for _ in range(0, alloc_ops):
+            kept.append(operation())
+        after = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    stats = after.compare_to(before, 'filename')
+    size = sum(stat.size_diff for stat in stats if stat.size_diff > 0)
+    blocks = sum(stat.count_diff for stat in stats if stat.count_diff > 0)
+    return Result(name, ops, elapsed, size / alloc_ops, blocks / alloc_ops, peak)
+
+
+def reference_workload():
+    """
+    Fixed mix of the Python work the benchmarks do: integer arithmetic, indexing a bytearray, and building
+    and sorting small objects. Benchmarks are compared relative to its speed.
+    """
+    data = bytearray(range(256)) * 16
+    total = 0
+    for i in range(0, len(data) - 1, 3):
+        total += data[i] | data[i + 1] << 8
+    pairs = sorted((value * 7919 % 256, value) for value in data[:1024])
+    return total, {key: value for key, value in pairs}
+
+
+def median_result(runs: List[Result]) -> Result:
+    """
+    Folds repeated measurements of one benchmark into one result: the median run by speed, the median
+    allocation figures, and the spread of the speeds.
+    """
+    by_speed = sorted(runs, key=lambda result: result.ops_per_sec)
+    middle = by_speed[len(by_speed) // 2]
+    by_size = sorted(runs, key=lambda result: result.bytes_per_op)
+    sized = by_size[len(by_size) // 2]
+    spread = (by_speed[-1].ops_per_sec - by_speed[0].ops_per_sec) / middle.ops_per_sec \
+        if middle.ops_per_sec else 0.0
+    return Result(middle.name, middle.ops, middle.seconds, sized.bytes_per_op, sized.blocks_per_op,
+                  sorted(result.peak_bytes for result in runs)[len(runs) // 2], spread)
+
+
+def print_results(results: List[Result]):
+    print('{:40} {:>12} {:>8} {:>14} {:>12} {:>12}'.format('benchmark', 'ops/s', 'spread', 'bytes/op',
+                                                              'blocks/op', 'peak'))
+    for result in results:
+        print('{:40} {:12.1f} {:7.0f}% {:14.0f} {:12.1f} {:12d}'.format(result.name, result.ops_per_sec,
+                                                                         result.spread * 100, result.bytes_per_op,
+                                                                         result.blocks_per_op, result.peak_bytes))
@@ -0,0 +1,39 @@
+"""
+Scrolls a hex dump of the C128 ROMs from $4000 to the end of memory, a page at a time, and reports how many
+rows per second each row widget can build and render.
+
+Run from the repository root with ``python -m benchmarks.hex_scroll``.
+"""
+import time
+
+import urwid
+
+from Models.programimage import ProgramImage
+from Views.hex_list import HexRowWalker
+from Views.hex_row import HexRow, HexLine
+from benchmarks.harness import rom_image
+
+SIZE = (80, 50)
+
+
+def scroll(image: ProgramImage, row_class: type) -> float:
+    walker = HexRowWalker(image, 0x4000, row_class=row_class)
+    listbox = urwid.ListBox(walker)
+
+    start = time.perf_counter()
+    listbox.render(SIZE, focus=True)
+    while walker.focus + 1 < len(walker):
+        listbox.keypress(SIZE, 'page down')
+        listbox.render(SIZE, focus=True)
+    elapsed = time.perf_counter() - start
+    return len(walker) / elapsed
+
+
+def main():
+    image = rom_image('C128')
+    for row_class in (HexRow, HexLine):
+        print('{:8} {:10.0f} rows/s'.format(row_class.__name__, scroll(image, row_class)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""
+Measures how long the headless batch path takes to import, and checks that it does not pull in urwid. Each
+run imports the modules in a fresh interpreter, so nothing is cached between runs.
+
+Run from the repository root with ``python -m benchmarks.import_time``.
+"""
+import os
+import subprocess
+import sys
+
+HEADLESS_MODULES = ['Controller.config', 'Controller.jobs', 'Models.programimage', 'Models.project_member',
+                    'Models.item', 'Models.unknown_area', 'Models.memory_overview']
+RUNS = 10
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_PROBE = """
+import sys, time
+start = time.perf_counter()
+{imports}
+elapsed = time.perf_counter() - start
+print(elapsed, 'urwid' in sys.modules, len(sys.modules))
+"""
+
+
+def probe(modules):
+    code = _PROBE.format(imports='\n'.join('import ' + module for module in modules))
+    output = subprocess.check_output([sys.executable, '-c', code], cwd=ROOT, universal_newlines=True)
+    elapsed, urwid_loaded, module_count = output.split()
+    return float(elapsed), urwid_loaded == 'True', int(module_count)
+
+
+def main():
+    results = [probe(HEADLESS_MODULES) for _ in range(0, RUNS)]
+    best = min(elapsed for elapsed, _, _ in results)
+    _, urwid_loaded, module_count = results[0]
+    print('headless import: {:.2f} ms best of {}, {} modules loaded'.format(best * 1000, RUNS, module_count))
+    if urwid_loaded:
+        print('urwid was imported by the headless path')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,360 @@
+"""
+End to end benchmark suite over the ROM corpus in the data directory. Every stage of the pipeline that exists
+is timed: loading the ROM files, building a ProjectMember for each machine, switching memory configurations,
+editing with undo and redo, writing and reading the project cache, disassembly and cross references, the
+packed data scan, exporting and reassembling source, and rendering the hex and listing views.
+
+Results are written as JSON and compared against a stored baseline. Every benchmark is measured several
+times and its median run is kept. A fixed reference workload is timed along with the benchmarks, and speeds
+are compared as ratios to it, so a machine that is slower or busier overall does not show up as a
+regression. A benchmark that got slower relative to the reference, or that retains more memory per
+operation, by more than the tolerance is reported as a regression and the suite exits with status 1. The
+tolerance of a benchmark is widened to twice the spread its runs showed, here or in the baseline.
+
+Run from the repository root with ``python -m benchmarks.suite``; ``--save-baseline`` stores the results as
+the new baseline.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+from typing import Callable, List
+
+import urwid
+
+from Models.analysis import AnalysisCache, analyse_section
+from Models.assembler import verify_lines
+from Models.entropy import scan_image
+from Models.exporter import export_lines
+from Models.item import Item
+from Models.project import Project
+from Models.project_cache import load_project, save_project
+from Models.project_member import ProjectMember
+from Models.programimage import ProgramImage
+from Views.hex_list import HexRowWalker
+from Views.hex_row import HexLine
+from Views.item_list import ItemListWalker
+from benchmarks.harness import DATA_DIR, Result, measure, median_result, print_results, reference_workload
+
+MACHINES = ['C64', 'C128', '1541', '1571', '1581']
+# a spread of MMU settings: the C128 with BASIC and kernal, RAM banks 0 and 1, all RAM, and the common areas
+C128_CONFIGS = [0x000, 0x001, 0x03F, 0x07F, 0x0C1, 0x401, 0x701, 0xF3F]
+C64_CONFIGS = list(range(0, 32))
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+SCREEN_ROWS = 50
+HEX_WIDTH = 80
+LISTING_WIDTH = 130
+
+# allocations below this many bytes per operation are noise, not a regression
+ALLOC_SLACK = 512
+
+
+def corpus_files() -> List[str]:
+    """
+    Returns every non empty ROM file of the corpus, sorted so runs are comparable.
+    """
+    files = list()
+    for directory, _, names in os.walk(DATA_DIR):
+        for name in names:
+            path = os.path.join(directory, name)
+            if os.path.getsize(path) > 0:
+                files.append(path)
+    return sorted(files)
+
+
+def load_corpus() -> List[ProgramImage]:
+    """
+    Loads each ROM file into its own image, ending at the top of memory as ROMs do.
+    """
+    images = list()
+    for file_name in corpus_files():
+        image = ProgramImage()
+        image.load_binary(file_name, 0x10000 - os.path.getsize(file_name))
+        images.append(image)
+    return images
+
+
+def fill_items(member: ProjectMember):
+    """
+    Covers the loaded sections mapped in by the current configuration of a member with three byte code items,
+    standing in for a disassembly.
+    """
+    for (region_start, region_end), bank_name in zip(member.region_list, member.region_types):
+        bank = member.images[bank_name]
+        for section in bank.sections:
+            start = max(section.start_address, region_start)
+            end = min(section.end_address, region_end)
+            for address in range(start, end - 2, 3):
+                member.add_item(Item(bank, address, address + 3, 'Code'))
+    member.save_state()
+
+
+def analysed_member(machine: str) -> ProjectMember:
+    member = ProjectMember(machine, machine)
+    fill_items(member)
+    member.change_config(member.machine_config)
+    return member
+
+
+def member_configs(member: ProjectMember) -> List[int]:
+    if member.machine_type == 'C64':
+        return C64_CONFIGS
+    if member.machine_type == 'C128':
+        return C128_CONFIGS
+    return [0]
+
+
+Bench = Callable[[str, Callable[[], object]], Result]
+
+
+def bench_loading(bench: Bench) -> List[Result]:
+    return [bench('corpus load ({} files)'.format(len(corpus_files())), load_corpus)]
+
+
+def bench_members(bench: Bench) -> List[Result]:
+    return [bench('{} ProjectMember'.format(machine), lambda machine=machine: ProjectMember(machine, machine))
+            for machine in MACHINES]
+
+
+def bench_config(bench: Bench) -> List[Result]:
+    results = list()
+    for machine in ['C64', 'C128']:
+        member = analysed_member(machine)
+        configs = member_configs(member)
+
+        def operation():
+            for mode in configs:
+                member.change_config(mode)
+
+        results.append(bench('{} change_config x{}'.format(machine, len(configs)), operation))
+    return results
+
+
+def bench_history(bench: Bench) -> List[Result]:
+    member = analysed_member('C128')
+    items = member.mappings[::97]
+
+    def edit():
+        for item in items[:16]:
+            member.retype_item(item.start_address, item.end_address, 'Data')
+            member.symbols[item.start_address] = 'L{:04X}'.format(item.start_address)
+        member.history.commit('edit')
+        member.undo()
+
+    member.history.commit('start')
+    for item in items:
+        member.retype_item(item.start_address, item.end_address, 'Data')
+        member.history.commit('retype')
+
+    def undo_redo():
+        member.undo()
+        member.redo()
+
+    return [bench('C128 edit, commit and undo', edit),
+            bench('C128 undo and redo', undo_redo)]
+
+
+def bench_cache(bench: Bench) -> List[Result]:
+    project = Project('benchmark')
+    for machine in MACHINES:
+        project.members.append(analysed_member(machine))
+    for member in project.members:
+        for item in member.mappings[::16]:
+            member.symbols[item.start_address] = 'L{:04X}'.format(item.start_address)
+            member.comments[item.start_address] = 'comment'
+
+    cache_file = os.path.join(tempfile.mkdtemp(), 'benchmark.cache')
+    try:
+        return [bench('project cache save', lambda: save_project(project, cache_file)),
+                bench('project cache load', lambda: load_project(cache_file, validate=False))]
+    finally:
+        os.remove(cache_file)
+        os.rmdir(os.path.dirname(cache_file))
+
+
+def bench_analysis(bench: Bench) -> List[Result]:
+    images = [image for image in load_corpus() if image.sections]
+    member = analysed_member('C128')
+    cold = Project('cold')
+    warm = Project('warm')
+    warm.analyse(member)
+
+    def disassemble():
+        return [analyse_section(image, section) for image in images for section in image.sections]
+
+    def cold_xrefs():
+        cold.analysis_cache = AnalysisCache()
+        return cold.analyse(member)
+
+    return [bench('corpus disassembly ({} images)'.format(len(images)), disassemble),
+            bench('C128 xrefs, cold cache', cold_xrefs),
+            bench('C128 xrefs, warm cache', lambda: warm.analyse(member))]
+
+
+def bench_entropy(bench: Bench) -> List[Result]:
+    images = [image for image in load_corpus() if image.sections]
+    return [bench('corpus entropy scan ({} images)'.format(len(images)),
+                  lambda: [scan_image(image) for image in images])]
+
+
+def bench_export(bench: Bench) -> List[Result]:
+    results = list()
+    for machine in ['C128', '1571']:
+        member = analysed_member(machine)
+        lines = export_lines(member)
+        results.append(bench('{} export'.format(machine), lambda member=member: export_lines(member)))
+        results.append(bench('{} reassemble and verify'.format(machine),
+                             lambda member=member, lines=lines: verify_lines(lines, member.current_image)))
+    return results
+
+
+def page_scroll(bench: Bench, name: str, walker: urwid.ListWalker, width: int) -> Result:
+    listbox = urwid.ListBox(walker)
+    size = (width, SCREEN_ROWS)
+    listbox.render(size, focus=True)
+
+    def operation():
+        if listbox.keypress(size, 'page down') is not None:
+            listbox.set_focus(0)
+        return listbox.render(size, focus=True)
+
+    return bench(name, operation)
+
+
+def bench_views(bench: Bench) -> List[Result]:
+    results = list()
+    for machine in ['C128', '1541']:
+        member = analysed_member(machine)
+        results.append(page_scroll(bench, '{} hex view page scroll'.format(machine),
+                                   HexRowWalker(member.current_image, row_class=HexLine), HEX_WIDTH))
+        results.append(page_scroll(bench, '{} listing page scroll'.format(machine),
+                                   ItemListWalker(member.current_image, list(member.mappings)), LISTING_WIDTH))
+    return results
+
+
+STAGES = {
+    'loading': bench_loading,
+    'members': bench_members,
+    'config': bench_config,
+    'history': bench_history,
+    'cache': bench_cache,
+    'analysis': bench_analysis,
+    'entropy': bench_entropy,
+    'export': bench_export,
+    'views': bench_views,
+}
+
+REFERENCE_NAME = 'reference workload'
+
+
+def run(stages: List[str], min_time: float, repeat: int) -> List[Result]:
+    """
+    Runs the benchmarks of some stages. Each benchmark is measured repeat times and its median run is kept,
+    see median_result(). The reference workload is measured before every stage, so its median follows the
+    load of the machine over the whole run.
+
+    :return: the results, the reference workload first
+    """
+    def measure_all(name: str, operation: Callable[[], object]) -> List[Result]:
+        return [measure(name, operation, min_time) for _ in range(0, repeat)]
+
+    def bench(name: str, operation: Callable[[], object]) -> Result:
+        return median_result(measure_all(name, operation))
+
+    reference = list()
+    results = list()
+    for stage in stages:
+        reference += measure_all(REFERENCE_NAME, reference_workload)
+        results += STAGES[stage](bench)
+    return [median_result(reference)] + results
+
+
+def compare(results: List[Result], baseline: dict, tolerance: float) -> List[str]:
+    """
+    Compares results against a baseline.
+
+    :param results: results of this run
+    :param baseline: baseline as written by write_results()
+    :param tolerance: fraction a benchmark may get worse by before it counts as a regression; widened to
+        twice the spread of a benchmark's runs
+    :return: description of every regression
+    """
+    known = {entry['name']: entry for entry in baseline['results']}
+    reference = {result.name: result for result in results}.get(REFERENCE_NAME)
+    # how much faster this machine runs the reference workload than the baseline's did
+    scale = 1.0
+    if reference is not None and known.get(REFERENCE_NAME, dict()).get('ops_per_sec'):
+        scale = reference.ops_per_sec / known[REFERENCE_NAME]['ops_per_sec']
+
+    regressions = list()
+    for result in results:
+        entry = known.get(result.name)
+        if entry is None or result.name == REFERENCE_NAME:
+            continue
+        allowed = max(tolerance, 2.0 * max(result.spread, entry.get('spread', 0.0)))
+        expected = entry['ops_per_sec'] * scale
+        if result.ops_per_sec < expected * (1.0 - min(allowed, 0.9)):
+            regressions.append('{}: {:.1f} ops/s, baseline {:.1f} ops/s scaled to {:.1f} ({:.0f}% allowed)'.format(
+                result.name, result.ops_per_sec, entry['ops_per_sec'], expected, allowed * 100))
+        if result.bytes_per_op > entry['bytes_per_op'] * (1.0 + tolerance) + ALLOC_SLACK:
+            regressions.append('{}: {:.0f} bytes/op, baseline {:.0f} bytes/op'.format(
+                result.name, result.bytes_per_op, entry['bytes_per_op']))
+    return regressions
+
+
+def write_results(results: List[Result], file_name: str):
+    data = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': [result.as_dict() for result in results],
+    }
+    with open(file_name, 'w') as f:
+        json.dump(data, f, indent=1)
+        f.write('\n')
+
+
+def main(args=None) -> int:
+    parser = argparse.ArgumentParser(description='End to end benchmarks over the ROM corpus.')
+    parser.add_argument('--stage', action='append', choices=list(STAGES),
+                        help='stage to run, may be repeated (default: all)')
+    parser.add_argument('--output', default='bench_results.json', help='file to write the results to')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='baseline to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='fraction a benchmark may get worse by before it fails (default: 0.25)')
+    parser.add_argument('--min-time', type=float, default=0.3, help='seconds to time each benchmark for')
+    parser.add_argument('--repeat', type=int, default=5, help='times to measure each benchmark (default: 5)')
+    options = parser.parse_args(args)
+
+    results = run(options.stage or list(STAGES), options.min_time, options.repeat)
+    print_results(results)
+    write_results(results, options.output)
+
+    if options.save_baseline:
+        write_results(results, options.baseline)
+        print('Baseline saved to {}.'.format(options.baseline))
+        return 0
+
+    try:
+        with open(options.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print('No baseline at {}, nothing to compare against.'.format(options.baseline))
+        return 0
+
+    regressions = compare(results, baseline, options.tolerance)
+    if regressions:
+        print()
+        print('{} REGRESSION(S) against {}:'.format(len(regressions), options.baseline))
+        for regression in regressions:
+            print('  ' + regression)
+        return 1
+    print('No regressions against {}.'.format(options.baseline))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
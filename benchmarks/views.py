@@ -0,0 +1,138 @@
+"""
+Headless benchmarks for the urwid views. Widgets are rendered straight into canvases at a fixed terminal
+size, without a screen, over images built from the ROMs in the data directory.
+
+Run from the repository root with ``python -m benchmarks.views``.
+"""
+import itertools
+from typing import List
+
+import urwid
+
+from Models.item import Item
+from Models.programimage import ProgramImage
+from Views.hex_list import HexRowWalker
+from Views.hex_row import HexRow, HexLine, DefinedRow
+from Views.item_list import ItemListWalker
+from benchmarks.harness import Result, measure, print_results, rom_image
+
+MACHINES = ['C128', '1541']
+HEX_WIDTH = 80
+LISTING_WIDTH = 130
+SCREEN_ROWS = 50
+FOCUS_KEYS = ['right'] * 15 + ['down'] + ['left'] * 15 + ['down']
+
+
+def rom_addresses(image: ProgramImage, step: int):
+    """
+    Cycles through the addresses of the loaded sections of an image.
+    """
+    addresses = list()
+    for section in image.sections:
+        addresses += range(section.start_address, section.end_address - step + 1, step)
+    return itertools.cycle(addresses)
+
+
+def construct(name: str, row_class: type, image: ProgramImage, step: int) -> Result:
+    addresses = rom_addresses(image, step)
+
+    def operation():
+        address = next(addresses)
+        return row_class(image, address, address + step)
+
+    return measure(name, operation)
+
+
+def render(name: str, row_class: type, image: ProgramImage, step: int, width: int) -> Result:
+    addresses = rom_addresses(image, step)
+    rows = [row_class(image, address, address + step) for address in itertools.islice(addresses, 64)]
+    row_cycle = itertools.cycle(rows)
+
+    def operation():
+        row = next(row_cycle)
+        row._invalidate()
+        return row.render((width,))
+
+    return measure(name, operation)
+
+
+def pile_scroll(name: str, image: ProgramImage) -> Result:
+    addresses = rom_addresses(image, 16)
+    pile = urwid.Pile([HexRow(image, address, address + 16) for address in itertools.islice(addresses, 8)])
+
+    def operation():
+        address = next(addresses)
+        del pile.contents[0]
+        pile.contents.append((HexRow(image, address, address + 16), pile.options()))
+        return pile.render((HEX_WIDTH,))
+
+    return measure(name, operation)
+
+
+def listbox_scroll(name: str, walker: urwid.ListWalker, width: int) -> Result:
+    listbox = urwid.ListBox(walker)
+    size = (width, SCREEN_ROWS)
+
+    def operation():
+        if walker.focus + 1 >= len(walker):
+            walker.set_focus(0)
+        else:
+            listbox.keypress(size, 'page down')
+        return listbox.render(size, focus=True)
+
+    return measure(name, operation)
+
+
+def focus_move(name: str, walker: urwid.ListWalker, width: int) -> Result:
+    listbox = urwid.ListBox(walker)
+    size = (width, SCREEN_ROWS)
+    keys = itertools.cycle(FOCUS_KEYS)
+    # keep the last screen alive like a real screen does, so unchanged rows come from the canvas cache
+    screen = [listbox.render(size, focus=True)]
+
+    def operation():
+        listbox.keypress(size, next(keys))
+        screen[0] = listbox.render(size, focus=True)
+        return screen[0]
+
+    return measure(name, operation)
+
+
+def code_items(image: ProgramImage) -> List[Item]:
+    items = list()
+    for section in image.sections:
+        for address in range(section.start_address, section.end_address - 2, 3):
+            items.append(Item(image, address, address + 3, 'Code'))
+    return items
+
+
+def run() -> List[Result]:
+    results = list()
+    for machine in MACHINES:
+        image = rom_image(machine)
+        results.append(construct('{} HexRow construct'.format(machine), HexRow, image, 16))
+        results.append(construct('{} HexLine construct'.format(machine), HexLine, image, 16))
+        results.append(construct('{} DefinedRow construct'.format(machine), DefinedRow, image, 3))
+        results.append(render('{} HexRow render'.format(machine), HexRow, image, 16, HEX_WIDTH))
+        results.append(render('{} HexLine render'.format(machine), HexLine, image, 16, HEX_WIDTH))
+        results.append(render('{} DefinedRow render'.format(machine), DefinedRow, image, 3, LISTING_WIDTH))
+        results.append(pile_scroll('{} Pile scroll'.format(machine), image))
+        results.append(listbox_scroll('{} HexRow page scroll'.format(machine),
+                                      HexRowWalker(image, row_class=HexRow), HEX_WIDTH))
+        results.append(listbox_scroll('{} HexLine page scroll'.format(machine),
+                                      HexRowWalker(image, row_class=HexLine), HEX_WIDTH))
+        results.append(listbox_scroll('{} listing page scroll'.format(machine),
+                                      ItemListWalker(image, code_items(image)), LISTING_WIDTH))
+        results.append(focus_move('{} HexRow focus move'.format(machine),
+                                  HexRowWalker(image, row_class=HexRow), HEX_WIDTH))
+        results.append(focus_move('{} HexLine focus move'.format(machine),
+                                  HexRowWalker(image, row_class=HexLine), HEX_WIDTH))
+    return results
+
+
+def main():
+    print_results(run())
+
+
+if __name__ == '__main__':
+    main()
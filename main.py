@@ -1,35 +1,245 @@
 # This is a sample Python script.
+import argparse
+import os
 
 import urwid
 
+from Controller import tracing
+from Controller.batch import MACHINES, parse_file_args
+from Controller.jobs import CompactionJob, DisassemblyJob, JobRunner, LoadImagesJob, OpenMemberJob, SearchJob, \
+    SymbolImportJob
+from Controller.messenging import connect_listener, send_message
+from Models.journal import AnnotationJournal, open_project
+from Models.memory_overview import MemoryOverview
 from Models.programimage import ProgramImage
-from Views.hex_row import HexRow
+from Models.project import Project
+from Models.search import BytePattern, PatternError
+from Views.hex_list import HexRowWalker
+from Views.hex_row import HexLine
+from Views.item_list import ItemListWalker
+from Views.overview import OverviewStrip
 from Views.palette import palette
+from Views.search_list import SearchPrompt, SearchResultWalker
+from Views.status_bar import StatusBar
 
 
 def main():
+    parser = argparse.ArgumentParser(description='Browse C64, C128 and drive memory.')
+    parser.add_argument('--machine', choices=MACHINES,
+                        help='open a member of this machine type in the background, load the files into its RAM '
+                             'and disassemble it')
+    parser.add_argument('--symbols', action='append', default=list(),
+                        help='VICE, ca65 or CSV symbol file to import into the member once it is open; may be '
+                             'repeated')
+    parser.add_argument('--project',
+                        help='project cache to open, or to create once the member is disassembled; edits are kept '
+                             'in its journal')
+    parser.add_argument('files', nargs='*', help='PRG files, or binaries given as name@hexaddress')
+    options = parser.parse_args()
+
+    project = Project('main')
+    journal = None
+    if options.project is not None:
+        if os.path.exists(options.project):
+            project = open_project(options.project)
+            if project is None:
+                parser.error('{} is not a usable project cache.'.format(options.project))
+        journal = AnnotationJournal(project, options.project)
+
+    trace_file = os.environ.get(tracing.TRACE_ENV)
+    if trace_file:
+        tracing.enable()
+
     image = ProgramImage()
 
     for i in range(0, 256):
         image[i] = i
 
-    pile = urwid.Pile([
-        (1, HexRow(image, 0x0000, 0x0010)),
-        (1, HexRow(image, 0x0010, 0x0020)),
-        (1, HexRow(image, 0x0020, 0x0030)),
-        (1, HexRow(image, 0x0035, 0x0040)),
-        (1, HexRow(image, 0x0040, 0x0050)),
-        (1, HexRow(image, 0x0050, 0x0060)),
-        (1, HexRow(image, 0x0060, 0x0070)),
-        (1, HexRow(image, 0x0070, 0x0080)),
-    ])
-    fill = urwid.AttrWrap(urwid.Filler(pile, 'top'), 'normal')
+    walker = HexRowWalker(image, row_class=HexLine)
+    listbox = urwid.ListBox(walker)
+    status_bar = StatusBar()
+    results = SearchResultWalker()
+    results_view = urwid.AttrWrap(urwid.ListBox(results), 'normal')
+    listing = urwid.ListBox(urwid.SimpleListWalker(list()))
+    listing_view = urwid.AttrWrap(listing, 'normal')
+    body = urwid.Pile([urwid.AttrWrap(listbox, 'normal')])
+    frame = urwid.Frame(body, footer=status_bar)
+    runner = None
+    search_job = None
+    compaction = None
+    member = None
+    restored = list(project.members)
+
+    def shown(widget):
+        return any(shown_widget is widget for shown_widget, _ in body.contents)
+
+    def show_results():
+        if not shown(results_view):
+            body.contents.append((results_view, body.options('given', 10)))
+
+    def show_listing():
+        # the member's items of the current configuration, below the hex dump, and its memory map above
+        listing.body = ItemListWalker.for_member(member)
+        if not shown(listing_view):
+            body.contents.insert(1, (listing_view, body.options()))
+        if isinstance(frame.header, OverviewStrip):
+            frame.header.rebuild()
+        else:
+            frame.header = OverviewStrip(MemoryOverview(member))
+
+    def start_search(text):
+        nonlocal search_job
+        frame.footer = status_bar
+        frame.focus_position = 'body'
+        try:
+            pattern = BytePattern(text)
+        except PatternError as error:
+            status_bar.set_message(str(error))
+            return
+        if search_job is not None:
+            search_job.cancel()
+        results.clear()
+        show_results()
+        search_job = runner.submit(SearchJob(pattern, member if member is not None else {'RAM': image},
+                                             results.add_hits))
+
+    def cancel_search():
+        frame.footer = status_bar
+        frame.focus_position = 'body'
+
+    def import_symbols(file_name):
+        frame.footer = status_bar
+        frame.focus_position = 'body'
+        if member is None:
+            status_bar.set_message('Open a member with --machine to import symbols into.')
+        elif file_name:
+            runner.submit(SymbolImportJob(member, file_name, journal=journal))
+
+    def compact(force=False):
+        # folds the journal into a new snapshot once it has grown, or to write the first one
+        nonlocal compaction
+        if journal is not None and compaction is None and (force or journal.needs_compaction()):
+            compaction = runner.submit(CompactionJob(journal))
+
+    def step(redo):
+        if member is None:
+            return
+        label = member.history.redo_label() if redo else member.history.undo_label()
+        if label is None:
+            status_bar.set_message('Nothing to redo.' if redo else 'Nothing to undo.')
+            return
+        if journal is not None:
+            index = project.members.index(member)
+            changes = journal.redo(index) if redo else journal.undo(index)
+        else:
+            changes = member.redo() if redo else member.undo()
+        if changes.get('config'):
+            walker.refresh(0, len(member.current_image))
+            show_listing()
+        elif changes.get('symbols'):
+            listing.body.refresh()
+        status_bar.set_message('{} {}.'.format(label, 'redone' if redo else 'undone'))
+        compact()
+
+    def unhandled_input(key):
+        if key == '/':
+            frame.footer = SearchPrompt(start_search, cancel_search)
+            frame.focus_position = 'footer'
+        elif key == 'i':
+            frame.footer = SearchPrompt(import_symbols, cancel_search, 'Import symbols: ')
+            frame.focus_position = 'footer'
+        elif key == 'tab':
+            body.focus_position = (body.focus_position + 1) % len(body.contents)
+        elif key == 'u':
+            step(False)
+        elif key == 'ctrl r':
+            step(True)
 
     loop = urwid.MainLoop(
-        fill,
-        palette
+        frame,
+        palette,
+        unhandled_input=unhandled_input
     )
-    loop.run()
+
+    if trace_file:
+        loop.draw_screen = tracing.traced('MainLoop.draw_screen', 'view')(loop.draw_screen)
+
+    def refresh_section(job, progress):
+        if isinstance(job, LoadImagesJob) and job.sections and member is None:
+            walker.refresh(job.sections[-1].start_address, job.sections[-1].end_address)
+
+    def open_member(new_member):
+        nonlocal member, walker
+        member = new_member if new_member in project.members else project.add_member(new_member)
+        walker = HexRowWalker(member.current_image, row_class=HexLine)
+        listbox.body = walker
+        show_listing()
+        for file_name in options.symbols:
+            runner.submit(SymbolImportJob(member, file_name, journal=journal))
+        if files:
+            runner.submit(LoadImagesJob(member.images['RAM'], files))
+        else:
+            runner.submit(DisassemblyJob(project, member))
+
+    def job_finished(job, kind, payload):
+        nonlocal compaction
+        if job is compaction:
+            compaction = None
+        if member is None or kind != 'finished':
+            return
+        if isinstance(job, LoadImagesJob):
+            # the files went into the RAM bank; bring the current configuration up to date with it
+            member.change_config(member.machine_config)
+            walker.refresh(0, len(member.current_image))
+            show_listing()
+            runner.submit(DisassemblyJob(project, member))
+        elif isinstance(job, DisassemblyJob):
+            # the sections are analysed by now, so marking their code only looks the analyses up; a member
+            # from the cache keeps the items it was saved with, including undone marks
+            if member in restored:
+                count = 0
+            elif journal is not None:
+                count = journal.mark_code(project.members.index(member))
+            else:
+                count = project.mark_code(member)
+            status_bar.set_message('{}: {} cross referenced addresses, {} items added'.format(
+                member.image_name, len(job.xrefs), count))
+            compact(not os.path.exists(options.project or ''))
+        elif isinstance(job, SymbolImportJob):
+            status_bar.set_message('{} symbols imported from {}'.format(job.count, job.file_name))
+            compact()
+
+    def goto_address(bank, address):
+        walker.set_focus_address(address)
+        if isinstance(listing.body, ItemListWalker):
+            try:
+                listing.body.set_focus_address(address)
+            except IndexError:
+                pass
+        body.focus_position = 0
+        send_message('focus_address', address)
+
+    connect_listener('job_progress', refresh_section)
+    connect_listener('job_finished', job_finished)
+    connect_listener('goto_address', goto_address)
+
+    runner = JobRunner(loop)
+    files = list(parse_file_args(options.files))
+    if project.members:
+        open_member(project.members[0])
+    elif options.machine is not None:
+        runner.submit(OpenMemberJob(options.machine, options.machine, open_member))
+    elif files:
+        runner.submit(LoadImagesJob(image, files))
+    try:
+        loop.run()
+    finally:
+        runner.shutdown()
+        if journal is not None:
+            journal.close()
+        if trace_file:
+            tracing.write_chrome_trace(trace_file)
+            print(tracing.format_summary())
 
 
 # Press the green button in the gutter to run the script.
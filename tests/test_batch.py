@@ -0,0 +1,23 @@
+"""
+Runs ROM files through the headless batch pipeline.
+"""
+import os
+
+from Controller.batch import run_batch
+from Models.project_cache import load_project
+
+DRIVES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'DRIVES')
+
+
+def test_batch_analyses_and_verifies(tmp_path):
+    files = [(os.path.join(DRIVES, 'dos1541'), 0x4000), (os.path.join(DRIVES, 'dos1540'), 0x4000)]
+    results = list(run_batch(files, 'C64', str(tmp_path), workers=2, verify=True))
+
+    assert [result.error for result in results] == [None, None]
+    for result in results:
+        assert result.coverage['code'] > 0
+        project = load_project(result.output)
+        assert project.members[0].xrefs
+        assert any(item.item_type == 'Code' for item in project.members[0].mappings)
+        with open(os.path.splitext(result.output)[0] + '.asm') as f:
+            assert any(line.split()[:1] == ['JSR'] for line in f)
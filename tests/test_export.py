@@ -0,0 +1,40 @@
+"""
+Marks code from the analysis of a machine's ROMs, exports it as source and assembles it again.
+"""
+import pytest
+
+from Models.assembler import assemble, verify_lines
+from Models.exporter import export_lines
+from Models.project import Project
+from Models.project_member import ProjectMember
+
+
+@pytest.mark.parametrize('machine', ['C128', '1571'])
+def test_marked_code_round_trips(machine):
+    project = Project('test')
+    member = ProjectMember(machine, machine)
+    project.analyse(member)
+    assert project.mark_code(member) > 0
+    assert any(item.item_type == 'Code' for item in member.mappings)
+
+    lines = export_lines(member)
+    assert any(line.split()[0] == 'JSR' for line in lines if line.startswith(' '))
+    _, mismatches = verify_lines(lines, member.current_image)
+    assert mismatches == []
+
+
+def test_mark_code_keeps_existing_items():
+    project = Project('test')
+    member = ProjectMember('1541', '1541')
+    project.analyse(member)
+    count = project.mark_code(member)
+    assert project.mark_code(member) == 0
+    member.undo()
+    assert member.mappings == []
+    assert project.mark_code(member) == count
+
+
+@pytest.mark.parametrize('origin, target, encoded', [('$FFFE', '$0002', 'd002'), ('$0000', '$FFF0', 'd0ee')])
+def test_branch_wraps_around_memory(origin, target, encoded):
+    segments, _ = assemble(['* = ' + origin, '        BNE ' + target])
+    assert segments[0].data.hex() == encoded
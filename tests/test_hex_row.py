@@ -0,0 +1,30 @@
+"""
+Counts the widgets rendered again when the cursor moves one byte to the right in a hex dump, with the same
+count as benchmarks.focus_renders.
+"""
+import pytest
+import urwid
+
+from Models.programimage import ProgramImage
+from Views.hex_list import HexRowWalker
+from Views.hex_row import HexRow, HexLine
+from benchmarks.focus_renders import count_renders
+
+
+@pytest.mark.parametrize('size', [(80, 50), (80, 10), (120, 100)])
+def test_hex_line_renders_only_the_focused_row(size):
+    assert count_renders(HexLine, size) == 2
+
+
+def test_hex_row_renders_its_cells():
+    assert count_renders(HexRow, (80, 50)) == 10
+
+
+def test_cursor_follows_arrow_keys():
+    listbox = urwid.ListBox(HexRowWalker(ProgramImage(), row_class=HexLine))
+    listbox.render((80, 10), focus=True)
+    listbox.keypress((80, 10), 'right')
+    listbox.keypress((80, 10), 'right')
+    listbox.render((80, 10), focus=True)
+    assert listbox.focus.cursor == 2
+    assert listbox.focus.focused_address == 2
@@ -0,0 +1,87 @@
+"""
+Keeping the disassembly listing of a member in step with its items.
+"""
+import time
+
+import urwid
+
+from Controller.jobs import JobRunner, SymbolImportJob
+from Models.item import Item
+from Models.project import Project
+from Models.project_member import ProjectMember
+from Views.item_list import ItemListWalker
+
+
+def listed(walker: ItemListWalker) -> list:
+    return [(item.start_address, item.end_address, item.item_type) for item in walker.items]
+
+
+def test_listing_follows_member_items():
+    member = ProjectMember('1541', '1541')
+    walker = ItemListWalker.for_member(member)
+    image = member.images['ROM']
+
+    member.add_item(Item(image, 0xC000, 0xC010, 'Code'))
+    member.add_item(Item(image, 0xC100, 0xC110, 'Data'))
+    assert listed(walker) == [(0xC000, 0xC010, 'Code'), (0xC100, 0xC110, 'Data')]
+
+    # same start and end: replaced in place; another end: the old item is removed first
+    member.retype_item(0xC000, 0xC010, 'Text')
+    member.add_item(Item(image, 0xC100, 0xC120, 'Code'))
+    assert listed(walker) == [(0xC000, 0xC010, 'Text'), (0xC100, 0xC120, 'Code')]
+    assert walker.addresses == [0xC000, 0xC100]
+
+    member.history.commit('Items')
+    member.remove_item(member.find_item(0xC000))
+    member.history.commit('Remove')
+    assert listed(walker) == [(0xC100, 0xC120, 'Code')]
+    member.undo()
+    assert listed(walker) == [(0xC000, 0xC010, 'Text'), (0xC100, 0xC120, 'Code')]
+    member.undo()
+    assert listed(walker) == []
+
+
+def test_add_item_replaces_item_at_same_start():
+    member = ProjectMember('1541', '1541')
+    image = member.images['ROM']
+    walker = ItemListWalker(image, [Item(image, 0xC000, 0xC004, 'Code')])
+    walker.add_item(Item(image, 0xC000, 0xC008, 'Data'))
+    assert listed(walker) == [(0xC000, 0xC008, 'Data')]
+
+
+def test_listing_ignores_other_members_and_renders_marked_code():
+    member = ProjectMember('1541', '1541')
+    other = ProjectMember('other', '1541')
+    walker = ItemListWalker.for_member(member)
+    other.add_item(Item(other.images['ROM'], 0xC000, 0xC010, 'Code'))
+    assert len(walker) == 0
+
+    project = Project('test')
+    project.analyse(member)
+    count = project.mark_code(member)
+    assert len(walker) == count == len(member.mappings)
+
+    member.symbols[walker.items[0].start_address] = 'first'
+    listbox = urwid.ListBox(walker)
+    canvas = listbox.render((130, 10), focus=True)
+    assert b'first' in b''.join(canvas.text)
+
+
+def test_symbol_import_relabels_listing(tmp_path):
+    member = ProjectMember('1541', '1541')
+    member.add_item(Item(member.images['ROM'], 0xC000, 0xC003, 'Code'))
+    walker = ItemListWalker.for_member(member)
+    listbox = urwid.ListBox(walker)
+    assert b'reset' not in b''.join(listbox.render((130, 5)).text)
+
+    file_name = str(tmp_path / 'labels.vs')
+    with open(file_name, 'w') as f:
+        f.write('al C:c000 .reset\n')
+    runner = JobRunner()
+    job = runner.submit(SymbolImportJob(member, file_name))
+    while job in runner.jobs:
+        time.sleep(0.01)
+        runner.poll()
+    runner.shutdown()
+    assert job.count == 1
+    assert b'reset' in b''.join(listbox.render((130, 5)).text)
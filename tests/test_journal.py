@@ -0,0 +1,85 @@
+"""
+Edits, configuration switches, undo and redo through the annotation journal, and replaying them.
+"""
+import pytest
+
+from Models.journal import AnnotationJournal, journal_name, replay
+from Models.project import Project
+from Models.project_member import ProjectMember
+
+
+def new_project() -> Project:
+    project = Project('test')
+    project.add_member(ProjectMember('C64', 'C64'))
+    return project
+
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = AnnotationJournal(new_project(), str(tmp_path / 'test.cache'))
+    yield journal
+    journal.close()
+
+
+def state(member: ProjectMember) -> tuple:
+    return member.machine_config, dict(member.symbols.items()), dict(member.comments.items())
+
+
+def test_undo_takes_back_one_edit_at_a_time(journal):
+    member = journal.project.members[0]
+    journal.change_config(0, 30)
+    journal.set_label(0, 0xC000, 'start')
+    journal.set_comment(0, 0xC000, 'entry')
+    journal.change_config(0, 31)
+    journal.set_label(0, 0xC003, 'loop')
+
+    journal.undo(0)
+    assert state(member) == (31, {0xC000: 'start'}, {0xC000: 'entry'})
+    journal.undo(0)
+    assert state(member) == (30, {0xC000: 'start'}, {0xC000: 'entry'})
+    journal.undo(0)
+    assert state(member) == (30, {0xC000: 'start'}, {})
+    journal.undo(0)
+    assert state(member) == (30, {}, {})
+    journal.redo(0)
+    assert state(member) == (30, {0xC000: 'start'}, {})
+
+
+def test_replay_matches_the_edited_project(journal):
+    member = journal.project.members[0]
+    journal.change_config(0, 30)
+    journal.set_label(0, 0xC000, 'start')
+    journal.undo(0)
+    journal.set_comment(0, 0xE000, 'kernal')
+    journal.undo(0)
+    journal.redo(0)
+    journal.sync()
+
+    replayed = new_project()
+    replay(journal_name(journal.cache_file), replayed)
+    assert state(replayed.members[0]) == state(member) == (30, {}, {0xE000: 'kernal'})
+
+
+def test_bulk_edits_replay(tmp_path):
+    project = Project('test')
+    project.add_member(ProjectMember('1541', '1541'))
+    journal = AnnotationJournal(project, str(tmp_path / 'test.cache'), compact_size=64)
+    member = project.members[0]
+    assert not journal.needs_compaction()
+
+    assert journal.import_symbols(0, [(0xC000, 'start'), (0xC100, 'loop')]) == 2
+    count = journal.mark_code(0)
+    assert count > 0
+    journal.undo(0)
+    journal.redo(0)
+    assert journal.needs_compaction()
+    journal.close()
+
+    replayed = Project('test')
+    replayed.add_member(ProjectMember('1541', '1541'))
+    replay(journal_name(journal.cache_file), replayed)
+    replayed_member = replayed.members[0]
+    assert dict(replayed_member.symbols.items()) == {0xC000: 'start', 0xC100: 'loop'}
+    assert [(item.start_address, item.end_address, item.item_type) for item in replayed_member.mappings] == \
+        [(item.start_address, item.end_address, item.item_type) for item in member.mappings]
+    assert len(member.mappings) == count
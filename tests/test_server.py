@@ -0,0 +1,132 @@
+"""
+Runs the JSON-RPC server on a temporary Unix socket, with its asyncio loop on a thread of its own, and talks
+to it through the blocking Client.
+"""
+import asyncio
+import json
+import threading
+
+import pytest
+
+from Controller.server import AnalysisServer, Client, RpcError, INTERNAL_ERROR, INVALID_PARAMS, \
+    METHOD_NOT_FOUND, PARSE_ERROR
+from Models.project import Project
+from Models.project_member import ProjectMember
+
+# LDA $D020 / STA $0400 / JMP $C000, loaded at $C000
+PROGRAM = bytes([0x00, 0xC0, 0xAD, 0x20, 0xD0, 0x8D, 0x00, 0x04, 0x4C, 0x00, 0xC0])
+
+
+@pytest.fixture
+def server(tmp_path):
+    file_name = str(tmp_path / 'loop.prg')
+    with open(file_name, 'wb') as f:
+        f.write(PROGRAM)
+    project = Project('test')
+    member = project.add_member(ProjectMember('C64', 'C64'))
+    member.load_file(file_name)
+    server = AnalysisServer(project)
+
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    socket_path = str(tmp_path / 'server.sock')
+    listener = asyncio.run_coroutine_threadsafe(server.start(socket_path), loop).result(5)
+    server.socket_path = socket_path
+    yield server
+
+    listener.close()
+    asyncio.run_coroutine_threadsafe(listener.wait_closed(), loop).result(5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+    loop.close()
+
+
+@pytest.fixture
+def client(server):
+    with Client(server.socket_path) as client:
+        yield client
+
+
+def send_line(client: Client, line: bytes) -> dict:
+    client.sock.sendall(line)
+    return json.loads(client._file.readline())
+
+
+def test_single_calls(client):
+    assert client.call('members') == [{'name': 'C64', 'machine': 'C64', 'config': 31}]
+    assert client.call('memory', start=0xC000, end=0xC003) == 'ad20d0'
+    assert client.call('xrefs', address='$C000') == [0xC006]
+    assert client.call('label', address=0xC000) is None
+    assert client.call('disassemble', start=0xC000, end=0xC009)[0].strip() == 'LDA $D020'
+
+
+def test_errors(client):
+    with pytest.raises(RpcError) as error:
+        client.call('nothing')
+    assert error.value.code == METHOD_NOT_FOUND
+    with pytest.raises(RpcError) as error:
+        client.call('memory', start=0x20000, end=0)
+    assert error.value.code == INVALID_PARAMS
+
+
+def test_batch(client):
+    responses = client.batch([('memory', {'start': 0xC006, 'end': 0xC009}), ('nothing', {}),
+                              ('set_label', {'address': 0xC000, 'name': 'loop'}), ('label', {'address': 0xC000})])
+    assert responses[0]['result'] == '4c00c0'
+    assert responses[1]['error']['code'] == METHOD_NOT_FOUND
+    assert responses[2]['result'] is True
+    assert responses[3]['result'] == 'loop'
+
+
+def test_notification(client):
+    client.sock.sendall(json.dumps({'jsonrpc': '2.0', 'method': 'set_label',
+                                    'params': {'address': 0xC000, 'name': 'start'}}).encode('utf-8') + b'\n')
+    # a notification is not answered, so the next line read answers the call
+    assert client.call('label', address=0xC000) == 'start'
+
+
+def test_parse_error(client):
+    response = send_line(client, b'{"jsonrpc": "2.0", "method"\n')
+    assert response['id'] is None
+    assert response['error']['code'] == PARSE_ERROR
+    # the connection stays usable
+    assert client.call('label', address=0xC000) is None
+
+
+def test_set_label_clears_cache(client):
+    assert client.call('labels', start=0xC000, end=0xC100) == {}
+    assert client.call('labels', start=0xC000, end=0xC100) == {}
+    stats = client.call('stats')
+    assert stats['hits'] == 1 and stats['entries'] == 1
+
+    client.call('set_label', address=0xC000, name='loop')
+    assert client.call('stats')['entries'] == 0
+    assert client.call('labels', start=0xC000, end=0xC100) == {'C000': 'loop'}
+
+
+def test_configure_clears_cache(client):
+    client.call('memory', start=0xE000, end=0xE001)
+    assert client.call('stats')['entries'] == 1
+    assert client.call('configure', config=0) == ['IO'] + ['RAM'] * 7
+    assert client.call('stats')['entries'] == 0
+    assert client.call('members')[0]['config'] == 0
+
+
+@pytest.mark.parametrize('config', [-5, 40, 'one', True])
+def test_configure_rejects_bad_configs(client, config):
+    with pytest.raises(RpcError) as error:
+        client.call('configure', config=config)
+    assert error.value.code == INVALID_PARAMS
+    assert client.call('members')[0]['config'] == 31
+
+
+def test_failing_method_keeps_connection(server, client):
+    def fail(member, params):
+        raise RuntimeError('broken')
+
+    server.methods['members'] = fail
+    with pytest.raises(RpcError) as error:
+        client.call('members')
+    assert error.value.code == INTERNAL_ERROR
+    assert client.call('label', address=0xC000) is None